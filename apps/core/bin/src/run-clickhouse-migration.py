@@ -0,0 +1,60 @@
+import sys
+
+sys.path.append(".")
+
+from eave.dev_tooling.dotenv_loader import load_standard_dotenv_files
+
+load_standard_dotenv_files()
+
+# ruff: noqa: E402
+
+import asyncio
+import logging
+import os
+import click
+from eave.core.internal.clickhouse import clickhouse_client, migrations
+from eave.core.internal.clickhouse.dbchanges import counts_table_definition, table_definition
+from eave.core.internal.config import CORE_API_APP_CONFIG
+from eave.stdlib.logging import eaveLogger
+
+_TABLES = [table_definition, counts_table_definition]
+
+
+async def _migrate_all() -> None:
+    # Each team has its own database, named after the team's ID.
+    databases = [
+        name
+        for (name,) in (
+            await clickhouse_client.query("SELECT name FROM system.databases WHERE match(name, '^[0-9a-f]{32}$')")
+        ).result_rows
+    ]
+
+    migrated = 0
+    for database in databases:
+        for table in _TABLES:
+            if await migrations.migrate_table(database=database, table=table):
+                migrated += 1
+
+    eaveLogger.fprint(logging.INFO, f"Migrated {migrated} tables in {len(databases)} databases.")
+    await clickhouse_client.close()
+
+
+@click.command()
+def upgrade() -> None:
+    clickhouse_host = CORE_API_APP_CONFIG.clickhouse_host
+    google_cloud_project = os.environ["GOOGLE_CLOUD_PROJECT"]
+
+    eaveLogger.fprint(logging.WARNING, "Running ClickHouse migrations!")
+    eaveLogger.fprint(logging.WARNING, f"GOOGLE_CLOUD_PROJECT={google_cloud_project}")
+    eaveLogger.fprint(logging.WARNING, f"EAVE_CLICKHOUSE_HOST={clickhouse_host}")
+
+    answer = input(eaveLogger.f(logging.WARNING, "Proceed? (Y/n) "))
+
+    if answer != "Y":
+        raise click.Abort()
+
+    asyncio.run(_migrate_all())
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -6,7 +6,7 @@ from eave.core.public.middleware.team_lookup import TeamLookupASGIMiddleware
 from eave.core.public.requests import connect_integration, github_repos, github_documents, api_documentation_jobs
 from eave.core.public.requests.atlassian_integration import AtlassianIntegration
 from eave.core.public.requests.data_ingestion import DataIngestionEndpoint
-from eave.stdlib import cache, logging
+from eave.stdlib import cache, http_client, logging, signing
 from eave.stdlib.core_api.operations.account import GetAuthenticatedAccount
 from eave.stdlib.core_api.operations.api_documentation_jobs import (
     GetApiDocumentationJobsOperation,
@@ -52,7 +52,11 @@ import eave.core.public.requests.github_integration
 from .public.exception_handlers import exception_handlers
 from .public.requests import authed_account, documents, noop, slack_integration, subscriptions, team, status
 from .public.requests.oauth import atlassian_oauth, github_oauth, google_oauth, slack_oauth
+from .internal import credentials_cache
+from .internal.bigquery import bq_client, write_streams
+from .internal.clickhouse import clickhouse_client
 from .internal.database import async_engine
+from .internal.ingestion_buffer import ingestion_buffer
 from eave.stdlib.middleware import common_middlewares
 
 eave.stdlib.time.set_utc()
@@ -392,8 +396,44 @@ routes = [
 
 
 async def graceful_shutdown() -> None:
+    # The buffered events are written first, while the warehouse clients and the database are still available.
+    try:
+        await ingestion_buffer.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
+    try:
+        await credentials_cache.last_used.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
     await async_engine.dispose()
 
+    try:
+        await clickhouse_client.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
+    try:
+        await write_streams.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
+    try:
+        await bq_client.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
+    try:
+        await signing.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
+    try:
+        await http_client.close()
+    except Exception as e:
+        logging.eaveLogger.exception(e)
+
     try:
         if client := cache.initialized_client():
             await client.close()
@@ -405,5 +445,6 @@ app = starlette.applications.Starlette(
     middleware=common_middlewares,
     routes=routes,
     exception_handlers=exception_handlers,
+    on_startup=[signing.start_public_key_refresh, http_client.start],
     on_shutdown=[graceful_shutdown],
 )
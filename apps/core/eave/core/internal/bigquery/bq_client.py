@@ -1,74 +1,157 @@
-import re
-from typing import Any
+"""
+Async access to BigQuery.
+
+google-cloud-bigquery is synchronous, so every call runs on a bounded thread pool instead of blocking the event loop.
+Datasets, tables, and views that are known to exist (see `known_objects`) aren't created again.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator
+
 from google.cloud import bigquery
-from google.cloud.bigquery.table import RowIterator
-from google.cloud.bigquery_storage_v1.services.big_query_write import BigQueryWriteAsyncClient
-from google.cloud.bigquery_storage_v1.types import AppendRowsRequest
+from google.cloud.bigquery.table import Row, RowIterator
 import google.api_core.exceptions
+from google.api_core.page_iterator import Page
+
+from eave.core.internal.bigquery.known_objects import known_objects
 from eave.stdlib.config import SHARED_CONFIG
 
-_bq_client = bigquery.Client(project=SHARED_CONFIG.google_cloud_project)
+_MAX_WORKERS = 8
+
+# Rows fetched per page of query results. Only one page is held in memory at a time.
+_DEFAULT_PAGE_SIZE = 10_000
+
+_bq_client: bigquery.Client | None = None
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_client() -> bigquery.Client:
+    global _bq_client
+    if _bq_client is None:
+        _bq_client = bigquery.Client(project=SHARED_CONFIG.google_cloud_project)
+    return _bq_client
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="bigquery")
+    return _executor
 
-def create_dataset(*, dataset_name: str) -> None:
+
+async def _run[T](f: Callable[[bigquery.Client], T]) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), f, _get_client())
+
+
+async def close() -> None:
+    global _bq_client, _executor
+
+    executor = _executor
+    _executor = None
+    if executor:
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    if _bq_client:
+        _bq_client.close()
+        _bq_client = None
+
+
+async def create_dataset(*, dataset_name: str) -> None:
     dataset = bigquery.Dataset(f"{SHARED_CONFIG.google_cloud_project}.{dataset_name}")
-    _bq_client.create_dataset(
-        dataset=dataset,
-        exists_ok=True,
+
+    await known_objects.ensure(
+        dataset_name,
+        None,
+        lambda: _run(lambda client: client.create_dataset(dataset=dataset, exists_ok=True)),
     )
 
-def create_table(*, dataset_name: str, table_name: str, schema: list[bigquery.SchemaField]):
+
+async def create_table(
+    *,
+    dataset_name: str,
+    table_name: str,
+    schema: list[bigquery.SchemaField],
+    time_partitioning_field: str | None = None,
+    clustering_fields: list[str] | None = None,
+) -> None:
     table = bigquery.Table(f"{SHARED_CONFIG.google_cloud_project}.{dataset_name}.{table_name}", schema=schema)
-    _bq_client.create_table(
-        table=table,
-        exists_ok=True,
-    )
 
-def create_view(*, dataset_name: str, view_name: str, view_query: str):
+    if time_partitioning_field:
+        table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY,
+            field=time_partitioning_field,
+        )
+
+    if clustering_fields:
+        table.clustering_fields = clustering_fields
+
+    await _create_table(dataset_name=dataset_name, table=table)
+
+
+async def create_view(*, dataset_name: str, view_name: str, view_query: str) -> None:
     table = bigquery.Table(f"{SHARED_CONFIG.google_cloud_project}.{dataset_name}.{view_name}")
     table.view_query = view_query
-    _bq_client.create_table(
-        table=table,
-        exists_ok=True,
-    )
+    await _create_table(dataset_name=dataset_name, table=table)
 
-def append_rows(*, dataset_name: str, table_name: str, rows: list[dict[str, Any]], schema: list[bigquery.SchemaField]):
-    table = bigquery.Table(f"{SHARED_CONFIG.google_cloud_project}.{dataset_name}.{table_name}")
-    table.schema = schema
 
-    _bq_client.insert_rows(
-        table=table,
-        selected_fields=schema,
-        rows=rows
-    )
+async def create_materialized_view(*, dataset_name: str, view_name: str, view_query: str) -> None:
+    """
+    BigQuery keeps the view up to date incrementally, and queries of the base table that match the view's query are answered from it.
+    https://cloud.google.com/bigquery/docs/materialized-views-intro
+    """
+    table = bigquery.Table(f"{SHARED_CONFIG.google_cloud_project}.{dataset_name}.{view_name}")
+    table.mview_query = view_query
+    await _create_table(dataset_name=dataset_name, table=table)
+
 
-def query(*, query: str) -> RowIterator:
-    results = _bq_client.query_and_wait(
-        query=query,
+async def _create_table(*, dataset_name: str, table: bigquery.Table) -> None:
+    await known_objects.ensure(
+        dataset_name,
+        table.table_id,
+        lambda: _run(lambda client: client.create_table(table=table, exists_ok=True)),
     )
-    return results
 
-def get_dataset(*, dataset_name: str) -> bigquery.Dataset | None:
+
+async def query(*, query: str, page_size: int = _DEFAULT_PAGE_SIZE) -> AsyncIterator[Row]:
+    """
+    Runs the query as a job, and yields its rows as each page of results is fetched.
+    Pages are fetched as the rows are consumed, so the full result is never held in memory.
+    """
+    job = await _run(lambda client: client.query(query=query))
+    rows: RowIterator = await _run(lambda _: job.result(page_size=page_size))
+    pages: Iterator[Page] = iter(rows.pages)
+
+    while (page := await _run(lambda _: next(pages, None))) is not None:
+        for row in page:
+            yield row
+
+
+async def get_dataset(*, dataset_name: str) -> bigquery.Dataset | None:
     dataset = bigquery.DatasetReference(
         project=SHARED_CONFIG.google_cloud_project,
         dataset_id=dataset_name,
     )
 
     try:
-        result = _bq_client.get_dataset(
-            dataset_ref=dataset,
-        )
-        return result
+        result = await _run(lambda client: client.get_dataset(dataset_ref=dataset))
     except google.api_core.exceptions.NotFound:
+        known_objects.discard(dataset_name)
         return None
 
-def get_table(*, dataset_name: str, table_name: str) -> bigquery.Table | None:
+    known_objects.add(dataset_name)
+    return result
+
+
+async def get_table(*, dataset_name: str, table_name: str) -> bigquery.Table | None:
     table = bigquery.Table(f"{SHARED_CONFIG.google_cloud_project}.{dataset_name}.{table_name}")
 
     try:
-        result = _bq_client.get_table(
-            table=table,
-        )
-
-        return result
+        result = await _run(lambda client: client.get_table(table=table))
     except google.api_core.exceptions.NotFound:
+        known_objects.discard(dataset_name, table_name)
         return None
+
+    known_objects.add(dataset_name, table_name)
+    return result
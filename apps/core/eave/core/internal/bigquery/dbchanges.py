@@ -1,15 +1,16 @@
-import json
 import re
 from textwrap import dedent
-from typing import override
+from typing import AsyncIterator, override
 from google.cloud.bigquery import SchemaField, StandardSqlTypeNames
-from google.cloud.bigquery.table import RowIterator
+from google.cloud.bigquery.table import Row
+import orjson
 
 from eave.core.internal.bigquery.types import BigQueryFieldMode, BigQueryTableDefinition, BigQueryTableHandle
-from eave.core.internal.orm.virtual_event import VirtualEventOrm, make_virtual_event_readable_name
-from eave.monitoring.datastructures import DatabaseChangeEventPayload, DatabaseChangeOperation
-from eave.core.internal import database
-from eave.core.internal.bigquery import bq_client
+from eave.core.internal.orm.virtual_event import make_virtual_event_readable_name
+from eave.core.internal.virtual_events import virtual_events
+from eave.monitoring.datastructures import DatabaseChangeOperation
+from eave.core.internal.bigquery import bq_client, write_streams
+from eave.stdlib.logging import eaveLogger
 from eave.stdlib.util import sql_sanitized_identifier, sql_sanitized_literal, tableize
 
 table_definition = BigQueryTableDefinition(
@@ -46,8 +47,14 @@ table_definition = BigQueryTableDefinition(
             mode=BigQueryFieldMode.NULLABLE,
         ),
     ],
+    # Each virtual event view filters on table_name and operation, so it only reads that pair's blocks.
+    time_partitioning_field="timestamp",
+    clustering_fields=["table_name", "operation"],
 )
 
+# The number of changes per table, operation, and hour, so that dashboards can chart virtual events without reading every change.
+counts_view_name = "dbchanges_counts"
+
 
 class DatabaseChangesTableHandle(BigQueryTableHandle):
     table = table_definition
@@ -56,80 +63,112 @@ class DatabaseChangesTableHandle(BigQueryTableHandle):
         vevent_readable_name = make_virtual_event_readable_name(operation=operation, table_name=source_table)
         vevent_view_name = tableize(vevent_readable_name)
 
-        async with database.async_session.begin() as db_session:
-            vevent_query = await VirtualEventOrm.query(
-                session=db_session,
-                params=VirtualEventOrm.QueryParams(
-                    team_id=self.team_id,
-                    view_name=vevent_view_name,
-                )
-            )
-
-            if not vevent_query.one_or_none():
-                bq_client.create_view(
-                    dataset_name=self.dataset_name,
-                    view_name=vevent_view_name,
-                    view_query=dedent(
-                        """
-                        SELECT
-                            *
-                        FROM
-                            {dataset}.{atom_table_name}
-                        WHERE
-                            `table_name` = {source_table}
-                            AND `operation` = {operation}
-                        ORDER BY
-                            `timestamp` ASC
-                        """.format(
-                            dataset=sql_sanitized_identifier(self.dataset_name),
-                            atom_table_name=sql_sanitized_identifier(self.table.name),
-                            source_table=sql_sanitized_literal(source_table),
-                            operation=sql_sanitized_literal(operation),
-                        )
-                    ).strip(),
+        await bq_client.create_view(
+            dataset_name=self.dataset_name,
+            view_name=vevent_view_name,
+            view_query=dedent(
+                """
+                SELECT
+                    *
+                FROM
+                    {dataset}.{atom_table_name}
+                WHERE
+                    `table_name` = {source_table}
+                    AND `operation` = {operation}
+                ORDER BY
+                    `timestamp` ASC
+                """.format(
+                    dataset=sql_sanitized_identifier(self.dataset_name),
+                    atom_table_name=sql_sanitized_identifier(self.table.name),
+                    source_table=sql_sanitized_literal(source_table),
+                    operation=sql_sanitized_literal(operation),
                 )
+            ).strip(),
+        )
 
-                await VirtualEventOrm.create(
-                    session=db_session,
-                    team_id=self.team_id,
-                    view_name=vevent_view_name,
-                    readable_name=vevent_readable_name,
-                    description=f"{operation} operation on the {source_table} table.",
+    async def create_rollups(self) -> None:
+        await bq_client.create_materialized_view(
+            dataset_name=self.dataset_name,
+            view_name=counts_view_name,
+            view_query=dedent(
+                """
+                SELECT
+                    `table_name`,
+                    `operation`,
+                    TIMESTAMP_TRUNC(`timestamp`, HOUR) AS `bucket`,
+                    COUNT(*) AS `count`
+                FROM
+                    {dataset}.{atom_table_name}
+                GROUP BY
+                    `table_name`,
+                    `operation`,
+                    `bucket`
+                """.format(
+                    dataset=sql_sanitized_identifier(self.dataset_name),
+                    atom_table_name=sql_sanitized_identifier(self.table.name),
                 )
-
-
+            ).strip(),
+        )
 
     @override
     async def insert(self, events: list[str]) -> None:
         if len(events) == 0:
             return
 
-        dbchange_events = [DatabaseChangeEventPayload(**json.loads(e)) for e in events]
+        row_class = self.table.row_message_class
+        rows: list[bytes] = []
+        unique_operations: set[tuple[str, str]] = set()
 
-        bq_client.create_dataset(dataset_name=self.dataset_name)
-        bq_client.create_table(
-            dataset_name=self.dataset_name,
-            table_name=self.table.name,
-            schema=self.table.schema,
-        )
+        for e in events:
+            event = orjson.loads(e)
+            table_name = event["table_name"]
+            operation = event["operation"]
+            unique_operations.add((operation, table_name))
 
-        bq_client.append_rows(
-            dataset_name=self.dataset_name,
-            table_name=self.table.name,
-            schema=self.table.schema,
-            rows=[e.to_dict() for e in dbchange_events],
-        )
+            row = row_class(
+                table_name=table_name,
+                operation=operation,
+                timestamp=round(event["timestamp"] * 1_000_000),
+            )
+
+            # JSON columns are written as JSON text; a missing field is NULL.
+            if (old_data := event.get("old_data")) is not None:
+                row.old_data = orjson.dumps(old_data).decode()
+            if (new_data := event.get("new_data")) is not None:
+                row.new_data = orjson.dumps(new_data).decode()
+
+            rows.append(row.SerializeToString())
+
+        writer = write_streams.get_writer(dataset_name=self.dataset_name, table=self.table)
+
+        # A writer only has a stream once the table exists.
+        if not writer.has_stream:
+            await bq_client.create_dataset(dataset_name=self.dataset_name)
+            await bq_client.create_table(
+                dataset_name=self.dataset_name,
+                table_name=self.table.name,
+                schema=self.table.schema,
+                time_partitioning_field=self.table.time_partitioning_field,
+                clustering_fields=self.table.clustering_fields,
+            )
+            await self.create_rollups()
 
-        unique_operations = set((e.operation, e.table_name) for e in dbchange_events)
+        await writer.append(rows)
 
-        # FIXME: This is vulnerable to a DoS where unique `table_name` is generated and inserted on a loop.
-        for operation, table_name in unique_operations:
-            await self.create_vevent_view(operation=operation, source_table=table_name)
+        # The rows are already committed, so a failure here mustn't fail the insert; the caller would write them again.
+        # Virtual events that weren't created are tried again with a later batch.
+        try:
+            await virtual_events.ensure(
+                team_id=self.team_id,
+                operations=unique_operations,
+                create_view=self.create_vevent_view,
+            )
+        except Exception as e:
+            eaveLogger.exception(e)
 
     @override
-    async def query(self, query: str) -> RowIterator:
-        results = bq_client.query(query=query)
-        return results
+    def query(self, query: str) -> AsyncIterator[Row]:
+        return bq_client.query(query=query)
 
     # def _format_row(self, event: DatabaseChangeEventPayload) -> list[Any]:
     #     """
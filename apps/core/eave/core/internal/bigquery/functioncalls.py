@@ -0,0 +1,179 @@
+from typing import Any, AsyncIterator, override
+from google.cloud.bigquery import SchemaField, StandardSqlTypeNames
+from google.cloud.bigquery.table import Row
+from google.protobuf import message
+import orjson
+
+from eave.core.internal.bigquery.types import BigQueryFieldMode, BigQueryTableDefinition, BigQueryTableHandle
+from eave.core.internal.bigquery import bq_client, write_streams
+
+# The columns that identify the traced function, shared by every function event table.
+_function_fields = [
+    SchemaField(
+        name="function_module",
+        description="The module that the function is defined in",
+        field_type=StandardSqlTypeNames.STRING,
+        mode=BigQueryFieldMode.NULLABLE,
+    ),
+    SchemaField(
+        name="function_class",
+        description="The class that the function is defined in, if it's a method",
+        field_type=StandardSqlTypeNames.STRING,
+        mode=BigQueryFieldMode.NULLABLE,
+    ),
+    SchemaField(
+        name="function_name",
+        description="The name of the function",
+        field_type=StandardSqlTypeNames.STRING,
+        mode=BigQueryFieldMode.NULLABLE,
+    ),
+]
+
+_timestamp_field = SchemaField(
+    name="timestamp",
+    description="The timestamp of the call, or of the report",
+    field_type=StandardSqlTypeNames.TIMESTAMP,
+    mode=BigQueryFieldMode.REQUIRED,
+)
+
+function_calls_table_definition = BigQueryTableDefinition(
+    name="functioncalls",
+    schema=[
+        *_function_fields,
+        SchemaField(
+            name="function_args",
+            description="The arguments that the function was called with",
+            field_type=StandardSqlTypeNames.JSON,
+            mode=BigQueryFieldMode.NULLABLE,
+        ),
+        SchemaField(
+            name="call_id",
+            description="Unique per call",
+            field_type=StandardSqlTypeNames.STRING,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        _timestamp_field,
+    ],
+    time_partitioning_field="timestamp",
+    clustering_fields=["function_module", "function_name"],
+)
+
+function_call_counts_table_definition = BigQueryTableDefinition(
+    name="functioncallcounts",
+    schema=[
+        *_function_fields,
+        SchemaField(
+            name="call_count",
+            description="The number of calls since the last report, including the calls that weren't sampled",
+            field_type=StandardSqlTypeNames.INT64,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        SchemaField(
+            name="sent_count",
+            description="The number of those calls that were sampled and sent as functioncall events",
+            field_type=StandardSqlTypeNames.INT64,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        _timestamp_field,
+    ],
+    time_partitioning_field="timestamp",
+    clustering_fields=["function_module", "function_name"],
+)
+
+function_durations_table_definition = BigQueryTableDefinition(
+    name="functiondurations",
+    schema=[
+        *_function_fields,
+        SchemaField(
+            name="call_count",
+            description="The number of calls that finished since the last report",
+            field_type=StandardSqlTypeNames.INT64,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        SchemaField(
+            name="error_count",
+            description="The number of those calls that raised an exception",
+            field_type=StandardSqlTypeNames.INT64,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        SchemaField(
+            name="wall_time",
+            description="A histogram of the calls' wall clock durations, with `lower_bounds` and `sum` in nanoseconds",
+            field_type=StandardSqlTypeNames.JSON,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        SchemaField(
+            name="cpu_time",
+            description="A histogram of the calls' CPU time on the calling thread, with `lower_bounds` and `sum` in nanoseconds",
+            field_type=StandardSqlTypeNames.JSON,
+            mode=BigQueryFieldMode.REQUIRED,
+        ),
+        _timestamp_field,
+    ],
+    time_partitioning_field="timestamp",
+    clustering_fields=["function_module", "function_name"],
+)
+
+
+class _FunctionEventsTableHandle(BigQueryTableHandle):
+    # JSON columns are written as JSON text.
+    _json_fields: frozenset[str] = frozenset()
+
+    def _make_row(self, row_class: type[message.Message], event: dict[str, Any]) -> message.Message:
+        row = row_class(timestamp=round(event["timestamp"] * 1_000_000))
+
+        for field in self.table.schema:
+            if field.name == "timestamp":
+                continue
+
+            # A missing field is NULL.
+            if (value := event.get(field.name)) is None:
+                continue
+
+            if field.name in self._json_fields:
+                value = orjson.dumps(value).decode()
+
+            setattr(row, field.name, value)
+
+        return row
+
+    @override
+    async def insert(self, events: list[str]) -> None:
+        if len(events) == 0:
+            return
+
+        row_class = self.table.row_message_class
+        rows = [self._make_row(row_class, orjson.loads(e)).SerializeToString() for e in events]
+
+        writer = write_streams.get_writer(dataset_name=self.dataset_name, table=self.table)
+
+        # A writer only has a stream once the table exists.
+        if not writer.has_stream:
+            await bq_client.create_dataset(dataset_name=self.dataset_name)
+            await bq_client.create_table(
+                dataset_name=self.dataset_name,
+                table_name=self.table.name,
+                schema=self.table.schema,
+                time_partitioning_field=self.table.time_partitioning_field,
+                clustering_fields=self.table.clustering_fields,
+            )
+
+        await writer.append(rows)
+
+    @override
+    def query(self, query: str) -> AsyncIterator[Row]:
+        return bq_client.query(query=query)
+
+
+class FunctionCallsTableHandle(_FunctionEventsTableHandle):
+    table = function_calls_table_definition
+    _json_fields = frozenset(["function_args"])
+
+
+class FunctionCallCountsTableHandle(_FunctionEventsTableHandle):
+    table = function_call_counts_table_definition
+
+
+class FunctionDurationsTableHandle(_FunctionEventsTableHandle):
+    table = function_durations_table_definition
+    _json_fields = frozenset(["wall_time", "cpu_time"])
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class KnownBigQueryObjects:
+    """
+    A process-wide record of the BigQuery datasets, tables, and views that are known to exist, so that they're only created once instead of on every request.
+    Objects are keyed by dataset name and object name; tables and views share a namespace within a dataset. A dataset itself is keyed with no object name.
+    Datasets and tables are never dropped by this app, so entries don't expire.
+    """
+
+    _known: set[tuple[str, str | None]]
+    _creating: dict[tuple[str, str | None], asyncio.Future[object]]
+
+    def __init__(self) -> None:
+        self._known = set()
+        self._creating = {}
+
+    def contains(self, dataset: str, name: str | None = None) -> bool:
+        return (dataset, name) in self._known
+
+    def add(self, dataset: str, name: str | None = None) -> None:
+        self._known.add((dataset, name))
+
+    def discard(self, dataset: str, name: str | None = None) -> None:
+        self._known.discard((dataset, name))
+
+    def clear(self) -> None:
+        self._known.clear()
+
+    async def ensure(self, dataset: str, name: str | None, create: Callable[[], Awaitable[object]]) -> None:
+        """
+        Calls `create` unless the object is known to exist.
+        Concurrent calls for the same object wait for the same `create`, so that a burst of requests for a new team makes one API call per object.
+        """
+        key = (dataset, name)
+        if key in self._known:
+            return
+
+        task = self._creating.get(key)
+        if task is None:
+            task = asyncio.ensure_future(create())
+            self._creating[key] = task
+            task.add_done_callback(lambda t: self._created(key, t))
+
+        # Shielded, so that a cancelled caller doesn't cancel the creation for the others.
+        await asyncio.shield(task)
+
+    def _created(self, key: tuple[str, str | None], task: asyncio.Future[object]) -> None:
+        del self._creating[key]
+        if not task.cancelled() and task.exception() is None:
+            self._known.add(key)
+
+
+known_objects = KnownBigQueryObjects()
@@ -1,8 +1,11 @@
 from dataclasses import dataclass
 from enum import StrEnum
+from functools import cached_property
+from typing import AsyncIterator
 from uuid import UUID
-from google.cloud.bigquery import Dataset, SchemaField, Table
-from google.cloud.bigquery.table import RowIterator
+from google.cloud.bigquery import Dataset, SchemaField, StandardSqlTypeNames, Table
+from google.cloud.bigquery.table import Row
+from google.protobuf import descriptor_pb2, descriptor_pool, message, message_factory
 
 from eave.core.internal.bigquery import bq_client
 from eave.stdlib.config import SHARED_CONFIG
@@ -12,11 +15,59 @@ class BigQueryFieldMode(StrEnum):
     NULLABLE = "NULLABLE"
     REPEATED = "REPEATED"
 
+# How each column type is written with the Storage Write API.
+# https://cloud.google.com/bigquery/docs/write-api#data_type_conversions
+_PROTO_FIELD_TYPES = {
+    StandardSqlTypeNames.STRING: descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    StandardSqlTypeNames.JSON: descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    StandardSqlTypeNames.INT64: descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+    StandardSqlTypeNames.FLOAT64: descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+    StandardSqlTypeNames.BOOL: descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+    # Microseconds since the epoch
+    StandardSqlTypeNames.TIMESTAMP: descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+}
+
+
 @dataclass
 class BigQueryTableDefinition:
     name: str
     schema: list[SchemaField]
 
+    # A TIMESTAMP column to partition the table by, one partition per day, so that queries filtered on it only read the matching days.
+    time_partitioning_field: str | None = None
+
+    # Columns to cluster the table by, so that queries filtered on them only read the matching blocks.
+    clustering_fields: list[str] | None = None
+
+    @cached_property
+    def row_descriptor(self) -> descriptor_pb2.DescriptorProto:
+        """
+        A protobuf message type with one field per column, which the Storage Write API takes as the writer schema.
+        """
+        descriptor = descriptor_pb2.DescriptorProto(name="Row")
+        for number, field in enumerate(self.schema, start=1):
+            descriptor.field.add(
+                name=field.name,
+                number=number,
+                type=_PROTO_FIELD_TYPES[StandardSqlTypeNames(field.field_type)],
+                label=(
+                    descriptor_pb2.FieldDescriptorProto.LABEL_REPEATED
+                    if field.mode == BigQueryFieldMode.REPEATED
+                    else descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+                ),
+            )
+
+        return descriptor
+
+    @cached_property
+    def row_message_class(self) -> type[message.Message]:
+        """
+        The class for rows of this table, serialized with `SerializeToString()` for the Storage Write API.
+        """
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(descriptor_pb2.FileDescriptorProto(name=f"{self.name}.proto", message_type=[self.row_descriptor]))
+        return message_factory.GetMessageClass(pool.FindMessageTypeByName("Row"))
+
 class BigQueryTableHandle:
     table: BigQueryTableDefinition
 
@@ -27,16 +78,16 @@ class BigQueryTableHandle:
     def dataset_name(self) -> str:
         return f"team_{self.team_id.hex}"
 
-    def get_dataset(self) -> Dataset | None:
-        dataset = bq_client.get_dataset(dataset_name=self.dataset_name)
+    async def get_dataset(self) -> Dataset | None:
+        dataset = await bq_client.get_dataset(dataset_name=self.dataset_name)
         return dataset
 
-    def get_table(self) -> Table | None:
-        table = bq_client.get_table(dataset_name=self.dataset_name, table_name=self.table.name)
+    async def get_table(self) -> Table | None:
+        table = await bq_client.get_table(dataset_name=self.dataset_name, table_name=self.table.name)
         return table
 
     async def insert(self, events: list[str]) -> None:
         ...
 
-    async def query(self, query: str) -> RowIterator:
+    def query(self, query: str) -> AsyncIterator[Row]:
         ...
@@ -0,0 +1,270 @@
+"""
+Appends rows to BigQuery tables with the Storage Write API.
+
+Each table has one long-lived COMMITTED write stream, shared by every request that writes to that table.
+Appends are pipelined over a single connection per stream, and each one carries its offset in the stream, so that appends that were in flight when a connection dropped can be re-sent on a new connection without being written twice.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import google.api_core.exceptions
+from google.cloud.bigquery_storage_v1.services.big_query_write import BigQueryWriteAsyncClient
+from google.cloud.bigquery_storage_v1.types import (
+    AppendRowsRequest,
+    AppendRowsResponse,
+    ProtoRows,
+    ProtoSchema,
+    WriteStream,
+)
+from google.rpc import code_pb2
+
+from eave.core.internal.bigquery.types import BigQueryTableDefinition
+from eave.stdlib.config import SHARED_CONFIG
+from eave.stdlib.logging import eaveLogger
+
+_APPEND_TIMEOUT_SECONDS = 30
+
+# Number of times in a row that a dropped connection is re-established before its in-flight appends are failed.
+_MAX_RECONNECT_ATTEMPTS = 3
+
+
+class AppendRowsError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class _PendingAppend:
+    offset: int
+    rows: list[bytes]
+    future: asyncio.Future[None]
+
+
+async def _iterate_requests(requests: asyncio.Queue[AppendRowsRequest | None]) -> AsyncIterator[AppendRowsRequest]:
+    while (request := await requests.get()) is not None:
+        yield request
+
+
+class TableWriter:
+    """
+    Appends serialized rows (see `BigQueryTableDefinition.row_message_class`) to one table.
+    The write stream is created on the first append. If an append fails, the stream is abandoned and the next append creates a new one.
+    """
+
+    dataset_name: str
+    table: BigQueryTableDefinition
+    _stream_name: str | None
+    _next_offset: int
+    _pending: deque[_PendingAppend]
+    _requests: asyncio.Queue[AppendRowsRequest | None] | None
+    _schema_sent: bool
+    _reconnect_attempts: int
+    _reader: asyncio.Task[None] | None
+    _lock: asyncio.Lock
+
+    def __init__(self, *, dataset_name: str, table: BigQueryTableDefinition) -> None:
+        self.dataset_name = dataset_name
+        self.table = table
+        self._stream_name = None
+        self._next_offset = 0
+        self._pending = deque()
+        self._requests = None
+        self._schema_sent = False
+        self._reconnect_attempts = 0
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def table_path(self) -> str:
+        return f"projects/{SHARED_CONFIG.google_cloud_project}/datasets/{self.dataset_name}/tables/{self.table.name}"
+
+    @property
+    def has_stream(self) -> bool:
+        """
+        Whether a stream is open for the table, which also means that the table exists.
+        """
+        return self._stream_name is not None
+
+    async def append(self, rows: list[bytes], timeout: float = _APPEND_TIMEOUT_SECONDS) -> None:
+        """
+        Appends the rows, and waits until they're committed.
+        """
+        if len(rows) == 0:
+            return
+
+        async with self._lock:
+            if self._requests is None:
+                await self._connect()
+
+            pending = _PendingAppend(
+                offset=self._next_offset,
+                rows=rows,
+                future=asyncio.get_running_loop().create_future(),
+            )
+            self._next_offset += len(rows)
+            self._pending.append(pending)
+            self._send(pending)
+
+        # On timeout, the append stays in flight; it may still be committed.
+        await asyncio.wait_for(asyncio.shield(pending.future), timeout=timeout)
+
+    async def close(self) -> None:
+        """
+        Waits for in-flight appends, then finalizes the stream so that no more rows can be appended to it.
+        """
+        async with self._lock:
+            if self._pending:
+                await asyncio.wait([p.future for p in self._pending], timeout=_APPEND_TIMEOUT_SECONDS)
+
+            stream_name = self._stream_name
+            self._disconnect()
+            self._stream_name = None
+
+        if stream_name:
+            await get_client().finalize_write_stream(name=stream_name)
+
+    async def _connect(self) -> None:
+        client = get_client()
+
+        if self._stream_name is None:
+            stream = await client.create_write_stream(
+                parent=self.table_path,
+                write_stream=WriteStream(type_=WriteStream.Type.COMMITTED),
+            )
+            self._stream_name = stream.name
+            self._next_offset = 0
+
+        requests: asyncio.Queue[AppendRowsRequest | None] = asyncio.Queue()
+        responses = await client.append_rows(requests=_iterate_requests(requests))
+
+        self._requests = requests
+        self._schema_sent = False
+
+        # The appends that didn't get a response on the previous connection are re-sent at the same offsets.
+        # The ones that the server had already committed are answered with ALREADY_EXISTS.
+        for pending in self._pending:
+            self._send(pending)
+
+        self._reader = asyncio.create_task(self._read_responses(requests, aiter(responses)))
+
+    def _disconnect(self) -> None:
+        if self._requests:
+            self._requests.put_nowait(None)
+            self._requests = None
+
+    def _send(self, pending: _PendingAppend) -> None:
+        assert self._requests is not None
+
+        request = AppendRowsRequest(
+            offset=pending.offset,
+            proto_rows=AppendRowsRequest.ProtoData(rows=ProtoRows(serialized_rows=pending.rows)),
+        )
+
+        # Only the first request on a connection identifies the stream and its schema.
+        if not self._schema_sent:
+            request.write_stream = self._stream_name
+            request.proto_rows.writer_schema = ProtoSchema(proto_descriptor=self.table.row_descriptor)
+            self._schema_sent = True
+
+        self._requests.put_nowait(request)
+
+    async def _read_responses(
+        self,
+        requests: asyncio.Queue[AppendRowsRequest | None],
+        responses: AsyncIterator[AppendRowsResponse],
+    ) -> None:
+        """
+        Resolves the pending appends, in order, as their responses arrive on one connection.
+        """
+        try:
+            async for response in responses:
+                pending = self._pending.popleft()
+                self._reconnect_attempts = 0
+
+                if "error" in response and response.error.code != code_pb2.ALREADY_EXISTS:
+                    error = AppendRowsError(
+                        f"append at offset {pending.offset} to {self._stream_name} failed: {response.error.message} {list(response.row_errors)}"
+                    )
+                    pending.future.set_exception(error)
+                    self._abandon_stream(error)
+                    return
+
+                pending.future.set_result(None)
+
+        except google.api_core.exceptions.GoogleAPICallError as e:
+            eaveLogger.warning(f"BigQuery write stream connection for {self.table_path} dropped: {e}")
+
+        if self._requests is not requests:
+            # This connection was already replaced or closed.
+            return
+
+        self._requests = None
+
+        if not self._pending:
+            # An idle connection was closed by the server; the next append reconnects.
+            return
+
+        self._reconnect_attempts += 1
+        if self._reconnect_attempts > _MAX_RECONNECT_ATTEMPTS:
+            self._abandon_stream(AppendRowsError(f"couldn't reconnect to {self._stream_name}"))
+            return
+
+        async with self._lock:
+            if self._requests is None and self._pending:
+                try:
+                    await self._connect()
+                except Exception as e:
+                    self._abandon_stream(e)
+
+    def _abandon_stream(self, error: Exception) -> None:
+        """
+        Fails every in-flight append. An append can only be committed once all the rows before it are, so none of them can succeed anymore.
+        """
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+        self._disconnect()
+        self._stream_name = None
+        self._reconnect_attempts = 0
+
+
+_client: BigQueryWriteAsyncClient | None = None
+_writers: dict[tuple[str, str], TableWriter] = {}
+
+
+def get_client() -> BigQueryWriteAsyncClient:
+    # The client's gRPC channel belongs to the event loop that it's created in, so it's created on first use rather than on import.
+    global _client
+    if _client is None:
+        _client = BigQueryWriteAsyncClient()
+    return _client
+
+
+def get_writer(*, dataset_name: str, table: BigQueryTableDefinition) -> TableWriter:
+    key = (dataset_name, table.name)
+    writer = _writers.get(key)
+    if writer is None:
+        writer = TableWriter(dataset_name=dataset_name, table=table)
+        _writers[key] = writer
+    return writer
+
+
+async def close() -> None:
+    global _client
+
+    writers = list(_writers.values())
+    _writers.clear()
+
+    for writer in writers:
+        try:
+            await writer.close()
+        except Exception as e:
+            eaveLogger.exception(e)
+
+    if _client:
+        await _client.transport.close()
+        _client = None
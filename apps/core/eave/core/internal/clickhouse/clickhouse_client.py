@@ -1,14 +1,193 @@
+"""
+Async access to ClickHouse.
+
+clickhouse_connect is synchronous, so every call runs on a bounded thread pool instead of blocking the event loop.
+Each worker thread has its own client, because a client can only run one query at a time.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import Any, Callable, Sequence
+
 import clickhouse_connect
 import clickhouse_connect.driver.exceptions
+from clickhouse_connect.datatypes.base import ClickHouseType
+from clickhouse_connect.driver.client import Client
+from clickhouse_connect.driver.query import QueryResult
+
+from eave.core.internal.clickhouse.known_objects import known_objects
 from eave.core.internal.config import CORE_API_APP_CONFIG
 
-chclient = clickhouse_connect.get_client(
-    host=CORE_API_APP_CONFIG.clickhouse_host,
-    settings={
-        "session_timezone": "UTC",
-    },
-)
+_MAX_WORKERS = 8
+_DEFAULT_TIMEOUT_SECONDS = 30
+
+# A client that has been idle for longer than this is pinged before it's used, and replaced if the ping fails.
+_HEALTH_CHECK_INTERVAL_SECONDS = 30
+
+
+class _WorkerClient(threading.local):
+    client: Client | None = None
+    last_used: float = 0
+
+
+_worker = _WorkerClient()
+_clients: set[Client] = set()
+_clients_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="clickhouse")
+    return _executor
+
+
+def _make_client() -> Client:
+    client = clickhouse_connect.get_client(
+        host=CORE_API_APP_CONFIG.clickhouse_host,
+        settings={
+            "session_timezone": "UTC",
+        },
+    )
+
+    with _clients_lock:
+        _clients.add(client)
+
+    return client
+
+
+def _discard_client(client: Client) -> None:
+    with _clients_lock:
+        _clients.discard(client)
+
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def _get_worker_client() -> Client:
+    """
+    The calling worker thread's client, checking its health first if it has been idle.
+    """
+    now = time.monotonic()
+    client = _worker.client
+
+    if client and now - _worker.last_used > _HEALTH_CHECK_INTERVAL_SECONDS and not client.ping():
+        _discard_client(client)
+        client = None
+
+    if client is None:
+        client = _make_client()
+
+    _worker.client = client
+    _worker.last_used = now
+    return client
+
+
+def _call[T](f: Callable[[Client], T]) -> T:
+    client = _get_worker_client()
+    try:
+        return f(client)
+    except clickhouse_connect.driver.exceptions.OperationalError:
+        # The connection is suspect; the next call on this thread starts with a new client.
+        _discard_client(client)
+        _worker.client = None
+        raise
+
+
+async def _run[T](f: Callable[[Client], T], timeout: float) -> T:
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(_get_executor(), _call, f), timeout=timeout)
+
+
+def _with_timeout(settings: dict[str, Any] | None, timeout: float) -> dict[str, Any]:
+    # The caller stops waiting after `timeout`, but the worker thread can't be interrupted, so the server is asked to give up at the same time.
+    return {"max_execution_time": int(timeout), **(settings or {})}
+
+
+async def command(cmd: str, settings: dict[str, Any] | None = None, timeout: float = _DEFAULT_TIMEOUT_SECONDS) -> Any:
+    settings = _with_timeout(settings, timeout)
+    return await _run(lambda client: client.command(cmd, settings=settings), timeout=timeout)
+
+
+async def query(query: str, settings: dict[str, Any] | None = None, timeout: float = _DEFAULT_TIMEOUT_SECONDS) -> QueryResult:
+    settings = _with_timeout(settings, timeout)
+    return await _run(lambda client: client.query(query, settings=settings), timeout=timeout)
+
+
+async def insert(
+    *,
+    database: str,
+    table: str,
+    column_names: Sequence[str],
+    column_types: Sequence[ClickHouseType],
+    data: Sequence[Sequence[Any]],
+    column_oriented: bool = False,
+    settings: dict[str, Any] | None = None,
+    timeout: float = _DEFAULT_TIMEOUT_SECONDS,
+) -> None:
+    settings = _with_timeout(settings, timeout)
+    await _run(
+        lambda client: client.insert(
+            database=database,
+            table=table,
+            column_names=column_names,
+            column_types=column_types,
+            data=data,
+            column_oriented=column_oriented,
+            settings=settings,
+        ),
+        timeout=timeout,
+    )
+
+
+async def ping(timeout: float = 5) -> bool:
+    try:
+        return await _run(lambda client: client.ping(), timeout=timeout)
+    except Exception:
+        return False
+
+
+async def close() -> None:
+    global _executor
+    if _executor:
+        executor = _executor
+        _executor = None
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    with _clients_lock:
+        clients = list(_clients)
+        _clients.clear()
+
+    for client in clients:
+        _discard_client(client)
+
+
+async def warm_known_objects() -> None:
+    """
+    Loads every existing database, table, and view into `known_objects`, so that the first request for each team doesn't issue DDL for objects that already exist.
+    """
+    databases = (await query("SELECT name FROM system.databases")).result_rows
+    objects = (await query("SELECT database, name FROM system.tables")).result_rows
+    known_objects.add_all(
+        databases=[name for (name,) in databases],
+        objects=[(database, name) for (database, name) in objects],
+    )
+
+
+async def ensure_known_objects_warm() -> None:
+    if not known_objects.warmed:
+        await warm_known_objects()
 
 
 async def create_database(name: str) -> None:
-    chclient.command(f"CREATE DATABASE IF NOT EXISTS {name}")
+    await ensure_known_objects_warm()
+    if known_objects.contains(database=name):
+        return
+
+    await command(f"CREATE DATABASE IF NOT EXISTS {name}")
+    known_objects.add(database=name)
@@ -1,32 +1,73 @@
-from datetime import datetime
-import json
 import re
 from textwrap import dedent
 from typing import Any, override
 from clickhouse_connect.datatypes.base import EMPTY_TYPE_DEF, TypeDef
-from clickhouse_connect.datatypes.temporal import DateTime64
-from clickhouse_connect.datatypes.numeric import Enum
-from clickhouse_connect.datatypes.string import String
+from clickhouse_connect.datatypes.temporal import DateTime, DateTime64
+from clickhouse_connect.datatypes.numeric import Enum, UInt64
 from clickhouse_connect.datatypes.container import JSON
-from clickhouse_connect.driver.ddl import TableColumnDef
+from clickhouse_connect.datatypes.registry import get_from_name
+import orjson
 
 from clickhouse_connect.driver.query import QueryResult
-from eave.core.internal import database
 from eave.core.internal.clickhouse import clickhouse_client
-from eave.core.internal.clickhouse.types import ClickHouseTableDefinition, ClickHouseTableHandle
-from eave.core.internal.orm.virtual_event import VirtualEventOrm, make_virtual_event_readable_name
-from eave.monitoring.datastructures import DatabaseChangeEventPayload, DatabaseChangeOperation
+from eave.core.internal.clickhouse.known_objects import known_objects
+from eave.core.internal.clickhouse.types import (
+    ClickHouseColumnDefinition,
+    ClickHouseTableDefinition,
+    ClickHouseTableHandle,
+)
+from eave.core.internal.config import CORE_API_APP_CONFIG
+from eave.core.internal.orm.virtual_event import make_virtual_event_readable_name
+from eave.core.internal.virtual_events import virtual_events
+from eave.monitoring.datastructures import DatabaseChangeOperation
+from eave.stdlib.logging import eaveLogger
 from eave.stdlib.util import sql_sanitized_identifier, sql_sanitized_literal, tableize, titleize
 
 
+def _ttl() -> str | None:
+    """
+    Moves changes to the cold volume and deletes them once they're old enough, if configured.
+    """
+    rules: list[str] = []
+
+    if CORE_API_APP_CONFIG.clickhouse_cold_volume:
+        rules.append(
+            f"toDateTime(timestamp) + INTERVAL {CORE_API_APP_CONFIG.clickhouse_cold_after_days} DAY"
+            f" TO VOLUME '{CORE_API_APP_CONFIG.clickhouse_cold_volume}'"
+        )
+
+    if CORE_API_APP_CONFIG.clickhouse_retention_days:
+        rules.append(f"toDateTime(timestamp) + INTERVAL {CORE_API_APP_CONFIG.clickhouse_retention_days} DAY DELETE")
+
+    return ", ".join(rules) or None
+
+
+def _table_settings() -> dict[str, Any]:
+    settings: dict[str, Any] = {}
+
+    if CORE_API_APP_CONFIG.clickhouse_storage_policy:
+        settings["storage_policy"] = CORE_API_APP_CONFIG.clickhouse_storage_policy
+
+    # Drop whole parts when they expire, rather than rewriting them without the expired rows.
+    # Parts never span partitions, so with monthly partitions this deletes at most a month late.
+    settings["ttl_only_drop_parts"] = 1
+    return settings
+
+
+# Partitioned by month, so that retention drops whole parts and queries over a time range skip the other months.
+# The primary key matches the virtual event views, which filter on (table_name, operation) and order by timestamp.
 table_definition = ClickHouseTableDefinition(
     name="dbchanges",
     columns=[
-        TableColumnDef(name="table_name", ch_type=String(EMPTY_TYPE_DEF)),
-        TableColumnDef(name="operation", ch_type=Enum(TypeDef(values=tuple(DatabaseChangeOperation._member_names_)))),
-        TableColumnDef(name="timestamp", ch_type=DateTime64(TypeDef(values=(6, "'UTC'")))),
-        TableColumnDef(name="old_data", ch_type=JSON(EMPTY_TYPE_DEF)),
-        TableColumnDef(name="new_data", ch_type=JSON(EMPTY_TYPE_DEF)),
+        ClickHouseColumnDefinition(name="table_name", ch_type=get_from_name("LowCardinality(String)")),
+        ClickHouseColumnDefinition(
+            name="operation", ch_type=Enum(TypeDef(values=tuple(DatabaseChangeOperation._member_names_)))
+        ),
+        ClickHouseColumnDefinition(
+            name="timestamp", ch_type=DateTime64(TypeDef(values=(6, "'UTC'"))), codec="Delta(8), ZSTD(1)"
+        ),
+        ClickHouseColumnDefinition(name="old_data", ch_type=JSON(EMPTY_TYPE_DEF)),
+        ClickHouseColumnDefinition(name="new_data", ch_type=JSON(EMPTY_TYPE_DEF)),
     ],
     primary_key_columns=[
         "table_name",
@@ -34,6 +75,35 @@ table_definition = ClickHouseTableDefinition(
         "timestamp",
     ],
     engine="MergeTree",
+    partition_by="toYYYYMM(timestamp)",
+    ttl=_ttl(),
+    table_settings=_table_settings(),
+    schema_version=2,
+)
+
+# The number of changes per table, operation, and hour, so that dashboards can chart virtual events without reading every change.
+# Rows with the same key are summed when parts are merged, so queries must still `sum(count)` and `GROUP BY`.
+# It's small and `dbchanges_counts_mv` writes to it, so it must never need rebuilding (see `migrations`):
+# it isn't partitioned, and its key columns keep the types they were created with (eg `table_name` stays String rather than LowCardinality(String)).
+counts_table_definition = ClickHouseTableDefinition(
+    name="dbchanges_counts",
+    columns=[
+        ClickHouseColumnDefinition(name="table_name", ch_type=get_from_name("String")),
+        ClickHouseColumnDefinition(
+            name="operation", ch_type=Enum(TypeDef(values=tuple(DatabaseChangeOperation._member_names_)))
+        ),
+        ClickHouseColumnDefinition(
+            name="bucket", ch_type=DateTime(TypeDef(values=("'UTC'",))), codec="Delta(4), ZSTD(1)"
+        ),
+        ClickHouseColumnDefinition(name="count", ch_type=UInt64(EMPTY_TYPE_DEF)),
+    ],
+    primary_key_columns=[
+        "table_name",
+        "operation",
+        "bucket",
+    ],
+    engine="SummingMergeTree",
+    schema_version=2,
 )
 
 
@@ -44,7 +114,11 @@ class DatabaseChangesTableHandle(ClickHouseTableHandle):
         vevent_readable_name = make_virtual_event_readable_name(operation=operation, table_name=source_table)
         vevent_view_name = tableize(vevent_readable_name)
 
-        clickhouse_client.chclient.command(
+        await clickhouse_client.ensure_known_objects_warm()
+        if known_objects.contains(database=self.database, name=vevent_view_name):
+            return
+
+        await clickhouse_client.command(
             dedent(
                 """
                 CREATE VIEW IF NOT EXISTS {database}.{view_name} AS
@@ -67,67 +141,110 @@ class DatabaseChangesTableHandle(ClickHouseTableHandle):
             ).strip(),
         )
 
-        async with database.async_session.begin() as db_session:
-            vevent_query = await VirtualEventOrm.query(session=db_session, params=VirtualEventOrm.QueryParams())
+        known_objects.add(database=self.database, name=vevent_view_name)
 
-            if not vevent_query.one_or_none():
-                await VirtualEventOrm.create(
-                    session=db_session,
-                    team_id=self.team_id,
-                    view_name=vevent_view_name,
-                    readable_name=vevent_readable_name,
-                    description=f"{operation} operation on the {source_table} table.",
+    async def create_rollups(self) -> None:
+        """
+        The virtual event views don't need materializing: `dbchanges` is ordered by (table_name, operation, timestamp), so each one reads only its own range of the table, already in order.
+        """
+        await self.create_table(counts_table_definition)
+        await self.create_materialized_view(
+            name=f"{counts_table_definition.name}_mv",
+            to_table=counts_table_definition,
+            select=dedent(
+                """
+                SELECT
+                    `table_name`,
+                    `operation`,
+                    toStartOfHour(`timestamp`) AS `bucket`,
+                    count() AS `count`
+                FROM
+                    {database}.{table_name}
+                GROUP BY
+                    `table_name`,
+                    `operation`,
+                    `bucket`
+                """.format(
+                    database=sql_sanitized_identifier(self.database),
+                    table_name=sql_sanitized_identifier(self.table.name),
                 )
+            ).strip(),
+        )
 
     @override
     async def insert(self, events: list[str]) -> None:
         if len(events) == 0:
             return
 
-        dbchange_events = [DatabaseChangeEventPayload(**json.loads(e)) for e in events]
+        columns = parse_columns(events)
 
         await clickhouse_client.create_database(name=self.database)
         await self.create_table()
+        await self.create_rollups()
 
         # Each Eave team has its own database (effectively a namespace), each with its own tables, eg `dbchanges`.
         # Because the JSON columns (eg new_data) expand arbitrary JSON keys into concrete columns, sharing tables for all customers would result in every row having columns from all customers, a non-starter for both privacy and scalability. Even with columnar database, there is a soft upper limit on number of columns (on the order of 10k).
         # By separating the tables, each team only has columns for their data.
         # Additionally, for the dbchanges table, `new_data` and `old_data` have nested within them the name of the table, eg: `"new_data": { "teams": { "name": "...", ... } }`. This way, the columns from each database table are isolated from others, allowing us to groups the clickhouse columns by table name.
-        clickhouse_client.chclient.insert(
+        await clickhouse_client.insert(
             database=self.database,
             table=self.table.name,
             column_names=self.table.column_names,
             column_types=self.table.column_types,
-            data=[self._format_row(e) for e in dbchange_events],
+            data=[columns[c.name] for c in self.table.columns],
+            column_oriented=True,
             settings={
                 "async_insert": 1,
                 "wait_for_async_insert": 1,
             },
         )
 
-        unique_operations = set((e.operation, e.table_name) for e in dbchange_events)
+        unique_operations = set(zip(columns["operation"], columns["table_name"]))
 
-        # FIXME: This is vulnerable to a DoS where unique `table_name` is generated and inserted on a loop.
-        for operation, table_name in unique_operations:
-            await self.create_vevent_view(operation=operation, source_table=table_name)
+        # The rows are already committed, so a failure here mustn't fail the insert; the caller would write them again.
+        # Virtual events that weren't created are tried again with a later batch.
+        try:
+            await virtual_events.ensure(
+                team_id=self.team_id,
+                operations=unique_operations,
+                create_view=self.create_vevent_view,
+            )
+        except Exception as e:
+            eaveLogger.exception(e)
 
     @override
     async def query(self, query: str) -> QueryResult:
-        results = clickhouse_client.chclient.query(query)
+        results = await clickhouse_client.query(query)
         return results
 
-    def _format_row(self, event: DatabaseChangeEventPayload) -> list[Any]:
-        """
-        >>> _format_row(event=RawEvent(event_type="dbchange", payload='{"timestamp":"2023-12-22T17:09:22.797036", "table_name":"accounts", "operation":"INSERT", "new_data":"_new", "old_data":"_old"}'))
-        {'table_name': 'accounts', 'operation': 'INSERT', 'timestamp': '2023-12-22T17:09:22.797036', 'new_data': {'accounts': '_new'}, 'old_data': {'accounts': '_old'}}
-        """
-        d = {
-            "table_name": event.table_name,
-            "operation": event.operation,
-            "timestamp": datetime.fromtimestamp(event.timestamp),
-            "new_data": {event.table_name: event.new_data},
-            "old_data": {event.table_name: event.old_data},
-        }
-
-        # This effectively puts the values in the right order.
-        return [d[c.name] for c in self.table.columns]
+
+def parse_columns(events: list[str]) -> dict[str, list[Any]]:
+    """
+    Parses a batch of serialized DatabaseChangeEventPayloads straight into one list per `dbchanges` column, for a column-oriented insert.
+    Timestamps are converted to DateTime64(6) ticks (microseconds since the epoch), which ClickHouse takes as-is.
+
+    >>> parse_columns(['{"table_name":"accounts","operation":"INSERT","timestamp":1703264962.797036,"new_data":{"id":1},"old_data":null}'])
+    {'table_name': ['accounts'], 'operation': ['INSERT'], 'timestamp': [1703264962797036], 'old_data': [{'accounts': None}], 'new_data': [{'accounts': {'id': 1}}]}
+    """
+    table_names: list[str] = []
+    operations: list[str] = []
+    timestamps: list[int] = []
+    old_data: list[dict[str, Any]] = []
+    new_data: list[dict[str, Any]] = []
+
+    for e in events:
+        event = orjson.loads(e)
+        table_name = event["table_name"]
+        table_names.append(table_name)
+        operations.append(event["operation"])
+        timestamps.append(round(event["timestamp"] * 1_000_000))
+        old_data.append({table_name: event["old_data"]})
+        new_data.append({table_name: event["new_data"]})
+
+    return {
+        "table_name": table_names,
+        "operation": operations,
+        "timestamp": timestamps,
+        "old_data": old_data,
+        "new_data": new_data,
+    }
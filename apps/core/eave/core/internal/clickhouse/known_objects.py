@@ -0,0 +1,56 @@
+import time
+
+# Entries expire so that an object dropped outside of this process (eg by hand) is eventually re-created.
+_DEFAULT_TTL_SECONDS = 60 * 60
+
+
+class KnownSchemaObjects:
+    """
+    A process-wide record of the ClickHouse databases, tables, and views that are known to exist, so that they're only created once instead of on every request.
+    Objects are keyed by database name and object name; tables and views share a namespace within a database. A database itself is keyed with no object name.
+    """
+
+    ttl_seconds: float
+    warmed: bool
+    _expires: dict[tuple[str, str | None], float]
+
+    def __init__(self, ttl_seconds: float = _DEFAULT_TTL_SECONDS) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.warmed = False
+        self._expires = {}
+
+    def contains(self, database: str, name: str | None = None) -> bool:
+        expires = self._expires.get((database, name))
+        if expires is None:
+            return False
+
+        if expires < time.monotonic():
+            del self._expires[(database, name)]
+            return False
+
+        return True
+
+    def add(self, database: str, name: str | None = None) -> None:
+        self._expires[(database, name)] = time.monotonic() + self.ttl_seconds
+
+    def add_all(self, databases: list[str], objects: list[tuple[str, str]]) -> None:
+        """
+        Records everything that already exists, eg from ClickHouse's `system.databases` and `system.tables`.
+        """
+        expires = time.monotonic() + self.ttl_seconds
+        for database in databases:
+            self._expires[(database, None)] = expires
+        for database, name in objects:
+            self._expires[(database, name)] = expires
+
+        self.warmed = True
+
+    def discard(self, database: str, name: str | None = None) -> None:
+        self._expires.pop((database, name), None)
+
+    def clear(self) -> None:
+        self._expires.clear()
+        self.warmed = False
+
+
+known_objects = KnownSchemaObjects()
@@ -0,0 +1,232 @@
+"""
+Brings existing ClickHouse tables up to date with their definitions, while they keep receiving inserts.
+
+Columns whose type or codec differs from the existing table's are changed in place, and so is the TTL.
+The partition key can't be changed in place, and neither can the type of a sorting key column (ClickHouse only allows that when it doesn't rewrite the data), so in either case the table is rebuilt:
+
+1. Merges are stopped on the table, so that its current parts keep their names.
+2. The rows in those parts are copied into a new table with the new definition.
+3. The two tables are swapped atomically with EXCHANGE TABLES, so inserts go to the new table from then on.
+4. The rows that were inserted into the old table during the copy are copied too, and the old table is dropped.
+
+Materialized views that read from the table are dropped before the swap and re-created after the second copy, so that those rows aren't counted twice.
+Rows inserted while the views are gone (usually a second or two) aren't seen by them.
+Tables that materialized views write to must not be rebuilt, because a view keeps writing to the same table after the swap; give them a definition that only needs `ALTER`s.
+"""
+
+from dataclasses import dataclass
+import re
+
+from eave.core.internal.clickhouse import clickhouse_client
+from eave.core.internal.clickhouse.types import ClickHouseTableDefinition, schema_version_comment
+from eave.stdlib.logging import eaveLogger
+
+# Copying a large table takes much longer than a normal query.
+_COPY_TIMEOUT_SECONDS = 60 * 60
+
+_MIGRATING_SUFFIX = "__migrating"
+
+
+@dataclass
+class ExistingColumn:
+    type: str
+
+    # As reported by ClickHouse, eg "CODEC(Delta(8), ZSTD(1))", or "" for the default codec.
+    codec: str
+
+    in_sorting_key: bool
+
+
+@dataclass
+class ExistingTable:
+    partition_key: str
+
+    # The engine and the table's clauses (PARTITION BY, ORDER BY, TTL, SETTINGS), but not its column definitions.
+    engine_full: str
+
+    columns: dict[str, ExistingColumn]
+
+    @property
+    def has_ttl(self) -> bool:
+        # Column definitions aren't included, so this is the table TTL and not a column TTL.
+        return re.search(r"\bTTL\b", self.engine_full) is not None
+
+
+async def schema_version(*, database: str, table: ClickHouseTableDefinition) -> int | None:
+    """
+    The version of the table's definition that the existing table was created or last migrated with; 0 if it predates versioning, or None if it doesn't exist.
+    """
+    rows = (
+        await clickhouse_client.query(
+            f"SELECT comment FROM system.tables WHERE database = '{database}' AND name = '{table.name}'"
+        )
+    ).result_rows
+
+    if not rows:
+        return None
+
+    (comment,) = rows[0]
+    for version in range(table.schema_version, 0, -1):
+        if comment == schema_version_comment(version):
+            return version
+
+    return 0
+
+
+async def migrate_table(*, database: str, table: ClickHouseTableDefinition) -> bool:
+    """
+    Migrates the table if it exists and its schema version is older than its definition's. Returns whether it was migrated.
+    """
+    version = await schema_version(database=database, table=table)
+    if version is None or version >= table.schema_version:
+        return False
+
+    eaveLogger.info(f"migrating {database}.{table.name} from schema version {version} to {table.schema_version}")
+
+    existing = await describe_table(database=database, table=table)
+
+    if needs_rebuild(existing=existing, table=table):
+        await _rebuild(database=database, table=table)
+    else:
+        await _alter(database=database, table=table, existing=existing)
+
+    await clickhouse_client.command(
+        f"ALTER TABLE {database}.{table.name} MODIFY COMMENT '{schema_version_comment(table.schema_version)}'"
+    )
+    return True
+
+
+async def describe_table(*, database: str, table: ClickHouseTableDefinition) -> ExistingTable:
+    partition_key, engine_full = (
+        await clickhouse_client.query(
+            f"SELECT partition_key, engine_full FROM system.tables WHERE database = '{database}' AND name = '{table.name}'"
+        )
+    ).result_rows[0]
+
+    columns = {
+        name: ExistingColumn(type=type, codec=codec, in_sorting_key=bool(in_sorting_key))
+        for (name, type, codec, in_sorting_key) in (
+            await clickhouse_client.query(
+                f"SELECT name, type, compression_codec, is_in_sorting_key FROM system.columns WHERE database = '{database}' AND table = '{table.name}'"
+            )
+        ).result_rows
+    }
+
+    return ExistingTable(partition_key=partition_key, engine_full=engine_full, columns=columns)
+
+
+def needs_rebuild(*, existing: ExistingTable, table: ClickHouseTableDefinition) -> bool:
+    """
+    Whether the existing table has to be rebuilt rather than altered in place, which is when its partition key or the type of one of its sorting key columns changed.
+    """
+    if _normalize(existing.partition_key) != _normalize(table.partition_by or ""):
+        return True
+
+    for column in table.columns:
+        existing_column = existing.columns.get(column.name)
+        if (
+            existing_column
+            and existing_column.in_sorting_key
+            and _normalize(existing_column.type) != _normalize(column.ch_type.name)
+        ):
+            return True
+
+    return False
+
+
+async def _alter(*, database: str, table: ClickHouseTableDefinition, existing: ExistingTable) -> None:
+    for column in table.columns:
+        existing_column = existing.columns.get(column.name)
+
+        if existing_column is None:
+            await clickhouse_client.command(
+                f"ALTER TABLE {database}.{table.name} ADD COLUMN IF NOT EXISTS {column.col_expr}",
+                settings={"allow_experimental_object_type": 1},
+            )
+            continue
+
+        codec = f"CODEC({column.codec})" if column.codec else ""
+        same_type = _normalize(existing_column.type) == _normalize(column.ch_type.name)
+        same_codec = _normalize(existing_column.codec) == _normalize(codec)
+        if same_type and same_codec:
+            continue
+
+        # Changing a column's type rewrites it in the background; changing only its codec applies to newly written parts.
+        await clickhouse_client.command(
+            f"ALTER TABLE {database}.{table.name} MODIFY COLUMN {column.col_expr}",
+            settings={"allow_experimental_object_type": 1},
+            timeout=_COPY_TIMEOUT_SECONDS,
+        )
+
+    if table.ttl:
+        await clickhouse_client.command(f"ALTER TABLE {database}.{table.name} MODIFY TTL {table.ttl}")
+    elif existing.has_ttl:
+        # ClickHouse refuses to remove a TTL from a table that doesn't have one.
+        await clickhouse_client.command(f"ALTER TABLE {database}.{table.name} REMOVE TTL")
+
+
+async def _rebuild(*, database: str, table: ClickHouseTableDefinition) -> None:
+    name = f"{database}.{table.name}"
+    migrating_name = f"{database}.{table.name}{_MIGRATING_SUFFIX}"
+    columns = ", ".join(table.column_names)
+
+    await clickhouse_client.command(f"SYSTEM STOP MERGES {name}")
+
+    try:
+        parts = [
+            part
+            for (part,) in (
+                await clickhouse_client.query(
+                    f"SELECT name FROM system.parts WHERE database = '{database}' AND table = '{table.name}' AND active"
+                )
+            ).result_rows
+        ]
+        parts_list = ", ".join(f"'{p}'" for p in parts)
+
+        await clickhouse_client.command(f"DROP TABLE IF EXISTS {migrating_name}")
+        await clickhouse_client.command(
+            table.create_statement(database=database, name=f"{table.name}{_MIGRATING_SUFFIX}"),
+            settings={"allow_experimental_object_type": 1},
+        )
+
+        if parts:
+            await clickhouse_client.command(
+                f"INSERT INTO {migrating_name} ({columns}) SELECT {columns} FROM {name} WHERE _part IN ({parts_list})",
+                timeout=_COPY_TIMEOUT_SECONDS,
+            )
+
+        views = (
+            await clickhouse_client.query(
+                f"""
+                SELECT name, create_table_query FROM system.tables
+                WHERE database = '{database}' AND engine = 'MaterializedView' AND has(
+                    (SELECT dependencies_table FROM system.tables WHERE database = '{database}' AND name = '{table.name}'),
+                    name
+                )
+                """
+            )
+        ).result_rows
+
+        for view_name, _ in views:
+            await clickhouse_client.command(f"DROP VIEW {database}.{view_name}")
+
+        await clickhouse_client.command(f"EXCHANGE TABLES {name} AND {migrating_name}")
+
+        # The old table is now `migrating_name`. Copy what was inserted into it since the parts were listed.
+        await clickhouse_client.command(
+            f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {migrating_name}"
+            + (f" WHERE _part NOT IN ({parts_list})" if parts else ""),
+            timeout=_COPY_TIMEOUT_SECONDS,
+        )
+
+        for _, create_query in views:
+            await clickhouse_client.command(create_query)
+
+        await clickhouse_client.command(f"DROP TABLE {migrating_name}")
+
+    finally:
+        await clickhouse_client.command(f"SYSTEM START MERGES {name}")
+
+
+def _normalize(expr: str) -> str:
+    return "".join(expr.split())
@@ -1,11 +1,11 @@
-from dataclasses import dataclass
-from textwrap import dedent
+from dataclasses import dataclass, field
+from typing import Any
 from uuid import UUID
 
 from clickhouse_connect.datatypes.base import ClickHouseType
-from clickhouse_connect.driver.ddl import TableColumnDef
 
 from eave.core.internal.clickhouse import clickhouse_client
+from eave.core.internal.clickhouse.known_objects import known_objects
 
 
 @dataclass
@@ -13,13 +13,41 @@ class ClickHouseDatabase:
     name: str
 
 
+@dataclass
+class ClickHouseColumnDefinition:
+    name: str
+    ch_type: ClickHouseType
+
+    # eg "Delta(8), ZSTD(1)". Spelled the way ClickHouse reports it in `system.columns`, with every codec's parameters, so that migrations can tell whether it changed.
+    # https://clickhouse.com/docs/en/sql-reference/statements/create/table#column-compression-codecs
+    codec: str | None = None
+
+    @property
+    def col_expr(self) -> str:
+        expr = f"{self.name} {self.ch_type.name}"
+        if self.codec:
+            expr += f" CODEC({self.codec})"
+        return expr
+
+
 @dataclass
 class ClickHouseTableDefinition:
     name: str
-    columns: list[TableColumnDef]
+    columns: list[ClickHouseColumnDefinition]
     engine: str
     primary_key_columns: list[str]
 
+    # eg "toYYYYMM(timestamp)"
+    partition_by: str | None = None
+
+    # eg "toDateTime(timestamp) + INTERVAL 1 YEAR DELETE"
+    ttl: str | None = None
+
+    table_settings: dict[str, Any] = field(default_factory=dict)
+
+    # Increment whenever the definition changes, so that existing tables are migrated (see `migrations.migrate_table`).
+    schema_version: int = 1
+
     @property
     def column_names(self) -> list[str]:
         return [c.name for c in self.columns]
@@ -28,6 +56,38 @@ class ClickHouseTableDefinition:
     def column_types(self) -> list[ClickHouseType]:
         return [c.ch_type for c in self.columns]
 
+    def create_statement(self, *, database: str, name: str | None = None) -> str:
+        """
+        The CREATE TABLE statement for this definition, optionally under a different name.
+        The schema version is kept in the table's comment.
+        """
+        pkey = ", ".join(self.primary_key_columns)
+        columns = ", ".join(c.col_expr for c in self.columns)
+
+        clauses = [
+            f"CREATE TABLE IF NOT EXISTS {database}.{name or self.name}",
+            f"({columns})",
+            f"ENGINE {self.engine}",
+        ]
+
+        if self.partition_by:
+            clauses.append(f"PARTITION BY {self.partition_by}")
+
+        clauses.append(f"PRIMARY KEY ({pkey})")
+
+        if self.ttl:
+            clauses.append(f"TTL {self.ttl}")
+
+        if self.table_settings:
+            clauses.append("SETTINGS " + ", ".join(f"{k} = {v!r}" for k, v in self.table_settings.items()))
+
+        clauses.append(f"COMMENT '{schema_version_comment(self.schema_version)}'")
+        return "\n".join(clauses)
+
+
+def schema_version_comment(version: int) -> str:
+    return f"eave_schema_version={version}"
+
 
 class ClickHouseTableHandle:
     table: ClickHouseTableDefinition
@@ -39,24 +99,40 @@ class ClickHouseTableHandle:
     def database(self) -> str:
         return self.team_id.hex
 
-    async def create_table(self) -> None:
-        pkey = ", ".join(self.table.primary_key_columns)
-        columns = ", ".join(c.col_expr for c in self.table.columns)
-
-        clickhouse_client.chclient.command(
-            dedent(
-                f"""
-                CREATE TABLE IF NOT EXISTS {self.database}.{self.table.name}
-                ({columns})
-                ENGINE {self.table.engine}
-                PRIMARY KEY ({pkey})
-                """
-            ).strip(),
+    async def create_table(self, table: ClickHouseTableDefinition | None = None) -> None:
+        """
+        Creates the handle's table, or another table in the handle's database (eg a rollup).
+        """
+        table = table or self.table
+
+        await clickhouse_client.ensure_known_objects_warm()
+        if known_objects.contains(database=self.database, name=table.name):
+            return
+
+        await clickhouse_client.command(
+            table.create_statement(database=self.database),
             settings={
                 "allow_experimental_object_type": 1,
             },
         )
 
+        known_objects.add(database=self.database, name=table.name)
+
+    async def create_materialized_view(self, *, name: str, to_table: ClickHouseTableDefinition, select: str) -> None:
+        """
+        Creates a materialized view that writes the result of `select` into `to_table` for every block inserted into the table it selects from.
+        Only rows inserted after the view is created are included.
+        """
+        await clickhouse_client.ensure_known_objects_warm()
+        if known_objects.contains(database=self.database, name=name):
+            return
+
+        await clickhouse_client.command(
+            f"CREATE MATERIALIZED VIEW IF NOT EXISTS {self.database}.{name} TO {self.database}.{to_table.name} AS {select}"
+        )
+
+        known_objects.add(database=self.database, name=name)
+
     async def insert(self, events: list[str]) -> None:
         ...
 
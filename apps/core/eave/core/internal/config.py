@@ -76,6 +76,30 @@ class _AppConfig(ConfigBase):
         else:
             return get_secret(key)
 
+    @cached_property
+    def clickhouse_retention_days(self) -> int | None:
+        """
+        Database changes older than this are deleted from ClickHouse. Unset or 0 keeps them forever.
+        Setting it also applies to existing tables once they're migrated (see `clickhouse.migrations`), so it deletes their older history.
+        """
+        days = int(os.getenv("EAVE_CLICKHOUSE_RETENTION_DAYS") or "0")
+        return days or None
+
+    @cached_property
+    def clickhouse_storage_policy(self) -> str | None:
+        return os.getenv("EAVE_CLICKHOUSE_STORAGE_POLICY") or None
+
+    @cached_property
+    def clickhouse_cold_volume(self) -> str | None:
+        """
+        A volume of `clickhouse_storage_policy` that database changes are moved to after `clickhouse_cold_after_days`.
+        """
+        return os.getenv("EAVE_CLICKHOUSE_COLD_VOLUME") or None
+
+    @cached_property
+    def clickhouse_cold_after_days(self) -> int:
+        return int(os.getenv("EAVE_CLICKHOUSE_COLD_AFTER_DAYS", "30"))
+
     @cached_property
     def eave_google_oauth_client_credentials(self) -> Mapping[str, Any]:
         encoded = get_secret("EAVE_GOOGLE_OAUTH_CLIENT_CREDENTIALS_JSON")
@@ -0,0 +1,168 @@
+"""
+Keeps Postgres off the ingestion hot path.
+
+Client credentials that were verified recently are remembered for a short time, so that most requests are authenticated without a query.
+Credentials are keyed by a hash of the client ID and secret, so that secrets aren't kept in memory.
+Entries aren't invalidated when credentials are revoked or their scope is changed; the TTL (60s) limits how long each process keeps accepting them as they were.
+
+`last_used` is recorded in memory and written for all recently used credentials with one periodic UPDATE, instead of one write per request.
+"""
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+import hashlib
+import time
+from uuid import UUID
+
+from sqlalchemy import update
+
+from eave.core.internal import database
+from eave.core.internal.orm.client_credentials import ClientCredentialsOrm, ClientScope
+from eave.stdlib.logging import eaveLogger
+
+_DEFAULT_TTL_SECONDS = 60
+_DEFAULT_MAX_ENTRIES = 10_000
+_LAST_USED_FLUSH_INTERVAL_SECONDS = 60
+
+
+@dataclass(frozen=True, slots=True)
+class VerifiedCredentials:
+    id: UUID
+    team_id: UUID
+    scope: ClientScope
+
+
+def _cache_key(client_id: UUID, secret: str) -> bytes:
+    return hashlib.sha256(client_id.bytes + secret.encode()).digest()
+
+
+class VerifiedCredentialsCache:
+    """
+    An LRU cache of verified credentials, whose entries expire after `ttl_seconds`.
+    """
+
+    ttl_seconds: float
+    max_entries: int
+    _entries: OrderedDict[bytes, tuple[VerifiedCredentials, float]]
+
+    def __init__(self, ttl_seconds: float = _DEFAULT_TTL_SECONDS, max_entries: int = _DEFAULT_MAX_ENTRIES) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, client_id: UUID, secret: str) -> VerifiedCredentials | None:
+        key = _cache_key(client_id, secret)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        creds, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return creds
+
+    def add(self, secret: str, creds: VerifiedCredentials) -> None:
+        key = _cache_key(creds.id, secret)
+        self._entries[key] = (creds, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class LastUsedRecorder:
+    """
+    Collects which credentials were used, and periodically writes `last_used` for all of them in one UPDATE.
+    """
+
+    flush_interval_seconds: float
+    _used: set[UUID]
+    _last_used: datetime | None
+    _flusher: asyncio.Task[None] | None
+
+    def __init__(self, flush_interval_seconds: float = _LAST_USED_FLUSH_INTERVAL_SECONDS) -> None:
+        self.flush_interval_seconds = flush_interval_seconds
+        self._used = set()
+        self._last_used = None
+        self._flusher = None
+
+    def record(self, client_id: UUID) -> None:
+        self._used.add(client_id)
+        self._last_used = datetime.utcnow()
+
+        # The task belongs to the event loop that it's started in, so it's started on first use rather than on import.
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def flush(self) -> None:
+        if not self._used or self._last_used is None:
+            return
+
+        ids = list(self._used)
+        last_used = self._last_used
+        self._used.clear()
+
+        try:
+            async with database.async_session.begin() as db_session:
+                # Every credential in the batch gets the time of the most recent use, which is at most one interval off.
+                await db_session.execute(
+                    update(ClientCredentialsOrm).where(ClientCredentialsOrm.id.in_(ids)).values(last_used=last_used)
+                )
+        except Exception:
+            # They're written with the next flush instead.
+            self._used.update(ids)
+            raise
+
+    async def close(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+
+            try:
+                await self.flush()
+            except Exception as e:
+                eaveLogger.exception(e)
+
+
+verified_credentials = VerifiedCredentialsCache()
+last_used = LastUsedRecorder()
+
+
+async def verify(client_id: UUID, secret: str) -> VerifiedCredentials | None:
+    """
+    The credentials with this client ID and secret, or None if there are none.
+    """
+    if creds := verified_credentials.get(client_id, secret):
+        return creds
+
+    async with database.async_session.begin() as db_session:
+        orm = (
+            await ClientCredentialsOrm.query(
+                session=db_session,
+                params=ClientCredentialsOrm.QueryParams(
+                    id=client_id,
+                    secret=secret,
+                ),
+            )
+        ).one_or_none()
+
+    if not orm:
+        return None
+
+    creds = VerifiedCredentials(id=orm.id, team_id=orm.team_id, scope=orm.scope)
+    verified_credentials.add(secret, creds)
+    return creds
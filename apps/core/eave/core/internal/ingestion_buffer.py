@@ -0,0 +1,220 @@
+"""
+Buffers ingested events between the /ingest endpoint and the warehouse.
+
+The endpoint only validates a request and puts its events here, so its latency doesn't depend on the warehouse's.
+Background writers coalesce the events from many requests into one batch per team and event type, and write the batches with bounded concurrency.
+
+The buffer is in memory and bounded. When it's full, `put` refuses the events, and the endpoint responds with 503 so that the agent keeps them in its spool and retries later.
+Buffered events are written before the process shuts down, but are lost if the process crashes.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+import time
+from uuid import UUID
+
+from eave.core.internal.bigquery.dbchanges import DatabaseChangesTableHandle
+from eave.core.internal.bigquery.functioncalls import (
+    FunctionCallCountsTableHandle,
+    FunctionCallsTableHandle,
+    FunctionDurationsTableHandle,
+)
+from eave.core.internal.bigquery.types import BigQueryTableHandle
+from eave.monitoring.datastructures import EventType
+from eave.stdlib.logging import eaveLogger
+
+_MAX_BUFFERED_EVENTS = 100_000
+
+# A batch is written once it has this many events, or once its oldest event has waited this long.
+_BATCH_MAX_EVENTS = 5_000
+_BATCH_MAX_AGE_SECONDS = 1.0
+
+_MAX_CONCURRENT_WRITES = 8
+
+# A batch that fails is put back and retried this many times before its events are dropped.
+_MAX_WRITE_ATTEMPTS = 3
+
+
+def table_handle(*, team_id: UUID, event_type: EventType) -> BigQueryTableHandle | None:
+    """
+    The table that events of this type are written to, or None if the event type isn't supported.
+    """
+    match event_type:
+        case EventType.dbchange:
+            return DatabaseChangesTableHandle(team_id=team_id)
+        case EventType.functioncall:
+            return FunctionCallsTableHandle(team_id=team_id)
+        case EventType.functioncallcount:
+            return FunctionCallCountsTableHandle(team_id=team_id)
+        case EventType.functiondurations:
+            return FunctionDurationsTableHandle(team_id=team_id)
+        case _:
+            return None
+
+
+@dataclass(slots=True)
+class _PendingBatch:
+    events: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class IngestionBuffer:
+    max_buffered_events: int
+    batch_max_events: int
+    batch_max_age_seconds: float
+    max_concurrent_writes: int
+
+    _batches: dict[tuple[UUID, EventType], _PendingBatch]
+    _writing: set[tuple[UUID, EventType]]
+    _write_tasks: set[asyncio.Task[None]]
+    _buffered_events: int
+    _wakeup: asyncio.Event | None
+    _dispatcher: asyncio.Task[None] | None
+    _semaphore: asyncio.Semaphore | None
+
+    def __init__(
+        self,
+        max_buffered_events: int = _MAX_BUFFERED_EVENTS,
+        batch_max_events: int = _BATCH_MAX_EVENTS,
+        batch_max_age_seconds: float = _BATCH_MAX_AGE_SECONDS,
+        max_concurrent_writes: int = _MAX_CONCURRENT_WRITES,
+    ) -> None:
+        self.max_buffered_events = max_buffered_events
+        self.batch_max_events = batch_max_events
+        self.batch_max_age_seconds = batch_max_age_seconds
+        self.max_concurrent_writes = max_concurrent_writes
+        self._batches = {}
+        self._writing = set()
+        self._write_tasks = set()
+        self._buffered_events = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self._semaphore = None
+
+    @property
+    def buffered_events(self) -> int:
+        return self._buffered_events
+
+    def put(self, *, team_id: UUID, event_type: EventType, events: list[str]) -> bool:
+        """
+        Buffers the events to be written in the background.
+        Returns False, and buffers nothing, if the buffer doesn't have room for all of them.
+        """
+        if len(events) == 0:
+            return True
+
+        if self._buffered_events + len(events) > self.max_buffered_events:
+            return False
+
+        self._start()
+        key = (team_id, event_type)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _PendingBatch()
+            self._batches[key] = batch
+
+        batch.events.extend(events)
+        self._buffered_events += len(events)
+
+        if len(batch.events) >= self.batch_max_events:
+            self._wake()
+
+        return True
+
+    async def flush(self) -> None:
+        """
+        Writes everything that's buffered, regardless of batch size or age, and waits for the writes to finish.
+        """
+        while self._batches or self._write_tasks:
+            for key in list(self._batches):
+                if key not in self._writing:
+                    self._write(key)
+
+            if self._write_tasks:
+                await asyncio.wait(list(self._write_tasks))
+
+    async def close(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+        await self.flush()
+
+    def _start(self) -> None:
+        # The tasks belong to the event loop that they're started in, so they're started on first use rather than on import.
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_writes)
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _wake(self) -> None:
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        assert self._wakeup is not None
+
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.batch_max_age_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            now = time.monotonic()
+
+            for key, batch in list(self._batches.items()):
+                # One write at a time per team and event type. Events that arrive in the meantime are coalesced into the next batch.
+                if key in self._writing:
+                    continue
+
+                if len(batch.events) >= self.batch_max_events or now - batch.started >= self.batch_max_age_seconds:
+                    self._write(key)
+
+    def _write(self, key: tuple[UUID, EventType]) -> None:
+        batch = self._batches.pop(key)
+        self._writing.add(key)
+
+        task = asyncio.create_task(self._write_batch(key, batch))
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_tasks.discard)
+
+    async def _write_batch(self, key: tuple[UUID, EventType], batch: _PendingBatch) -> None:
+        assert self._semaphore is not None
+        team_id, event_type = key
+
+        written = 0
+
+        try:
+            handle = table_handle(team_id=team_id, event_type=event_type)
+            assert handle is not None, f"unsupported event type: {event_type}"
+
+            async with self._semaphore:
+                while written < len(batch.events):
+                    chunk = batch.events[written : written + self.batch_max_events]
+                    await handle.insert(events=chunk)
+                    written += len(chunk)
+                    self._buffered_events -= len(chunk)
+
+        except Exception as e:
+            # Only the events that weren't written yet are retried.
+            batch.events = batch.events[written:]
+            batch.attempts += 1
+
+            if batch.attempts >= _MAX_WRITE_ATTEMPTS:
+                eaveLogger.exception(e)
+                eaveLogger.error(f"dropped {len(batch.events)} {event_type} events for team {team_id}")
+                self._buffered_events -= len(batch.events)
+            else:
+                eaveLogger.warning(f"writing {event_type} events for team {team_id} failed, will retry: {e}")
+                # The events go back in front of any that arrived since, and are retried with the next batch.
+                if newer := self._batches.get(key):
+                    batch.events.extend(newer.events)
+                self._batches[key] = batch
+
+        finally:
+            self._writing.discard(key)
+
+
+ingestion_buffer = IngestionBuffer()
@@ -92,6 +92,3 @@ class ClientCredentialsOrm(Base):
         lookup = cls._build_query(params=params)
         result = await session.scalars(lookup)
         return result
-
-    async def touch(self, session: AsyncSession) -> None:
-        self.last_used = datetime.utcnow()
@@ -50,6 +50,28 @@ class VirtualEventOrm(Base):
         await session.flush()
         return obj
 
+    @dataclass
+    class CreateParams:
+        readable_name: str
+        description: Optional[str]
+        view_name: str
+
+    @classmethod
+    async def create_many(cls, session: AsyncSession, team_id: UUID, params: list[CreateParams]) -> list[Self]:
+        objs = [
+            cls(
+                team_id=team_id,
+                readable_name=p.readable_name,
+                description=p.description,
+                view_name=p.view_name,
+            )
+            for p in params
+        ]
+
+        session.add_all(objs)
+        await session.flush()
+        return objs
+
     @dataclass
     class QueryParams:
         id: Optional[uuid.UUID] = None
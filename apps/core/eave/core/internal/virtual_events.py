@@ -0,0 +1,148 @@
+"""
+Tracks which virtual events each team has, so that ingesting events for known (operation, table) pairs costs no round trips.
+
+A team's virtual events are loaded from the database the first time the team ingests events.
+New ones are created together: their views first, then all of their VirtualEventOrm rows in one transaction.
+Because table names come from the agent, a team can only create so many virtual events in total (`max_per_team`), and only so many per minute.
+Pairs over either limit get no virtual event for now; their events are still stored, and the pair is tried again in a later batch.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+import time
+from typing import Awaitable, Iterable, Protocol
+from uuid import UUID
+
+from eave.core.internal import database
+from eave.core.internal.orm.virtual_event import VirtualEventOrm, make_virtual_event_readable_name
+from eave.stdlib.logging import eaveLogger
+from eave.stdlib.util import tableize
+
+_DEFAULT_MAX_PER_TEAM = 500
+_DEFAULT_CREATE_RATE_PER_MINUTE = 10
+_DEFAULT_CREATE_BURST = 20
+
+
+class CreateView(Protocol):
+    """
+    Creates the warehouse view for a virtual event, eg `DatabaseChangesTableHandle.create_vevent_view`.
+    """
+
+    def __call__(self, *, operation: str, source_table: str) -> Awaitable[None]: ...
+
+
+@dataclass(slots=True)
+class _TeamVirtualEvents:
+    view_names: set[str]
+    tokens: float
+    refilled: float = field(default_factory=time.monotonic)
+
+
+class VirtualEventRegistry:
+    max_per_team: int
+    create_rate_per_minute: float
+    create_burst: int
+
+    _teams: dict[UUID, _TeamVirtualEvents]
+    _locks: dict[UUID, asyncio.Lock]
+
+    def __init__(
+        self,
+        max_per_team: int = _DEFAULT_MAX_PER_TEAM,
+        create_rate_per_minute: float = _DEFAULT_CREATE_RATE_PER_MINUTE,
+        create_burst: int = _DEFAULT_CREATE_BURST,
+    ) -> None:
+        self.max_per_team = max_per_team
+        self.create_rate_per_minute = create_rate_per_minute
+        self.create_burst = create_burst
+        self._teams = {}
+        self._locks = {}
+
+    async def ensure(self, *, team_id: UUID, operations: Iterable[tuple[str, str]], create_view: CreateView) -> None:
+        """
+        Creates the virtual events that don't exist yet for these (operation, table name) pairs, within the team's limits.
+        """
+        wanted = {
+            tableize(make_virtual_event_readable_name(operation=op, table_name=t)): (op, t) for op, t in operations
+        }
+
+        team = self._teams.get(team_id)
+        if team is not None and team.view_names.issuperset(wanted):
+            return
+
+        # One batch at a time per team, so that concurrent batches don't create the same virtual events.
+        lock = self._locks.setdefault(team_id, asyncio.Lock())
+        async with lock:
+            team = self._teams.get(team_id) or await self._load(team_id)
+            new = [(view_name, op, t) for view_name, (op, t) in wanted.items() if view_name not in team.view_names]
+            if not new:
+                return
+
+            allowed = new[: self._take(team, len(new))]
+            if len(allowed) < len(new):
+                skipped = len(new) - len(allowed)
+                eaveLogger.warning(f"team {team_id} is over its virtual event limits; skipped {skipped}")
+
+            if not allowed:
+                return
+
+            results = await asyncio.gather(
+                *(create_view(operation=op, source_table=t) for _, op, t in allowed),
+                return_exceptions=True,
+            )
+
+            created: list[VirtualEventOrm.CreateParams] = []
+            for (view_name, op, t), result in zip(allowed, results):
+                if isinstance(result, BaseException):
+                    eaveLogger.exception(result)
+                    continue
+
+                created.append(
+                    VirtualEventOrm.CreateParams(
+                        readable_name=make_virtual_event_readable_name(operation=op, table_name=t),
+                        description=f"{op} operation on the {t} table.",
+                        view_name=view_name,
+                    )
+                )
+
+            if created:
+                async with database.async_session.begin() as db_session:
+                    await VirtualEventOrm.create_many(session=db_session, team_id=team_id, params=created)
+
+                team.view_names.update(p.view_name for p in created)
+
+    def forget(self, team_id: UUID) -> None:
+        """
+        Discards what's known about the team, so that its virtual events are reloaded from the database next time.
+        """
+        self._teams.pop(team_id, None)
+
+    def clear(self) -> None:
+        self._teams.clear()
+
+    async def _load(self, team_id: UUID) -> _TeamVirtualEvents:
+        async with database.async_session.begin() as db_session:
+            vevents = await VirtualEventOrm.query(
+                session=db_session,
+                params=VirtualEventOrm.QueryParams(team_id=team_id),
+            )
+            view_names = {v.view_name for v in vevents}
+
+        team = _TeamVirtualEvents(view_names=view_names, tokens=self.create_burst)
+        self._teams[team_id] = team
+        return team
+
+    def _take(self, team: _TeamVirtualEvents, n: int) -> int:
+        """
+        Takes up to `n` creations from the team's allowance, and returns how many were taken.
+        """
+        now = time.monotonic()
+        team.tokens = min(self.create_burst, team.tokens + (now - team.refilled) * self.create_rate_per_minute / 60)
+        team.refilled = now
+
+        n = min(n, int(team.tokens), max(0, self.max_per_team - len(team.view_names)))
+        team.tokens -= n
+        return n
+
+
+virtual_events = VirtualEventRegistry()
@@ -2,12 +2,12 @@ from typing import cast
 
 from asgiref.typing import HTTPScope
 
-from eave.core.internal import database
-from eave.core.internal.bigquery.dbchanges import DatabaseChangesTableHandle
-from eave.core.internal.orm.client_credentials import ClientCredentialsOrm, ClientScope
-from eave.monitoring.datastructures import DataIngestRequestBody, EventType
+from eave.core.internal import credentials_cache
+from eave.core.internal.ingestion_buffer import ingestion_buffer, table_handle
+from eave.core.internal.orm.client_credentials import ClientScope
+from eave.monitoring.datastructures import DataIngestRequestBody
 from eave.stdlib.api_util import get_header_value_or_exception
-from eave.stdlib.exceptions import ForbiddenError, UnauthorizedError
+from eave.stdlib.exceptions import BadRequestError, ForbiddenError, ServiceUnavailableError, UnauthorizedError
 from eave.stdlib.headers import EAVE_CLIENT_ID, EAVE_CLIENT_SECRET
 from eave.stdlib.http_endpoint import HTTPEndpoint
 from eave.stdlib.util import ensure_uuid
@@ -26,30 +26,21 @@ class DataIngestionEndpoint(HTTPEndpoint):
         client_id = get_header_value_or_exception(scope=http_scope, name=EAVE_CLIENT_ID)
         client_secret = get_header_value_or_exception(scope=http_scope, name=EAVE_CLIENT_SECRET)
 
-        async with database.async_session.begin() as db_session:
-            creds = (
-                await ClientCredentialsOrm.query(
-                    session=db_session,
-                    params=ClientCredentialsOrm.QueryParams(
-                        id=ensure_uuid(client_id),
-                        secret=client_secret,
-                    ),
-                )
-            ).one_or_none()
+        creds = await credentials_cache.verify(client_id=ensure_uuid(client_id), secret=client_secret)
+        if not creds:
+            raise UnauthorizedError("invalid credentials")
 
-            if not creds:
-                raise UnauthorizedError("invalid credentials")
+        if not creds.scope & ClientScope.write > 0:
+            raise ForbiddenError("invalid scopes")
 
-            if not creds.scope & ClientScope.write > 0:
-                raise ForbiddenError("invalid scopes")
+        credentials_cache.last_used.record(creds.id)
 
-            await creds.touch(session=db_session)
+        if table_handle(team_id=creds.team_id, event_type=input.event_type) is None:
+            raise BadRequestError(f"unsupported event type: {input.event_type}")
 
-        match input.event_type:
-            case EventType.dbchange:
-                handle = DatabaseChangesTableHandle(team_id=creds.team_id)
+        # The events are written to the warehouse in the background (see ingestion_buffer).
+        if not ingestion_buffer.put(team_id=creds.team_id, event_type=input.event_type, events=input.events):
+            raise ServiceUnavailableError("ingestion buffer is full", headers={"Retry-After": "5"})
 
-        await handle.insert(events=input.events)
-
-        response = Response(content="OK", status_code=200)
+        response = Response(content="Accepted", status_code=202)
         return response
@@ -0,0 +1,50 @@
+import asyncio
+
+from eave.core.internal.bigquery.known_objects import KnownBigQueryObjects
+from .base import BaseTestCase
+
+
+class TestKnownBigQueryObjects(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._known = KnownBigQueryObjects()
+        self._creates = 0
+
+    async def _create(self) -> None:
+        self._creates += 1
+        await asyncio.sleep(0)
+
+    async def _fail(self) -> None:
+        self._creates += 1
+        raise ValueError(self.anystr("error"))
+
+    async def test_ensure(self) -> None:
+        assert not self._known.contains(dataset=self.anystr("dataset"), name=self.anystr("table"))
+
+        await self._known.ensure(self.anystr("dataset"), self.anystr("table"), self._create)
+        await self._known.ensure(self.anystr("dataset"), self.anystr("table"), self._create)
+
+        assert self._creates == 1
+        assert self._known.contains(dataset=self.anystr("dataset"), name=self.anystr("table"))
+        assert not self._known.contains(dataset=self.anystr("dataset"))
+
+    async def test_concurrent_ensures_create_once(self) -> None:
+        await asyncio.gather(*(self._known.ensure(self.anystr("dataset"), None, self._create) for _ in range(5)))
+
+        assert self._creates == 1
+        assert self._known.contains(dataset=self.anystr("dataset"))
+
+    async def test_failed_create_is_retried(self) -> None:
+        with self.assertRaises(ValueError):
+            await self._known.ensure(self.anystr("dataset"), None, self._fail)
+
+        assert not self._known.contains(dataset=self.anystr("dataset"))
+
+        await self._known.ensure(self.anystr("dataset"), None, self._create)
+        assert self._creates == 2
+        assert self._known.contains(dataset=self.anystr("dataset"))
+
+    async def test_discard(self) -> None:
+        self._known.add(dataset=self.anystr("dataset"), name=self.anystr("table"))
+        self._known.discard(dataset=self.anystr("dataset"), name=self.anystr("table"))
+        assert not self._known.contains(dataset=self.anystr("dataset"), name=self.anystr("table"))
@@ -0,0 +1,212 @@
+import asyncio
+from typing import AsyncIterator
+import unittest.mock
+
+import google.api_core.exceptions
+from google.cloud.bigquery import SchemaField, StandardSqlTypeNames
+from google.cloud.bigquery_storage_v1.types import AppendRowsRequest, AppendRowsResponse, WriteStream
+from google.rpc import code_pb2, status_pb2
+
+from eave.core.internal.bigquery import write_streams
+from eave.core.internal.bigquery.types import BigQueryFieldMode, BigQueryTableDefinition
+from eave.core.internal.bigquery.write_streams import AppendRowsError, TableWriter
+from .base import BaseTestCase
+
+_table = BigQueryTableDefinition(
+    name="events",
+    schema=[
+        SchemaField(name="name", field_type=StandardSqlTypeNames.STRING, mode=BigQueryFieldMode.REQUIRED),
+    ],
+)
+
+
+class _FakeConnection:
+    """
+    One `append_rows` call: records the requests that the writer sends, and yields the responses that the test gives it.
+    """
+
+    requests: list[AppendRowsRequest]
+    _responses: asyncio.Queue[AppendRowsResponse | Exception]
+    _reader: asyncio.Task[None]
+
+    def __init__(self, requests: AsyncIterator[AppendRowsRequest]) -> None:
+        self.requests = []
+        self._responses = asyncio.Queue()
+        self._reader = asyncio.create_task(self._read(requests))
+
+    async def _read(self, requests: AsyncIterator[AppendRowsRequest]) -> None:
+        async for request in requests:
+            self.requests.append(request)
+
+    def respond(self, code: int = code_pb2.OK) -> None:
+        if code == code_pb2.OK:
+            self._responses.put_nowait(AppendRowsResponse(append_result=AppendRowsResponse.AppendResult()))
+        else:
+            self._responses.put_nowait(AppendRowsResponse(error=status_pb2.Status(code=code, message="error")))
+
+    def drop(self) -> None:
+        self._responses.put_nowait(google.api_core.exceptions.ServiceUnavailable("connection dropped"))
+
+    def close(self) -> None:
+        self._reader.cancel()
+
+    def __aiter__(self) -> "_FakeConnection":
+        return self
+
+    async def __anext__(self) -> AppendRowsResponse:
+        response = await self._responses.get()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class _FakeWriteClient:
+    streams: list[str]
+    connections: list[_FakeConnection]
+
+    def __init__(self) -> None:
+        self.streams = []
+        self.connections = []
+
+    async def create_write_stream(self, *, parent: str, write_stream: WriteStream) -> WriteStream:
+        name = f"{parent}/streams/{len(self.streams)}"
+        self.streams.append(name)
+        return WriteStream(name=name)
+
+    async def append_rows(self, *, requests: AsyncIterator[AppendRowsRequest]) -> _FakeConnection:
+        connection = _FakeConnection(requests)
+        self.connections.append(connection)
+        return connection
+
+    async def finalize_write_stream(self, *, name: str) -> None:
+        pass
+
+
+async def _settle() -> None:
+    # Lets the writer, its response reader, and the fake connections run until they're all waiting.
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+class TestTableWriter(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._client = _FakeWriteClient()
+        self.patch(
+            name="write client",
+            patch=unittest.mock.patch.object(write_streams, "get_client", return_value=self._client),
+        )
+        self._writer = TableWriter(dataset_name="dataset", table=_table)
+
+    async def asyncTearDown(self) -> None:
+        for connection in self._client.connections:
+            connection.close()
+        await super().asyncTearDown()
+
+    def _append(self, *rows: bytes) -> asyncio.Task[None]:
+        return asyncio.create_task(self._writer.append(list(rows)))
+
+    async def test_pipelined_appends_resolve_in_order(self) -> None:
+        first = self._append(b"a", b"b")
+        second = self._append(b"c")
+        await _settle()
+
+        assert len(self._client.streams) == 1
+        assert len(self._client.connections) == 1
+        connection = self._client.connections[0]
+
+        assert [r.offset for r in connection.requests] == [0, 2]
+        assert list(connection.requests[1].proto_rows.rows.serialized_rows) == [b"c"]
+
+        # Only the first request on a connection identifies the stream and its schema.
+        assert connection.requests[0].write_stream == self._client.streams[0]
+        assert connection.requests[0].proto_rows.writer_schema.proto_descriptor.name == "Row"
+        assert not connection.requests[1].write_stream
+
+        connection.respond()
+        await _settle()
+        assert first.done() and first.exception() is None
+        assert not second.done()
+
+        connection.respond()
+        await _settle()
+        assert second.done() and second.exception() is None
+
+        # Later appends continue on the same connection.
+        third = self._append(b"d")
+        await _settle()
+        assert len(self._client.connections) == 1
+        assert [r.offset for r in connection.requests] == [0, 2, 3]
+
+        connection.respond()
+        await _settle()
+        assert third.done() and third.exception() is None
+
+    async def test_dropped_connection_resends_unanswered_appends(self) -> None:
+        first = self._append(b"a", b"b")
+        second = self._append(b"c")
+        third = self._append(b"d")
+        await _settle()
+
+        connection = self._client.connections[0]
+        connection.respond()
+        await _settle()
+        assert first.done()
+
+        connection.drop()
+        await _settle()
+
+        # The same stream, on a new connection, at the same offsets.
+        assert len(self._client.streams) == 1
+        assert len(self._client.connections) == 2
+        reconnection = self._client.connections[1]
+        assert [r.offset for r in reconnection.requests] == [2, 3]
+        assert reconnection.requests[0].write_stream == self._client.streams[0]
+        assert reconnection.requests[0].proto_rows.writer_schema.proto_descriptor.name == "Row"
+
+        # The server had already committed the second append before the connection dropped.
+        reconnection.respond(code_pb2.ALREADY_EXISTS)
+        reconnection.respond()
+        await _settle()
+
+        assert second.done() and second.exception() is None
+        assert third.done() and third.exception() is None
+
+    async def test_connection_dropped_too_many_times(self) -> None:
+        append = self._append(b"a")
+        await _settle()
+
+        for _ in range(write_streams._MAX_RECONNECT_ATTEMPTS + 1):
+            assert not append.done()
+            self._client.connections[-1].drop()
+            await _settle()
+
+        assert len(self._client.connections) == write_streams._MAX_RECONNECT_ATTEMPTS + 1
+        assert isinstance(append.exception(), AppendRowsError)
+        assert not self._writer.has_stream
+
+    async def test_error_fails_every_in_flight_append(self) -> None:
+        first = self._append(b"a")
+        second = self._append(b"b")
+        await _settle()
+
+        connection = self._client.connections[0]
+        connection.respond(code_pb2.INVALID_ARGUMENT)
+        await _settle()
+
+        assert isinstance(first.exception(), AppendRowsError)
+        assert isinstance(second.exception(), AppendRowsError)
+        assert not self._writer.has_stream
+
+        # The next append creates a new stream, starting at offset 0.
+        third = self._append(b"c")
+        await _settle()
+
+        assert len(self._client.streams) == 2
+        reconnection = self._client.connections[-1]
+        assert [r.offset for r in reconnection.requests] == [0]
+        assert reconnection.requests[0].write_stream == self._client.streams[1]
+
+        reconnection.respond()
+        await _settle()
+        assert third.done() and third.exception() is None
@@ -0,0 +1,42 @@
+from eave.core.internal.clickhouse.known_objects import KnownSchemaObjects
+from .base import BaseTestCase
+
+
+class TestKnownSchemaObjects(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._known = KnownSchemaObjects()
+
+    async def test_add(self) -> None:
+        assert not self._known.contains(database=self.anystr("db"))
+        self._known.add(database=self.anystr("db"))
+        assert self._known.contains(database=self.anystr("db"))
+
+        assert not self._known.contains(database=self.anystr("db"), name=self.anystr("table"))
+        self._known.add(database=self.anystr("db"), name=self.anystr("table"))
+        assert self._known.contains(database=self.anystr("db"), name=self.anystr("table"))
+
+        assert not self._known.contains(database=self.anystr("other db"), name=self.anystr("table"))
+
+    async def test_add_all(self) -> None:
+        assert not self._known.warmed
+
+        self._known.add_all(
+            databases=[self.anystr("db")],
+            objects=[(self.anystr("db"), self.anystr("table")), (self.anystr("db"), self.anystr("view"))],
+        )
+
+        assert self._known.warmed
+        assert self._known.contains(database=self.anystr("db"))
+        assert self._known.contains(database=self.anystr("db"), name=self.anystr("table"))
+        assert self._known.contains(database=self.anystr("db"), name=self.anystr("view"))
+
+    async def test_expiration(self) -> None:
+        self._known.ttl_seconds = -1
+        self._known.add(database=self.anystr("db"))
+        assert not self._known.contains(database=self.anystr("db"))
+
+    async def test_discard(self) -> None:
+        self._known.add(database=self.anystr("db"), name=self.anystr("table"))
+        self._known.discard(database=self.anystr("db"), name=self.anystr("table"))
+        assert not self._known.contains(database=self.anystr("db"), name=self.anystr("table"))
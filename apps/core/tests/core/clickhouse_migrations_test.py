@@ -0,0 +1,267 @@
+import unittest.mock
+
+from clickhouse_connect.datatypes.registry import get_from_name
+
+from eave.core.internal.clickhouse import clickhouse_client, dbchanges, migrations
+from eave.core.internal.clickhouse.types import ClickHouseColumnDefinition, ClickHouseTableDefinition
+from eave.core.internal.config import CORE_API_APP_CONFIG
+from .base import BaseTestCase
+
+
+def _make_table(**kwargs) -> ClickHouseTableDefinition:
+    return ClickHouseTableDefinition(
+        name="events",
+        columns=[
+            ClickHouseColumnDefinition(name="table_name", ch_type=get_from_name("LowCardinality(String)")),
+            ClickHouseColumnDefinition(
+                name="timestamp", ch_type=get_from_name("DateTime64(6, 'UTC')"), codec="Delta(8), ZSTD(1)"
+            ),
+        ],
+        engine="MergeTree",
+        primary_key_columns=["table_name", "timestamp"],
+        **kwargs,
+    )
+
+
+class TestClickHouseTableDefinition(BaseTestCase):
+    async def test_create_statement(self) -> None:
+        table = _make_table(
+            partition_by="toYYYYMM(timestamp)",
+            ttl="toDateTime(timestamp) + INTERVAL 30 DAY DELETE",
+            table_settings={"ttl_only_drop_parts": 1, "storage_policy": "tiered"},
+            schema_version=3,
+        )
+        columns = ", ".join(c.col_expr for c in table.columns)
+
+        assert table.columns[1].col_expr.endswith(" CODEC(Delta(8), ZSTD(1))")
+        assert table.create_statement(database="db") == "\n".join(
+            [
+                "CREATE TABLE IF NOT EXISTS db.events",
+                f"({columns})",
+                "ENGINE MergeTree",
+                "PARTITION BY toYYYYMM(timestamp)",
+                "PRIMARY KEY (table_name, timestamp)",
+                "TTL toDateTime(timestamp) + INTERVAL 30 DAY DELETE",
+                "SETTINGS ttl_only_drop_parts = 1, storage_policy = 'tiered'",
+                "COMMENT 'eave_schema_version=3'",
+            ]
+        )
+
+    async def test_create_statement_with_another_name(self) -> None:
+        table = _make_table()
+        columns = ", ".join(c.col_expr for c in table.columns)
+
+        assert table.create_statement(database="db", name="events__migrating") == "\n".join(
+            [
+                "CREATE TABLE IF NOT EXISTS db.events__migrating",
+                f"({columns})",
+                "ENGINE MergeTree",
+                "PRIMARY KEY (table_name, timestamp)",
+                "COMMENT 'eave_schema_version=1'",
+            ]
+        )
+
+
+class TestDatabaseChangesTTL(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.patch(unittest.mock.patch.object(CORE_API_APP_CONFIG, "clickhouse_cold_volume", None))
+
+    async def test_no_retention_by_default(self) -> None:
+        self.patch_env({"EAVE_CLICKHOUSE_RETENTION_DAYS": ""})
+        self.patch_dict(unittest.mock.patch.dict(CORE_API_APP_CONFIG.__dict__), name="config")
+        CORE_API_APP_CONFIG.__dict__.pop("clickhouse_retention_days", None)
+
+        assert CORE_API_APP_CONFIG.clickhouse_retention_days is None
+        assert dbchanges._ttl() is None
+
+    async def test_retention(self) -> None:
+        self.patch(unittest.mock.patch.object(CORE_API_APP_CONFIG, "clickhouse_retention_days", 30))
+        assert dbchanges._ttl() == "toDateTime(timestamp) + INTERVAL 30 DAY DELETE"
+
+
+class TestMigrateTable(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._table = _make_table(partition_by="toYYYYMM(timestamp)", schema_version=2)
+
+        self._command = self.patch(
+            unittest.mock.patch.object(clickhouse_client, "command", new=unittest.mock.AsyncMock())
+        )
+        self._query = self.patch(unittest.mock.patch.object(clickhouse_client, "query", new=unittest.mock.AsyncMock()))
+
+    def _mock_queries(self, *results: list[tuple]) -> None:
+        self._query.side_effect = [unittest.mock.Mock(result_rows=rows) for rows in results]
+
+    def _mock_existing_table(
+        self,
+        *,
+        comment: str = "eave_schema_version=1",
+        partition_key: str = "toYYYYMM(timestamp)",
+        engine_full: str = "MergeTree PARTITION BY toYYYYMM(timestamp) PRIMARY KEY (table_name, timestamp) ORDER BY (table_name, timestamp) SETTINGS index_granularity = 8192",
+        columns: list[tuple] | None = None,
+        then: tuple[list[tuple], ...] = (),
+    ) -> None:
+        if columns is None:
+            columns = [
+                ("table_name", "LowCardinality(String)", "", 1),
+                ("timestamp", "DateTime64(6, 'UTC')", "CODEC(Delta(8), ZSTD(1))", 1),
+            ]
+
+        self._mock_queries([(comment,)], [(partition_key, engine_full)], columns, *then)
+
+    @property
+    def _statements(self) -> list[str]:
+        return [c.args[0] for c in self._command.call_args_list]
+
+    def _existing(
+        self, *, partition_key: str = "toYYYYMM(timestamp)", table_name_type: str
+    ) -> migrations.ExistingTable:
+        return migrations.ExistingTable(
+            partition_key=partition_key,
+            engine_full="MergeTree",
+            columns={
+                "table_name": migrations.ExistingColumn(type=table_name_type, codec="", in_sorting_key=True),
+                "timestamp": migrations.ExistingColumn(type="DateTime64(6, 'UTC')", codec="", in_sorting_key=True),
+            },
+        )
+
+    async def test_needs_rebuild(self) -> None:
+        same = "LowCardinality(String)"
+        assert migrations.needs_rebuild(
+            existing=self._existing(partition_key="", table_name_type=same), table=self._table
+        )
+        assert migrations.needs_rebuild(
+            existing=self._existing(partition_key="toYYYYMMDD(timestamp)", table_name_type=same), table=self._table
+        )
+        assert not migrations.needs_rebuild(existing=self._existing(table_name_type=same), table=self._table)
+        assert not migrations.needs_rebuild(
+            existing=self._existing(partition_key="toYYYYMM( timestamp )", table_name_type=same), table=self._table
+        )
+        assert not migrations.needs_rebuild(
+            existing=self._existing(partition_key="", table_name_type=same), table=_make_table()
+        )
+
+        # The type of a sorting key column can't be changed in place.
+        assert migrations.needs_rebuild(existing=self._existing(table_name_type="String"), table=self._table)
+
+    async def test_unchanged_table_only_gets_a_new_comment(self) -> None:
+        self._mock_existing_table()
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+        assert self._statements == ["ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'"]
+
+    async def test_alter_changed_codec(self) -> None:
+        self._mock_existing_table(
+            columns=[
+                ("table_name", "LowCardinality(String)", "", 1),
+                ("timestamp", "DateTime64(6, 'UTC')", "", 1),
+            ]
+        )
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+        assert self._statements == [
+            f"ALTER TABLE db.events MODIFY COLUMN {self._table.columns[1].col_expr}",
+            "ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'",
+        ]
+
+    async def test_alter_adds_missing_column(self) -> None:
+        self._mock_existing_table(columns=[("table_name", "LowCardinality(String)", "", 1)])
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+        assert self._statements == [
+            f"ALTER TABLE db.events ADD COLUMN IF NOT EXISTS {self._table.columns[1].col_expr}",
+            "ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'",
+        ]
+
+    async def test_alter_sets_ttl(self) -> None:
+        self._table.ttl = "toDateTime(timestamp) + INTERVAL 30 DAY DELETE"
+        self._mock_existing_table()
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+        assert self._statements == [
+            "ALTER TABLE db.events MODIFY TTL toDateTime(timestamp) + INTERVAL 30 DAY DELETE",
+            "ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'",
+        ]
+
+    async def test_alter_removes_ttl(self) -> None:
+        self._mock_existing_table(
+            engine_full="MergeTree PARTITION BY toYYYYMM(timestamp) PRIMARY KEY (table_name, timestamp) ORDER BY (table_name, timestamp) TTL toDateTime(timestamp) + toIntervalDay(365) SETTINGS index_granularity = 8192",
+        )
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+        assert self._statements == [
+            "ALTER TABLE db.events REMOVE TTL",
+            "ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'",
+        ]
+
+    async def test_rebuild_when_partition_key_changed(self) -> None:
+        self._mock_existing_table(
+            comment="",
+            partition_key="",
+            then=(
+                [("all_1_1_0",), ("all_2_2_0",)],
+                [("events_mv", "CREATE MATERIALIZED VIEW db.events_mv TO db.events_counts AS SELECT 1")],
+            ),
+        )
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+
+        columns = "table_name, timestamp"
+        assert self._statements == [
+            "SYSTEM STOP MERGES db.events",
+            "DROP TABLE IF EXISTS db.events__migrating",
+            self._table.create_statement(database="db", name="events__migrating"),
+            f"INSERT INTO db.events__migrating ({columns}) SELECT {columns} FROM db.events WHERE _part IN ('all_1_1_0', 'all_2_2_0')",
+            "DROP VIEW db.events_mv",
+            "EXCHANGE TABLES db.events AND db.events__migrating",
+            f"INSERT INTO db.events ({columns}) SELECT {columns} FROM db.events__migrating WHERE _part NOT IN ('all_1_1_0', 'all_2_2_0')",
+            "CREATE MATERIALIZED VIEW db.events_mv TO db.events_counts AS SELECT 1",
+            "DROP TABLE db.events__migrating",
+            "SYSTEM START MERGES db.events",
+            "ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'",
+        ]
+
+    async def test_rebuild_empty_table_when_key_column_type_changed(self) -> None:
+        self._mock_existing_table(
+            columns=[
+                ("table_name", "String", "", 1),
+                ("timestamp", "DateTime64(6, 'UTC')", "CODEC(Delta(8), ZSTD(1))", 1),
+            ],
+            then=([], []),
+        )
+
+        assert await migrations.migrate_table(database="db", table=self._table)
+
+        columns = "table_name, timestamp"
+        assert self._statements == [
+            "SYSTEM STOP MERGES db.events",
+            "DROP TABLE IF EXISTS db.events__migrating",
+            self._table.create_statement(database="db", name="events__migrating"),
+            "EXCHANGE TABLES db.events AND db.events__migrating",
+            f"INSERT INTO db.events ({columns}) SELECT {columns} FROM db.events__migrating",
+            "DROP TABLE db.events__migrating",
+            "SYSTEM START MERGES db.events",
+            "ALTER TABLE db.events MODIFY COMMENT 'eave_schema_version=2'",
+        ]
+
+    async def test_merges_are_restarted_when_rebuild_fails(self) -> None:
+        self._mock_existing_table(partition_key="", then=([],))
+        self._command.side_effect = [None, None, Exception("create failed"), None]
+
+        with self.assertRaises(Exception):
+            await migrations.migrate_table(database="db", table=self._table)
+
+        assert self._statements[-1] == "SYSTEM START MERGES db.events"
+
+    async def test_current_table_isnt_migrated(self) -> None:
+        self._mock_queries([("eave_schema_version=2",)])
+
+        assert not await migrations.migrate_table(database="db", table=self._table)
+        assert self._command.call_count == 0
+
+    async def test_missing_table_isnt_migrated(self) -> None:
+        self._mock_queries([])
+
+        assert not await migrations.migrate_table(database="db", table=self._table)
+        assert self._command.call_count == 0
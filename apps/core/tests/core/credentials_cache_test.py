@@ -0,0 +1,87 @@
+from eave.core.internal import credentials_cache
+from eave.core.internal.credentials_cache import LastUsedRecorder, VerifiedCredentials, VerifiedCredentialsCache
+from eave.core.internal.orm.client_credentials import ClientCredentialsOrm, ClientScope
+
+from .base import BaseTestCase
+
+
+class TestVerifiedCredentialsCache(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._cache = VerifiedCredentialsCache()
+        self._creds = VerifiedCredentials(
+            id=self.anyuuid("id"),
+            team_id=self.anyuuid("team_id"),
+            scope=ClientScope.write,
+        )
+
+    async def test_add(self) -> None:
+        assert self._cache.get(self.anyuuid("id"), self.anystr("secret")) is None
+
+        self._cache.add(self.anystr("secret"), self._creds)
+        assert self._cache.get(self.anyuuid("id"), self.anystr("secret")) == self._creds
+        assert self._cache.get(self.anyuuid("id"), self.anystr("other secret")) is None
+
+    async def test_expiration(self) -> None:
+        self._cache.ttl_seconds = -1
+        self._cache.add(self.anystr("secret"), self._creds)
+        assert self._cache.get(self.anyuuid("id"), self.anystr("secret")) is None
+
+    async def test_least_recently_used_is_evicted(self) -> None:
+        self._cache.max_entries = 2
+        other_creds = VerifiedCredentials(id=self.anyuuid("other id"), team_id=self.anyuuid(), scope=ClientScope.write)
+        third_creds = VerifiedCredentials(id=self.anyuuid("third id"), team_id=self.anyuuid(), scope=ClientScope.write)
+
+        self._cache.add(self.anystr("secret"), self._creds)
+        self._cache.add(self.anystr("other secret"), other_creds)
+        assert self._cache.get(self.anyuuid("id"), self.anystr("secret"))
+
+        self._cache.add(self.anystr("third secret"), third_creds)
+        assert self._cache.get(self.anyuuid("id"), self.anystr("secret"))
+        assert self._cache.get(self.anyuuid("other id"), self.anystr("other secret")) is None
+        assert self._cache.get(self.anyuuid("third id"), self.anystr("third secret"))
+
+
+class TestCredentialsVerification(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+
+        async with self.db_session.begin() as s:
+            self._team = await self.make_team(session=s)
+            self._client_credentials = await ClientCredentialsOrm.create(
+                session=s,
+                team_id=self._team.id,
+                description=self.anystr(),
+                scope=ClientScope.readwrite,
+            )
+
+    async def test_verify(self) -> None:
+        creds = await credentials_cache.verify(
+            client_id=self._client_credentials.id,
+            secret=self._client_credentials.secret,
+        )
+        assert creds
+        assert creds.team_id == self._team.id
+        assert creds.scope == ClientScope.readwrite
+        assert (
+            credentials_cache.verified_credentials.get(self._client_credentials.id, self._client_credentials.secret)
+            == creds
+        )
+
+    async def test_verify_invalid_secret(self) -> None:
+        creds = await credentials_cache.verify(client_id=self._client_credentials.id, secret=self.anystr("invalid"))
+        assert creds is None
+
+    async def test_last_used_is_written_on_flush(self) -> None:
+        recorder = LastUsedRecorder()
+        recorder.record(self._client_credentials.id)
+
+        async with self.db_session.begin() as s:
+            before = await self.reload(s, self._client_credentials)
+            assert before and before.last_used is None
+
+        await recorder.close()
+
+        async with self.db_session.begin() as s:
+            after = await self.reload(s, self._client_credentials)
+            assert after and after.last_used is not None
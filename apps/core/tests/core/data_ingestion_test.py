@@ -1,17 +1,20 @@
 import http
 import time
+import unittest.mock
 from typing import cast
 
 import clickhouse_connect
 from google.cloud import bigquery
 from eave.core.internal.bigquery.types import BigQueryTableHandle
 from eave.core.internal.config import CORE_API_APP_CONFIG
+from eave.core.internal.ingestion_buffer import ingestion_buffer
 from eave.core.internal.orm.client_credentials import ClientCredentialsOrm, ClientScope
 from eave.monitoring.datastructures import (
     DataIngestRequestBody,
     DatabaseChangeEventPayload,
     DatabaseChangeOperation,
     EventType,
+    FunctionCallEventPayload,
 )
 from eave.stdlib.config import SHARED_CONFIG
 from eave.stdlib.headers import EAVE_CLIENT_ID, EAVE_CLIENT_SECRET
@@ -50,14 +53,14 @@ class TestDataIngestionEndpointWithBigQuery(BaseTestCase):
         )
 
 
-    def _bq_team_dataset_exists(self) -> bool:
+    async def _bq_team_dataset_exists(self) -> bool:
         handle = BigQueryTableHandle(team_id=self._team.id)
-        dataset = bq_client.get_dataset(dataset_name=handle.dataset_name)
+        dataset = await bq_client.get_dataset(dataset_name=handle.dataset_name)
         return dataset is not None
 
-    def _bq_table_exists(self, table_name: str) -> bool:
+    async def _bq_table_exists(self, table_name: str) -> bool:
         handle = BigQueryTableHandle(team_id=self._team.id)
-        table = bq_client.get_table(dataset_name=handle.dataset_name, table_name=table_name)
+        table = await bq_client.get_table(dataset_name=handle.dataset_name, table_name=table_name)
         return table is not None
 
     async def test_ingest_invalid_credentials(self) -> None:
@@ -71,7 +74,7 @@ class TestDataIngestionEndpointWithBigQuery(BaseTestCase):
         )
 
         assert response.status_code == http.HTTPStatus.UNAUTHORIZED
-        assert not self._bq_team_dataset_exists()
+        assert not await self._bq_team_dataset_exists()
 
     async def test_ingest_invalid_scopes(self) -> None:
         async with self.db_session.begin() as s:
@@ -92,7 +95,7 @@ class TestDataIngestionEndpointWithBigQuery(BaseTestCase):
         )
 
         assert response.status_code == http.HTTPStatus.FORBIDDEN
-        assert not self._bq_team_dataset_exists()
+        assert not await self._bq_team_dataset_exists()
 
     async def test_ingest_valid_credentials(self) -> None:
         response = await self.make_request(
@@ -104,10 +107,10 @@ class TestDataIngestionEndpointWithBigQuery(BaseTestCase):
             payload=DataIngestRequestBody(event_type=EventType.dbchange, events=[]).to_dict(),
         )
 
-        assert response.status_code == http.HTTPStatus.OK
+        assert response.status_code == http.HTTPStatus.ACCEPTED
 
     async def test_insert_with_no_events_doesnt_lazy_create_anything(self) -> None:
-        assert not self._bq_team_dataset_exists()
+        assert not await self._bq_team_dataset_exists()
 
         response = await self.make_request(
             path="/ingest",
@@ -118,12 +121,12 @@ class TestDataIngestionEndpointWithBigQuery(BaseTestCase):
             payload=DataIngestRequestBody(event_type=EventType.dbchange, events=[]).to_dict(),
         )
 
-        assert response.status_code == http.HTTPStatus.OK
-        assert not self._bq_team_dataset_exists()
+        assert response.status_code == http.HTTPStatus.ACCEPTED
+        assert not await self._bq_team_dataset_exists()
 
     async def test_insert_with_events_lazy_creates_db_and_tables(self) -> None:
-        assert not self._bq_team_dataset_exists()
-        assert not self._bq_table_exists("dbchanges")
+        assert not await self._bq_team_dataset_exists()
+        assert not await self._bq_table_exists("dbchanges")
 
         response = await self.make_request(
             path="/ingest",
@@ -148,9 +151,68 @@ class TestDataIngestionEndpointWithBigQuery(BaseTestCase):
             ).to_dict(),
         )
 
-        assert response.status_code == http.HTTPStatus.OK
-        assert self._bq_team_dataset_exists()
-        assert self._bq_table_exists("dbchanges")
+        assert response.status_code == http.HTTPStatus.ACCEPTED
+
+        await ingestion_buffer.flush()
+        assert await self._bq_team_dataset_exists()
+        assert await self._bq_table_exists("dbchanges")
+        assert await self._bq_table_exists("dbchanges_counts")
+
+    async def test_insert_function_calls_lazy_creates_table(self) -> None:
+        assert not await self._bq_table_exists("functioncalls")
+
+        response = await self.make_request(
+            path="/ingest",
+            headers={
+                EAVE_CLIENT_ID: str(self._client_credentials.id),
+                EAVE_CLIENT_SECRET: self._client_credentials.secret,
+            },
+            payload=DataIngestRequestBody(
+                event_type=EventType.functioncall,
+                events=[
+                    FunctionCallEventPayload(
+                        function_module=self.anystr(),
+                        function_class=None,
+                        function_name=self.anystr(),
+                        function_args={self.anystr(): self.anystr()},
+                        call_id=self.anystr(),
+                        timestamp=time.time(),
+                    ).to_json(),
+                ],
+            ).to_dict(),
+        )
+
+        assert response.status_code == http.HTTPStatus.ACCEPTED
+
+        await ingestion_buffer.flush()
+        assert await self._bq_table_exists("functioncalls")
+
+    async def test_ingest_when_buffer_is_full(self) -> None:
+        self.patch(unittest.mock.patch.object(ingestion_buffer, "max_buffered_events", 0))
+
+        response = await self.make_request(
+            path="/ingest",
+            headers={
+                EAVE_CLIENT_ID: str(self._client_credentials.id),
+                EAVE_CLIENT_SECRET: self._client_credentials.secret,
+            },
+            payload=DataIngestRequestBody(
+                event_type=EventType.dbchange,
+                events=[
+                    DatabaseChangeEventPayload(
+                        operation=DatabaseChangeOperation.INSERT,
+                        table_name=self.anystr(),
+                        timestamp=int(time.time()),
+                        new_data={},
+                        old_data=None,
+                    ).to_json(),
+                ],
+            ).to_dict(),
+        )
+
+        assert response.status_code == http.HTTPStatus.SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"]
+        assert ingestion_buffer.buffered_events == 0
 
 # class TestDataIngestionEndpointWithClickhouse(BaseTestCase):
 #     async def asyncSetUp(self) -> None:
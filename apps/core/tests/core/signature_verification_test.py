@@ -9,7 +9,8 @@ from eave.stdlib.core_api.operations.slack import GetSlackInstallation
 from eave.stdlib.core_api.operations.status import Status
 from eave.stdlib.core_api.operations.subscriptions import CreateSubscriptionRequest
 
-from eave.stdlib.headers import EAVE_SIGNATURE_HEADER, EAVE_TEAM_ID_HEADER
+from eave.stdlib.headers import EAVE_REQUEST_ID_HEADER, EAVE_SIG_TS_HEADER, EAVE_SIGNATURE_HEADER, EAVE_TEAM_ID_HEADER
+import eave.stdlib.signing
 
 from .base import BaseTestCase
 
@@ -68,3 +69,20 @@ class TestSignatureVerification(BaseTestCase):
 
         assert response.status_code == HTTPStatus.CREATED
         assert self.get_mock("eave.stdlib.signing.verify_signature_or_exception").call_count == 1
+
+    async def test_repeated_request_is_verified_once(self) -> None:
+        eave_sig_ts = str(eave.stdlib.signing.make_sig_ts())
+        request_id = str(self.anyuuid("request_id"))
+
+        for _ in range(2):
+            response = await self.make_request(
+                path=GetSlackInstallation.config.path,
+                headers={
+                    EAVE_SIG_TS_HEADER: eave_sig_ts,
+                    EAVE_REQUEST_ID_HEADER: request_id,
+                },
+            )
+
+            assert response.status_code != HTTPStatus.BAD_REQUEST
+
+        assert self.get_mock("eave.stdlib.signing.verify_signature_or_exception").call_count == 1
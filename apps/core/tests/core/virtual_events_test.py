@@ -0,0 +1,82 @@
+from eave.core.internal.orm.virtual_event import VirtualEventOrm
+from eave.core.internal.virtual_events import VirtualEventRegistry
+
+from .base import BaseTestCase
+
+
+class TestVirtualEventRegistry(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._registry = VirtualEventRegistry()
+        self._created_views: list[tuple[str, str]] = []
+
+        async with self.db_session.begin() as s:
+            self._team = await self.make_team(session=s)
+
+    async def _create_view(self, *, operation: str, source_table: str) -> None:
+        self._created_views.append((operation, source_table))
+
+    async def _vevent_view_names(self) -> set[str]:
+        async with self.db_session.begin() as s:
+            vevents = await VirtualEventOrm.query(session=s, params=VirtualEventOrm.QueryParams(team_id=self._team.id))
+            return {v.view_name for v in vevents}
+
+    async def test_creates_new_virtual_events(self) -> None:
+        await self._registry.ensure(
+            team_id=self._team.id,
+            operations={("INSERT", "accounts"), ("DELETE", "teams")},
+            create_view=self._create_view,
+        )
+
+        assert sorted(self._created_views) == [("DELETE", "teams"), ("INSERT", "accounts")]
+        assert await self._vevent_view_names() == {"account_created", "team_deleted"}
+
+    async def test_known_virtual_events_are_not_created_again(self) -> None:
+        await self._registry.ensure(
+            team_id=self._team.id,
+            operations={("INSERT", "accounts")},
+            create_view=self._create_view,
+        )
+        await self._registry.ensure(
+            team_id=self._team.id,
+            operations={("INSERT", "accounts")},
+            create_view=self._create_view,
+        )
+
+        # A new registry loads the team's existing virtual events from the database.
+        await VirtualEventRegistry().ensure(
+            team_id=self._team.id,
+            operations={("INSERT", "accounts")},
+            create_view=self._create_view,
+        )
+
+        assert self._created_views == [("INSERT", "accounts")]
+
+    async def test_limits(self) -> None:
+        self._registry.max_per_team = 1
+
+        await self._registry.ensure(
+            team_id=self._team.id,
+            operations={("INSERT", "accounts"), ("DELETE", "teams")},
+            create_view=self._create_view,
+        )
+
+        assert len(self._created_views) == 1
+        assert len(await self._vevent_view_names()) == 1
+
+    async def test_rate_limit(self) -> None:
+        self._registry.create_burst = 1
+        self._registry.create_rate_per_minute = 0
+
+        await self._registry.ensure(
+            team_id=self._team.id,
+            operations={("INSERT", "accounts")},
+            create_view=self._create_view,
+        )
+        await self._registry.ensure(
+            team_id=self._team.id,
+            operations={("DELETE", "teams")},
+            create_view=self._create_view,
+        )
+
+        assert self._created_views == [("INSERT", "accounts")]
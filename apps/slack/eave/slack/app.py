@@ -7,7 +7,7 @@ from eave.stdlib.slack_api.operations import SlackEventProcessorTaskOperation, S
 import eave.stdlib.time
 from starlette.applications import Starlette
 from starlette.routing import Route
-from eave.stdlib import cache
+from eave.stdlib import cache, http_client, signing
 
 from .requests.warmup import StatusRequest, StopRequest, WarmupRequest, StartRequest
 from .requests.event_callback import SlackEventCallbackHandler
@@ -45,9 +45,13 @@ async def graceful_shutdown() -> None:
     if client := cache.initialized_client():
         await client.close()
 
+    await signing.close()
+    await http_client.close()
+
 
 api = Starlette(
     middleware=common_middlewares,
     routes=routes,
+    on_startup=[signing.start_public_key_refresh, http_client.start],
     on_shutdown=[graceful_shutdown],
 )
@@ -6,7 +6,7 @@ from eave.stdlib.config import SHARED_CONFIG
 import eave.stdlib.cache as cache
 from eave.stdlib.endpoints import status_payload
 from eave.stdlib.http_endpoint import HTTPEndpoint
-from eave.stdlib.signing import preload_public_keys
+from eave.stdlib.signing import preload_public_keys_async
 from ..config import SLACK_APP_CONFIG
 from eave.stdlib.logging import eaveLogger
 import eave.stdlib.cache
@@ -20,7 +20,7 @@ class WarmupRequest(HTTPEndpoint):
 
         SHARED_CONFIG.preload()
         SLACK_APP_CONFIG.preload()
-        preload_public_keys()
+        await preload_public_keys_async()
 
         try:
             # Lazily creates a Redis connection
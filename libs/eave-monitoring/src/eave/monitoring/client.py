@@ -1,27 +1,178 @@
 import atexit
-from multiprocessing.connection import Client, Connection
-from typing import Any
+import os
+import socket
+import threading
+import time
 
-from .agent import _sockaddr
+from eave.monitoring.datastructures import EventType
+from eave.monitoring.protocol import BACKPRESSURE_ON, SOCKADDR, encode_frame
 
-_client: Connection | None = None
+# Frames are buffered and written together with a single `sendmsg` call once any of these is reached.
+_max_buffered_frames = 256  # Well under IOV_MAX (1024 on Linux)
+_max_buffered_bytes = 64 * 1024
+_max_buffered_seconds = 0.5
 
+# After the agent can't be reached, events are dropped for this long before reconnecting.
+_reconnect_interval_seconds = 5
 
-def get_client() -> Connection:
+
+class AgentClient:
+    """
+    Sends events to the local trace agent over a Unix domain socket.
+    Safe to use from multiple threads. Events are dropped (not queued) while the agent is unreachable, so a missing agent never affects the traced program.
+    Droppable events are also dropped while the agent signals back-pressure; `dropped` counts them.
+    """
+
+    backpressure: bool
+    dropped: int
+
+    _sock: socket.socket | None
+    _frames: list[bytes]
+    _nbytes: int
+    _lastflush: float
+    _retry_after: float
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._sock = None
+        self._frames = []
+        self._nbytes = 0
+        self._lastflush = time.monotonic()
+        self._retry_after = 0
+        self.backpressure = False
+        self.dropped = 0
+
+    def after_fork(self) -> None:
+        # The child inherits the parent's socket. If both wrote to it, their frames would interleave and corrupt the stream.
+        self._lock = threading.Lock()
+        self._reset()
+
+    def send(self, event_type: EventType, payload: str, droppable: bool = True) -> None:
+        if self.backpressure and droppable:
+            with self._lock:
+                self.dropped += 1
+                # Nothing is being flushed, so check for the signal to resume here.
+                if self._sock and time.monotonic() - self._lastflush >= _max_buffered_seconds:
+                    self._lastflush = time.monotonic()
+                    try:
+                        self._read_control_locked(self._sock)
+                    except OSError:
+                        self._disconnect_locked()
+            return
+
+        frame = encode_frame(event_type=event_type, payload=payload)
+
+        with self._lock:
+            self._frames.append(frame)
+            self._nbytes += len(frame)
+
+            if (
+                len(self._frames) >= _max_buffered_frames
+                or self._nbytes >= _max_buffered_bytes
+                or time.monotonic() - self._lastflush >= _max_buffered_seconds
+            ):
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._sock:
+                self._sock.close()
+            self._reset()
+
+    def _flush_locked(self) -> None:
+        if not self._frames:
+            return
+
+        frames = self._frames
+        nbytes = self._nbytes
+        self._frames = []
+        self._nbytes = 0
+        self._lastflush = time.monotonic()
+
+        try:
+            sock = self._connect_locked()
+            if not sock:
+                return
+
+            sent = sock.sendmsg(frames)
+            if sent < nbytes:
+                sock.sendall(b"".join(frames)[sent:])
+
+            self._read_control_locked(sock)
+        except OSError:
+            # A partially-written frame would corrupt the stream, so the connection is discarded.
+            self._disconnect_locked()
+
+    def _disconnect_locked(self) -> None:
+        if self._sock:
+            self._sock.close()
+        self._sock = None
+        self.backpressure = False
+        self._retry_after = time.monotonic() + _reconnect_interval_seconds
+
+    def _read_control_locked(self, sock: socket.socket) -> None:
+        try:
+            control = sock.recv(64, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return
+
+        if not control:
+            raise ConnectionResetError("agent closed the connection")
+
+        # Only the most recent state matters.
+        self.backpressure = control[-1] == BACKPRESSURE_ON
+
+    def _connect_locked(self) -> socket.socket | None:
+        if self._sock:
+            return self._sock
+
+        if time.monotonic() < self._retry_after:
+            return None
+
+        sock = socket.socket(family=socket.AF_UNIX, type=socket.SOCK_STREAM)
+        try:
+            sock.connect(SOCKADDR)
+        except OSError:
+            sock.close()
+            self._retry_after = time.monotonic() + _reconnect_interval_seconds
+            return None
+
+        self._sock = sock
+        return sock
+
+
+_client: AgentClient | None = None
+
+
+def get_client() -> AgentClient:
     global _client
     if not _client:
-        _client = Client(address=_sockaddr, family="AF_UNIX")
+        _client = AgentClient()
     return _client
 
 
-def send(obj: Any) -> None:
-    get_client().send(obj)
+def send(event_type: EventType, payload: str, droppable: bool = True) -> None:
+    get_client().send(event_type=event_type, payload=payload, droppable=droppable)
 
 
 def _close() -> None:
     if _client:
-        send("EOF")
         _client.close()
 
 
+def _after_fork_in_child() -> None:
+    if _client:
+        _client.after_fork()
+
+
 atexit.register(_close)
+os.register_at_fork(after_in_child=_after_fork_in_child)
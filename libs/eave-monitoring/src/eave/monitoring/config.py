@@ -1,4 +1,10 @@
 import os
+import tempfile
 
 
 EAVE_API_BASE_URL = os.getenv("EAVE_API_BASE_PUBLIC", "https://api.eave.fyi")
+
+EAVE_SPOOL_DIR = os.getenv("EAVE_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "eave", "spool"))
+
+EAVE_CLIENT_ID = os.getenv("EAVE_CLIENT_ID")
+EAVE_CLIENT_SECRET = os.getenv("EAVE_CLIENT_SECRET")
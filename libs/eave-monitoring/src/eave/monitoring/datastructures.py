@@ -26,7 +26,8 @@ class DatabaseChangeOperation(StrEnum):
 @dataclass
 class EventPayload:
     def to_dict(self) -> RawEvent:
-        return dataclasses.asdict(self)
+        # Payloads are flat, so a shallow copy is enough. `dataclasses.asdict` deep-copies every value, which is expensive on the tracing hot path.
+        return dict(vars(self))
 
     def to_json(self) -> str:
         return _compact_json(self.to_dict())
@@ -52,6 +53,50 @@ class FunctionCallEventPayload(EventPayload):
     function_name: str | None
     function_args: dict[str, Any] | None
 
+    call_id: str
+    """Unique per call; made of a per-process token and a counter"""
+
+    timestamp: float
+
+
+@dataclass
+class FunctionCallCountEventPayload(EventPayload):
+    """The exact number of calls to a function since the last report, including the calls that weren't sampled."""
+
+    function_module: str
+    function_class: str | None
+    function_name: str
+
+    call_count: int
+
+    sent_count: int
+    """How many of the calls were sampled and sent as functioncall events"""
+
+    timestamp: float
+
+
+@dataclass
+class FunctionDurationsEventPayload(EventPayload):
+    """
+    Histograms of the durations of the calls to a function that finished since the last report.
+    Each histogram is a dict with `lower_bounds` (nanoseconds), `counts`, and `sum` (nanoseconds).
+    """
+
+    function_module: str
+    function_class: str | None
+    function_name: str
+
+    call_count: int
+
+    error_count: int
+    """How many of the calls raised an exception"""
+
+    wall_time: dict[str, Any]
+    cpu_time: dict[str, Any]
+    """The CPU time of the calling thread"""
+
+    timestamp: float
+
 
 @dataclass
 class FunctionReturnEventPayload(EventPayload):
@@ -80,12 +125,21 @@ class NetworkOutEventPayload(EventPayload):
 
 class EventType(StrEnum):
     dbchange = "dbchange"
+    functioncall = "functioncall"
+    functioncallcount = "functioncallcount"
+    functiondurations = "functiondurations"
 
     @property
     def payload_class(self) -> type[EventPayload]:
         match self:
             case EventType.dbchange:
                 return DatabaseChangeEventPayload
+            case EventType.functioncall:
+                return FunctionCallEventPayload
+            case EventType.functioncallcount:
+                return FunctionCallCountEventPayload
+            case EventType.functiondurations:
+                return FunctionDurationsEventPayload
 
 
 @dataclass
@@ -107,5 +161,9 @@ class DataIngestRequestBody:
         return _compact_json(self.to_dict())
 
 
+# `json.dumps` with any non-default option constructs a new encoder on every call, so one is kept.
+_compact_encoder = json.JSONEncoder(indent=None, separators=(",", ":"))
+
+
 def _compact_json(data: dict[str, Any]) -> str:
-    return json.dumps(data, indent=None, separators=(",", ":"))
+    return _compact_encoder.encode(data)
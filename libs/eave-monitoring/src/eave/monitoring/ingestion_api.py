@@ -1,11 +1,141 @@
+import asyncio
+import gzip
+import hashlib
+import random
+
 import aiohttp
 
-from eave.monitoring.config import EAVE_API_BASE_URL
+from eave.monitoring.config import EAVE_API_BASE_URL, EAVE_CLIENT_ID, EAVE_CLIENT_SECRET
 from eave.monitoring.datastructures import DataIngestRequestBody, EventType
 
+_CLIENT_ID_HEADER = "eave-client-id"
+_CLIENT_SECRET_HEADER = "eave-client-secret"
+_IDEMPOTENCY_KEY_HEADER = "eave-idempotency-key"
 
-async def send_data(event_type: EventType, events: list[str]) -> None:
-    async with aiohttp.ClientSession() as session:
-        body = DataIngestRequestBody(event_type=event_type, events=events)
+# Statuses that mean "try again later"; any other error status is a permanent failure for that batch.
+_RETRYABLE_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+
+def is_permanent_failure(e: Exception) -> bool:
+    """
+    Whether `send` raised because the server rejected the batch, so that sending it again would fail the same way.
+    """
+    return isinstance(e, aiohttp.ClientResponseError) and e.status not in _RETRYABLE_STATUSES
+
+
+class IngestionClient:
+    """
+    A long-lived client for the ingestion API.
+
+    All requests share one keep-alive connection pool, so steady-state uploads don't pay for DNS, TCP, or TLS setup.
+    At most `max_in_flight` requests run concurrently; additional calls to `send` wait for a slot.
+    The session is bound to the event loop that first uses it, so an instance must not be shared between event loops.
+    """
+
+    max_in_flight: int
+    max_attempts: int
+    backoff_base_seconds: float
+    backoff_max_seconds: float
+    timeout_seconds: float
+
+    _session: aiohttp.ClientSession | None
+    _semaphore: asyncio.Semaphore
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        max_attempts: int = 5,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 30,
+        timeout_seconds: float = 30,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.timeout_seconds = timeout_seconds
+        self._session = None
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {
+                aiohttp.hdrs.CONTENT_TYPE: "application/json",
+                aiohttp.hdrs.CONTENT_ENCODING: "gzip",
+            }
+
+            if EAVE_CLIENT_ID and EAVE_CLIENT_SECRET:
+                headers[_CLIENT_ID_HEADER] = EAVE_CLIENT_ID
+                headers[_CLIENT_SECRET_HEADER] = EAVE_CLIENT_SECRET
+
+            self._session = aiohttp.ClientSession(
+                base_url=EAVE_API_BASE_URL,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_in_flight,
+                    keepalive_timeout=60,
+                    ttl_dns_cache=300,
+                ),
+            )
+
+        return self._session
 
-        await session.request(method="POST", url=f"{EAVE_API_BASE_URL}/ingest", compress="gzip", data=body.to_json())
+    async def send(self, event_type: EventType, events: list[str]) -> None:
+        """
+        Sends one batch, retrying transient failures with exponential backoff.
+        Raises the last error if the batch couldn't be delivered.
+        """
+        body = DataIngestRequestBody(event_type=event_type, events=events).to_json().encode()
+
+        # The key is derived from the content, so a batch re-sent after a retry or a restart has the same key and the server can de-duplicate it.
+        idempotency_key = hashlib.sha256(body).hexdigest()
+
+        async with self._semaphore:
+            # Compressing a large batch takes long enough to stall every other upload, so it's done off the event loop.
+            compressed = await asyncio.get_running_loop().run_in_executor(None, gzip.compress, body)
+
+            attempt = 0
+            while True:
+                attempt += 1
+
+                try:
+                    async with self._get_session().post(
+                        "/ingest",
+                        data=compressed,
+                        headers={_IDEMPOTENCY_KEY_HEADER: idempotency_key},
+                    ) as response:
+                        # Read the body so the connection is released back to the pool.
+                        await response.read()
+                        response.raise_for_status()
+                        return
+
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in _RETRYABLE_STATUSES or attempt >= self.max_attempts:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt >= self.max_attempts:
+                        raise
+
+                # "Full jitter" backoff, so that many agents recovering from the same outage don't retry in lockstep.
+                delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2**attempt))
+                await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_client: IngestionClient | None = None
+
+
+def get_client() -> IngestionClient:
+    global _client
+    if not _client:
+        _client = IngestionClient()
+    return _client
+
+
+async def send_data(event_type: EventType, events: list[str]) -> None:
+    await get_client().send(event_type=event_type, events=events)
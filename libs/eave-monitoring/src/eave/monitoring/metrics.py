@@ -0,0 +1,157 @@
+import bisect
+import ctypes
+from dataclasses import dataclass
+import multiprocessing
+import multiprocessing.sharedctypes
+from typing import Any, Self, Sequence
+
+
+def exponential_bounds(start: float, factor: float, count: int) -> list[float]:
+    """
+    >>> exponential_bounds(1, 2, 5)
+    [1, 2, 4, 8, 16]
+    """
+    return [start * factor**i for i in range(count)]
+
+
+@dataclass
+class HistogramSnapshot:
+    bounds: tuple[float, ...]
+    counts: list[int]
+    """counts[i] is the number of observations <= bounds[i]; the last element counts observations above the highest bound."""
+
+    sum: float
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0
+
+    def quantile(self, q: float) -> float:
+        """
+        The upper bound of the bucket containing the q-th quantile. Observations above the highest bound report that bound.
+        """
+        if not self.count:
+            return 0
+
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[min(i, len(self.bounds) - 1)]
+
+        return self.bounds[-1]
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram whose counters live in shared memory.
+    It's created in the parent process and recorded into by a child process, so the parent can read it without any IPC.
+    There must only be one writer.
+    """
+
+    bounds: tuple[float, ...]
+    _counts: ctypes.Array[ctypes.c_uint64]
+    _sum: ctypes.c_double
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = tuple(sorted(bounds))
+        self._counts = multiprocessing.sharedctypes.RawArray(ctypes.c_uint64, len(self.bounds) + 1)
+        self._sum = multiprocessing.sharedctypes.RawValue(ctypes.c_double, 0)
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self.bounds, value)] += 1
+        self._sum.value += value
+
+    def snapshot(self) -> HistogramSnapshot:
+        return HistogramSnapshot(bounds=self.bounds, counts=list(self._counts), sum=self._sum.value)
+
+
+def _loglinear_index(value: int, sub_bucket_bits: int) -> int:
+    sub_buckets = 1 << sub_bucket_bits
+    if value < 2 * sub_buckets:
+        return max(value, 0)
+
+    shift = value.bit_length() - sub_bucket_bits - 1
+    return (shift + 1) * sub_buckets + (value >> shift) - sub_buckets
+
+
+def _loglinear_lower_bound(index: int, sub_bucket_bits: int) -> int:
+    sub_buckets = 1 << sub_bucket_bits
+    if index < 2 * sub_buckets:
+        return index
+
+    shift = index // sub_buckets - 1
+    return (index % sub_buckets + sub_buckets) << shift
+
+
+@dataclass
+class LogLinearHistogramSnapshot:
+    sub_bucket_bits: int
+    counts: dict[int, int]
+    """Bucket index to count. Only non-empty buckets are present."""
+
+    sum: int
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def __sub__(self, other: Self) -> Self:
+        """The observations recorded between `other` and this snapshot of the same histogram."""
+        counts = {i: c - other.counts.get(i, 0) for i, c in self.counts.items()}
+        return type(self)(
+            sub_bucket_bits=self.sub_bucket_bits,
+            counts={i: c for i, c in counts.items() if c},
+            sum=self.sum - other.sum,
+        )
+
+    def quantile(self, q: float) -> int:
+        """The lower bound of the bucket containing the q-th quantile, which is within the histogram's precision of the true value."""
+        rank = q * self.count
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return _loglinear_lower_bound(i, self.sub_bucket_bits)
+
+        return 0
+
+    def to_dict(self) -> dict[str, Any]:
+        indexes = sorted(self.counts)
+        return {
+            "lower_bounds": [_loglinear_lower_bound(i, self.sub_bucket_bits) for i in indexes],
+            "counts": [self.counts[i] for i in indexes],
+            "sum": self.sum,
+        }
+
+
+class LogLinearHistogram:
+    """
+    An HDR-style histogram of non-negative integers, eg durations in nanoseconds.
+
+    Each power of two is split into 2**sub_bucket_bits equal buckets, so every value is recorded with a relative error below 2**-sub_bucket_bits over any range, in a few hundred buckets at most.
+    Only non-empty buckets are stored.
+    Recording is lock-free; an observation from one thread can occasionally overwrite a concurrent one from another, which is acceptable for latency profiles.
+    """
+
+    sub_bucket_bits: int
+    _counts: dict[int, int]
+    _sum: int
+
+    def __init__(self, sub_bucket_bits: int = 3) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self._counts = {}
+        self._sum = 0
+
+    def record(self, value: int) -> None:
+        i = _loglinear_index(value, self.sub_bucket_bits)
+        self._counts[i] = self._counts.get(i, 0) + 1
+        self._sum += value
+
+    def snapshot(self) -> LogLinearHistogramSnapshot:
+        return LogLinearHistogramSnapshot(sub_bucket_bits=self.sub_bucket_bits, counts=dict(self._counts), sum=self._sum)
@@ -0,0 +1,161 @@
+"""
+Captures database changes from a logical replication slot instead of triggers, so nothing runs on the customer's write path.
+
+Requires `wal_level = logical`, the wal2json output plugin, and a user with the REPLICATION attribute.
+https://www.postgresql.org/docs/current/logicaldecoding.html
+https://github.com/eulerto/wal2json
+"""
+
+import asyncio
+from datetime import datetime
+import json
+import signal
+import sys
+import time
+from types import FrameType
+from typing import Any
+
+import psycopg
+
+from eave.monitoring.datastructures import DatabaseChangeEventPayload, DatabaseChangeOperation, EventType
+from eave.monitoring.ingestion_api import IngestionClient
+
+_DEFAULT_SLOT_NAME = "eave_dbchange_slot"
+
+# Max changes decoded per batch. Decoding always stops at a transaction boundary, so a batch can be somewhat larger.
+_batch_size = 1000
+_poll_interval_seconds = 1
+_retry_interval_seconds = 10
+
+# Changes are peeked, not consumed, so they're decoded again until the slot is advanced past them.
+# Transaction boundaries are included so the slot can be advanced to a commit record; advancing to the middle of a transaction would deliver that transaction again.
+_WAL2JSON_OPTIONS = (
+    "format-version",
+    "2",
+    "include-transaction",
+    "true",
+    "include-timestamp",
+    "true",
+    "add-tables",
+    "public.*",
+)
+
+_OPERATIONS = {
+    "I": DatabaseChangeOperation.INSERT,
+    "U": DatabaseChangeOperation.UPDATE,
+    "D": DatabaseChangeOperation.DELETE,
+}
+
+
+def decode_change(data: str) -> DatabaseChangeEventPayload | None:
+    """
+    Converts one wal2json (format version 2) change into an event. Returns None for anything that isn't a row change, eg transaction boundaries.
+
+    Old row data only includes the replica identity columns (usually the primary key), unless the table has `REPLICA IDENTITY FULL`.
+    """
+    change: dict[str, Any] = json.loads(data)
+
+    operation = _OPERATIONS.get(change["action"])
+    if operation is None:
+        return None
+
+    new_data = None
+    if "columns" in change:
+        new_data = {c["name"]: c["value"] for c in change["columns"]}
+
+    old_data = None
+    if "identity" in change:
+        old_data = {c["name"]: c["value"] for c in change["identity"]}
+
+    timestamp = time.time()
+    if ts := change.get("timestamp"):
+        timestamp = datetime.fromisoformat(ts).timestamp()
+
+    return DatabaseChangeEventPayload(
+        table_name=change["table"],
+        operation=operation,
+        timestamp=timestamp,
+        new_data=new_data,
+        old_data=old_data,
+    )
+
+
+class ReplicationSlotReader:
+    """
+    Reads batches of changes from a logical replication slot, and advances the slot past a batch only once it has been sent.
+    While ingestion is failing the slot stays where it is, and Postgres retains the WAL from that point, so nothing is lost.
+    """
+
+    conn: psycopg.AsyncConnection
+    slot_name: str
+
+    def __init__(self, conn: psycopg.AsyncConnection, slot_name: str) -> None:
+        self.conn = conn
+        self.slot_name = slot_name
+
+    async def ensure_slot(self) -> None:
+        async with self.conn.cursor() as curs:
+            await curs.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (self.slot_name,))
+            if await curs.fetchone():
+                return
+
+            await curs.execute("SELECT pg_create_logical_replication_slot(%s, 'wal2json')", (self.slot_name,))
+
+    async def peek(self) -> tuple[list[str], str | None]:
+        """
+        The decoded events in the next batch, and the LSN to advance the slot to once they're sent (None if there were no changes).
+        """
+        async with self.conn.cursor() as curs:
+            await curs.execute(
+                "SELECT lsn, data FROM pg_logical_slot_peek_changes(%s, NULL, %s, VARIADIC %s::text[])",
+                (self.slot_name, _batch_size, list(_WAL2JSON_OPTIONS)),
+            )
+            rows = await curs.fetchall()
+
+        if not rows:
+            return ([], None)
+
+        events = [e.to_json() for (_, data) in rows if (e := decode_change(data))]
+        return (events, str(rows[-1][0]))
+
+    async def advance(self, lsn: str) -> None:
+        async with self.conn.cursor() as curs:
+            await curs.execute("SELECT pg_replication_slot_advance(%s, %s::pg_lsn)", (self.slot_name, lsn))
+
+
+async def start_replication_agent(conninfo: str, team_id: str, slot_name: str = _DEFAULT_SLOT_NAME) -> None:
+    conn = await psycopg.AsyncConnection.connect(conninfo=conninfo, autocommit=True)
+    reader = ReplicationSlotReader(conn=conn, slot_name=slot_name)
+    client = IngestionClient()
+
+    def _sighandler(signum: int, frame: FrameType | None) -> None:
+        # Safe at any point: the slot is only advanced after a batch is sent, so an interrupted batch is sent again on the next start.
+        sys.exit()
+
+    signal.signal(signal.SIGINT, _sighandler)
+    signal.signal(signal.SIGTERM, _sighandler)
+
+    try:
+        await reader.ensure_slot()
+        print("Eave PostgreSQL replication agent started (Ctrl-C to stop)")
+
+        while True:
+            (events, lsn) = await reader.peek()
+            if lsn is None:
+                await asyncio.sleep(_poll_interval_seconds)
+                continue
+
+            if events:
+                try:
+                    # The client retries transient failures itself; an error here means it gave up.
+                    await client.send(event_type=EventType.dbchange, events=events)
+                except Exception as e:
+                    print(e)
+                    await asyncio.sleep(_retry_interval_seconds)
+                    continue
+
+            await reader.advance(lsn)
+
+    finally:
+        await client.close()
+        await conn.close()
@@ -1,38 +1,39 @@
+-- Change events too large for a NOTIFY payload (which must be shorter than 8000 bytes) are written here, and only a pointer to the row is sent.
+-- The table is unlogged because it only holds rows until the agent has read them; skipping the WAL keeps the extra write cheap.
+-- Its contents are lost if the server crashes, like pending notifications are.
+CREATE UNLOGGED TABLE IF NOT EXISTS eave_dbchange_staging (
+    id BIGSERIAL PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE OR REPLACE FUNCTION eave_notify_dbchange()
 RETURNS TRIGGER
 AS $$
 DECLARE
     channel_name VARCHAR := 'eave_dbchange_channel';
-    ts INTEGER := TRUNC(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP));
+    -- Leaves headroom under the 8000 byte limit for the channel name.
+    max_payload_bytes INTEGER := 7900;
+    payload TEXT;
+    staged_id BIGINT;
 BEGIN
-    IF (TG_OP = 'INSERT') THEN
-        PERFORM pg_notify(channel_name,
-            '{"table_name":"' || TG_TABLE_NAME ||
-            '","operation":"' || TG_OP ||
-            '","new_data":' || row_to_json(NEW, FALSE) ||
-            ',"old_data":null,"timestamp":"' || ts || '"}'
-        );
-        RETURN NULL;
-
-    ELSIF (TG_OP = 'UPDATE') THEN
-        PERFORM pg_notify(channel_name,
-            '{"table_name":"' || TG_TABLE_NAME ||
-            '","operation":"' || TG_OP ||
-            '","new_data":' || row_to_json(NEW, FALSE) ||
-            ',"old_data":' || row_to_json(OLD, FALSE) ||
-            ',"timestamp":"' || ts || '"}'
-        );
-        RETURN NULL;
+    payload := json_build_object(
+        'table_name', TG_TABLE_NAME,
+        'operation', TG_OP,
+        'new_data', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE row_to_json(NEW, FALSE) END,
+        'old_data', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE row_to_json(OLD, FALSE) END,
+        'timestamp', EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)
+    )::TEXT;
 
-    ELSIF (TG_OP = 'DELETE') THEN
-        PERFORM pg_notify(channel_name,
-            '{"table_name":"' || TG_TABLE_NAME ||
-            '","operation":"' || TG_OP ||
-            '","new_data":null,"old_data":' || row_to_json(OLD, FALSE) ||
-            ',"timestamp":"' || ts || '"}'
-        );
-        RETURN NULL;
+    IF OCTET_LENGTH(payload) <= max_payload_bytes THEN
+        PERFORM pg_notify(channel_name, payload);
+    ELSE
+        INSERT INTO eave_dbchange_staging (payload) VALUES (payload) RETURNING id INTO staged_id;
+        -- The agent recognizes pointers by this prefix; event payloads are JSON objects, so they start with "{".
+        PERFORM pg_notify(channel_name, 'staged:' || staged_id);
     END IF;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -46,6 +47,8 @@ BEGIN
         SELECT DISTINCT table_name
         FROM information_schema.tables
         WHERE table_schema = 'public'
+        -- A trigger on the staging table would stage its own inserts, forever.
+        AND table_name <> 'eave_dbchange_staging'
     LOOP
         PERFORM 1 FROM information_schema.triggers
         WHERE event_object_table = t.table_name
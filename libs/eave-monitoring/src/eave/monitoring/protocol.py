@@ -0,0 +1,81 @@
+"""
+Wire format between traced processes and the local trace agent.
+
+A stream is a sequence of frames. Each frame is a fixed header followed by the event payload:
+
+    | payload length (4 bytes, big-endian) | event type code (1 byte) | payload (UTF-8 compact JSON) |
+
+The payload is the same JSON string that's eventually sent to the ingestion API, so it's serialized exactly once, in the traced process.
+The agent only has to find frame boundaries; it never decodes and re-encodes the payload.
+
+In the other direction, the agent writes single-byte control messages to the client. The most recent one is the current state.
+"""
+
+import struct
+from typing import Iterator
+
+from eave.monitoring.datastructures import EventType
+
+SOCKADDR = "/tmp/eaveagent.sock"
+
+frame_header = struct.Struct(">IB")
+
+BACKPRESSURE_ON = 0x01
+"""The agent is falling behind; clients should stop sending (or send less) until BACKPRESSURE_OFF"""
+
+BACKPRESSURE_OFF = 0x00
+
+_EVENT_TYPE_CODES: dict[EventType, int] = {
+    EventType.dbchange: 1,
+    EventType.functioncall: 2,
+    EventType.functioncallcount: 3,
+    EventType.functiondurations: 4,
+}
+
+_EVENT_TYPES_BY_CODE = {v: k for k, v in _EVENT_TYPE_CODES.items()}
+
+
+class FrameError(Exception):
+    pass
+
+
+def encode_frame(event_type: EventType, payload: str) -> bytes:
+    data = payload.encode("utf-8")
+    return frame_header.pack(len(data), _EVENT_TYPE_CODES[event_type]) + data
+
+
+def complete_frames_length(buf: memoryview) -> int:
+    """
+    The number of leading bytes of `buf` that make up whole frames.
+    Anything after that is a partial frame whose remainder hasn't been received yet.
+    """
+    offset = 0
+    while offset + frame_header.size <= len(buf):
+        (length, _) = frame_header.unpack_from(buf, offset)
+        end = offset + frame_header.size + length
+        if end > len(buf):
+            break
+        offset = end
+
+    return offset
+
+
+def iter_frames(buf: memoryview) -> Iterator[tuple[EventType, memoryview]]:
+    """
+    Iterates over the frames in `buf`, which must contain only whole frames.
+    The payloads are slices of `buf`, not copies.
+    """
+    offset = 0
+    while offset < len(buf):
+        (length, code) = frame_header.unpack_from(buf, offset)
+        start = offset + frame_header.size
+        end = start + length
+        if end > len(buf):
+            raise FrameError("truncated frame")
+
+        event_type = _EVENT_TYPES_BY_CODE.get(code)
+        if event_type is None:
+            raise FrameError(f"unknown event type code: {code}")
+
+        yield (event_type, buf[start:end])
+        offset = end
@@ -3,8 +3,9 @@ import inspect
 import sys
 from typing import Any, Callable, Concatenate
 
-from eave.stdlib.pytracing.config import EaveConfig
-from .callbacks import eave_tracer, trace_py_start
+from .config import EaveConfig
+from . import callbacks
+from .callbacks import eave_tracer, trace_py_return, trace_py_start, trace_py_unwind
 
 _tool_id = 0
 
@@ -13,22 +14,44 @@ _tool_id = 0
 _events: dict[int, Callable[Concatenate[EaveConfig, ...], Any]] = {
     # sys.monitoring.events.CALL: trace_call,
     sys.monitoring.events.PY_START: trace_py_start,
-    # sys.monitoring.events.PY_RETURN: trace_py_return,
 }
 
-_events_mask = reduce(lambda a, b: a | b, _events.keys())
+# Only registered when durations are measured.
+_duration_events: dict[int, Callable[Concatenate[EaveConfig, ...], Any]] = {
+    sys.monitoring.events.PY_RETURN: trace_py_return,
+    sys.monitoring.events.PY_UNWIND: trace_py_unwind,
+}
 
 
 def start_tracing(
     scope: str | None = None,
+    sample_rate: float = 1,
+    max_calls_per_second: float | None = None,
+    max_calls_burst: float | None = None,
+    adaptive_sampling: bool = True,
+    measure_durations: bool = True,
+    report_interval_seconds: float = 10,
 ) -> None:
     """
     Start automatic tracing for analytics.
 
     * scope: A module or package name prefix to scope tracing to. For example, passing `eave.stdlib` will only trace code in the `eave.stdlib` package. If set to None (default), the calling module will be used. The scope improves performance by ignoring irrelevant code. If you want to turn off scoping (not recommended), pass an empty string.
+    * sample_rate: The probability that any one call to a traced function is sent, between 0 and 1. Defaults to every call.
+    * max_calls_per_second: Limits how many calls are sent for each function. Each function gets a token bucket that holds `max_calls_burst` calls (default: one second's worth).
+    * adaptive_sampling: When the local agent can't keep up, send progressively fewer calls until it recovers.
+    * measure_durations: Measure the wall and CPU time of each call to a traced function. The durations are aggregated into a histogram per function, in this process.
+    * report_interval_seconds: How often the exact call count and duration histograms for each function are sent. They include calls that weren't sent because of sampling.
     """
 
-    config = EaveConfig(scope=scope)
+    config = EaveConfig(
+        scope=scope,
+        sample_rate=sample_rate,
+        max_calls_per_second=max_calls_per_second,
+        max_calls_burst=max_calls_burst,
+        adaptive_sampling=adaptive_sampling,
+        measure_durations=measure_durations,
+        report_interval_seconds=report_interval_seconds,
+    )
 
     if config.scope is None:
         if (
@@ -38,21 +61,29 @@ def start_tracing(
         ):
             config.scope = tracemodule.__package__
 
+    # Decisions cached by an earlier session may have used a different scope.
+    callbacks.reset(config)
     sys.monitoring.use_tool_id(_tool_id, "eave")
 
-    for event, callback in _events.items():
+    events = _events | _duration_events if config.measure_durations else _events
+
+    for event, callback in events.items():
         func = eave_tracer(config=config)(callback)
         sys.monitoring.register_callback(_tool_id, event, func)
 
-    sys.monitoring.set_events(_tool_id, _events_mask)
+    sys.monitoring.set_events(_tool_id, reduce(lambda a, b: a | b, events.keys()))
+    # Re-enable any code locations that an earlier session disabled.
+    sys.monitoring.restart_events()
+    callbacks.start_reporting(config)
     # write_queue.start_autoflush()
 
 
 def stop_tracing() -> None:
     sys.monitoring.set_events(_tool_id, 0)
 
-    for event in _events:
+    for event in _events | _duration_events:
         sys.monitoring.register_callback(_tool_id, event, None)
 
     sys.monitoring.free_tool_id(_tool_id)
+    callbacks.stop_reporting()
     # write_queue.stop_autoflush()
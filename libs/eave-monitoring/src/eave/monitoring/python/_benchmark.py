@@ -0,0 +1,75 @@
+"""
+Measures the tracer's per-call overhead against an untraced baseline.
+
+    python -m eave.monitoring.python._benchmark [--calls N] [--repeat N] [--sample-rate R]
+
+The same workload is run untraced, traced with the workload out of scope, and traced in scope.
+The agent doesn't need to be running: without it, events are still serialized and buffered before they're dropped, so the in-scope number is what the traced program pays.
+"""
+
+import argparse
+import importlib
+import statistics
+import time
+from types import ModuleType
+
+import eave.monitoring.python
+
+
+def traced_function(a: int, b: str, c: float | None = None) -> int:
+    return a
+
+
+class Traced:
+    def traced_method(self, a: int) -> int:
+        return a
+
+
+def run_workload(calls: int) -> int:
+    """Returns the elapsed time in nanoseconds."""
+    f = traced_function
+    m = Traced().traced_method
+
+    start = time.perf_counter_ns()
+    for i in range(calls // 2):
+        f(i, "b")
+        m(i)
+    return time.perf_counter_ns() - start
+
+
+def _measure(workload: ModuleType, calls: int, repeat: int) -> float:
+    """The median cost per call, in nanoseconds. The first run warms up any caches and is discarded."""
+    workload.run_workload(calls)
+    return statistics.median(workload.run_workload(calls) / calls for _ in range(repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Eave Python tracer microbenchmark")
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sample-rate", type=float, default=1)
+    args = parser.parse_args()
+
+    # Run as `-m`, this module is `__main__`, which is never traced. Importing it by name gives a copy that can be.
+    workload = importlib.import_module("eave.monitoring.python._benchmark")
+
+    baseline = _measure(workload, args.calls, args.repeat)
+    print(f"untraced:          {baseline:8.1f} ns/call")
+
+    eave.monitoring.python.start_tracing(scope="eave.monitoring.python._benchmark_out_of_scope")
+    try:
+        out_of_scope = _measure(workload, args.calls, args.repeat)
+    finally:
+        eave.monitoring.python.stop_tracing()
+    print(f"traced, ignored:   {out_of_scope:8.1f} ns/call ({out_of_scope - baseline:+.1f})")
+
+    eave.monitoring.python.start_tracing(scope=workload.__name__, sample_rate=args.sample_rate)
+    try:
+        in_scope = _measure(workload, args.calls, args.repeat)
+    finally:
+        eave.monitoring.python.stop_tracing()
+    print(f"traced, in scope:  {in_scope:8.1f} ns/call ({in_scope - baseline:+.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import eave.stdlib.pytracing
+import eave.monitoring.python
 
 
 class Person:
@@ -29,7 +29,7 @@ def print_person_repr():
 
 
 if __name__ == "__main__":
-    eave.stdlib.pytracing.start_tracing()
+    eave.monitoring.python.start_tracing()
 
     print_person_name()
     print_person_age()
@@ -1,104 +1,405 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
 import multiprocessing
 import multiprocessing.connection
-from multiprocessing.connection import Connection, Listener
+import multiprocessing.reduction
+from multiprocessing.connection import Connection
 import os
-from queue import Empty
+import selectors
 import signal
-import sys
+import socket
+import struct
 from types import FrameType
-from typing import Any, cast
+from typing import cast
 
-from eave.stdlib.pytracing import clickhouse
-
-_sockaddr = "/tmp/eaveagent.sock"
-_endmsg = "EOF"
+from eave.monitoring import protocol
+from eave.monitoring.datastructures import EventType
+from eave.monitoring.ingestion_api import IngestionClient
 
 _buffer_maxsize = 1000
+_buffer_maxage_seconds = 5
+_recv_bufsize = 256 * 1024
 
+# Back-pressure is signaled when the batcher holds more than the high watermark of undelivered events, and released below the low watermark.
+_backpressure_high_watermark = 50_000
+_backpressure_low_watermark = 10_000
 
-def _flush(buffer: list[Any]) -> None:
-    print("Flushing queue, size:", len(buffer))
-    buffer_copy = buffer.copy()
+_peercred = struct.Struct("3i")  # struct ucred: pid, uid, gid
 
-    try:
-        clickhouse.insert(buffer_copy)
-    except Exception as e:
-        print(e)
-    else:
-        buffer.clear()
-        print("Done")
+
+class _HashRing:
+    """
+    Consistent hashing of connection keys onto worker indexes.
+    When a worker is restarted it keeps its index, so the same clients keep landing on it.
+    """
+
+    _points: list[int]
+    _nodes: list[int]
+
+    def __init__(self, nodes: list[int], replicas: int = 64) -> None:
+        ring = sorted((self._hash(f"{node}:{i}".encode()), node) for node in nodes for i in range(replicas))
+        self._points = [p for p, _ in ring]
+        self._nodes = [n for _, n in ring]
+
+    @staticmethod
+    def _hash(key: bytes) -> int:
+        return int.from_bytes(hashlib.md5(key, usedforsecurity=False).digest()[:8])
+
+    def get(self, key: bytes) -> int:
+        i = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._nodes[i]
 
 
-def _q_processor(q: multiprocessing.Queue) -> None:
+def _connection_key(sock: socket.socket) -> bytes:
+    """
+    Connections are sharded by the client's process ID, so a process that reconnects is handled by the same worker.
+    """
+    try:
+        pid, _, _ = _peercred.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _peercred.size))
+        return str(pid).encode()
+    except (AttributeError, OSError):
+        # SO_PEERCRED is Linux-only.
+        return str(sock.fileno()).encode()
+
+
+class _FrameStream:
+    """
+    Reassembles frames from one client socket.
+    """
+
+    sock: socket.socket
+    _buf: bytearray
+    _pending: int
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self._buf = bytearray(_recv_bufsize)
+        self._pending = 0
+
+    def read(self, out: Connection) -> bool:
+        """
+        Reads what's available on the socket and forwards any whole frames to `out`, as raw bytes.
+        Returns False when the client has closed the connection.
+        """
+        end = 0
+
+        with memoryview(self._buf) as view:
+            n = self.sock.recv_into(view[self._pending :])
+            if n == 0:
+                return False
+
+            self._pending += n
+            end = protocol.complete_frames_length(view[: self._pending])
+            if end > 0:
+                # `send_bytes` doesn't pickle, so the payloads are never re-serialized.
+                out.send_bytes(view[:end])
+
+        if end > 0:
+            # Move the trailing partial frame to the front of the buffer.
+            self._buf[: self._pending - end] = self._buf[end : self._pending]
+            self._pending -= end
+        elif self._pending == len(self._buf):
+            # A single frame is larger than the buffer.
+            self._buf.extend(bytes(len(self._buf)))
+
+        return True
+
+
+def _worker(handoff: Connection, batcher: Connection) -> None:
+    """
+    Serves every client connection assigned to this worker.
+    New connections arrive from the controller as file descriptors over `handoff`.
+    Whole frames are forwarded to the shared batcher, and back-pressure signals from the batcher are relayed to the clients.
+    """
     running = True
 
     def _sighandler(signum: int, frame: FrameType | None) -> None:
         nonlocal running
         running = False
 
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
     signal.signal(signal.SIGTERM, _sighandler)
 
-    buffer: list[Any] = []
+    sel = selectors.DefaultSelector()
+    sel.register(handoff, selectors.EVENT_READ)
+    sel.register(batcher, selectors.EVENT_READ)
+    streams: dict[int, _FrameStream] = {}
+    backpressure = bytes((protocol.BACKPRESSURE_OFF,))
+
+    def _close_stream(stream: _FrameStream) -> None:
+        sel.unregister(stream.sock)
+        streams.pop(stream.sock.fileno(), None)
+        stream.sock.close()
 
-    while True:
+    try:
+        while running:
+            for key, _ in sel.select(timeout=1):
+                if key.fileobj is handoff:
+                    try:
+                        fd = multiprocessing.reduction.recv_handle(handoff)
+                    except EOFError:
+                        running = False
+                        break
+
+                    sock = socket.socket(fileno=fd)
+                    sock.setblocking(True)
+                    stream = _FrameStream(sock)
+                    streams[sock.fileno()] = stream
+                    sel.register(sock, selectors.EVENT_READ, data=stream)
+
+                    if backpressure[0] == protocol.BACKPRESSURE_ON:
+                        sock.send(backpressure)
+
+                elif key.fileobj is batcher:
+                    try:
+                        backpressure = batcher.recv_bytes()
+                    except EOFError:
+                        sel.unregister(batcher)
+                        continue
+
+                    for stream in list(streams.values()):
+                        try:
+                            stream.sock.send(backpressure)
+                        except OSError:
+                            _close_stream(stream)
+
+                else:
+                    stream = cast(_FrameStream, key.data)
+                    try:
+                        if not stream.read(out=batcher):
+                            _close_stream(stream)
+                    except OSError:
+                        _close_stream(stream)
+    finally:
+        for stream in list(streams.values()):
+            _close_stream(stream)
+        batcher.close()
+
+
+class _Batcher:
+    """
+    The shared batching stage. Events from every worker (and so from every client) are merged into large batches per event type.
+    """
+
+    client: IngestionClient
+    buffers: dict[EventType, list[str]]
+    _workers: list[Connection]
+    _in_flight: int
+    _backpressure: bool
+    _tasks: set[asyncio.Task[None]]
+
+    def __init__(self, workers: list[Connection]) -> None:
+        self.client = IngestionClient()
+        self.buffers = {}
+        self._workers = workers
+        self._in_flight = 0
+        self._backpressure = False
+        self._tasks = set()
+
+    @property
+    def undelivered(self) -> int:
+        return self._in_flight + sum(len(b) for b in self.buffers.values())
+
+    def receive(self, conn: Connection) -> bool:
+        """
+        Returns False when the worker's end of the pipe is closed.
+        """
         try:
-            msg = q.get(timeout=1)
-            buffer.append(msg)
+            data = conn.recv_bytes()
+        except EOFError:
+            return False
+
+        for event_type, payload in protocol.iter_frames(memoryview(data)):
+            buffer = self.buffers.setdefault(event_type, [])
+            buffer.append(str(payload, "utf-8"))
 
             if len(buffer) >= _buffer_maxsize:
-                _flush(buffer)
+                self.flush(event_type)
 
-        except Empty:
-            # This allows the queue to be flushed before exiting this process
-            if not running:
-                _flush(buffer)
-                break
+        self._update_backpressure()
+        return True
 
+    def flush(self, event_type: EventType) -> None:
+        buffer = self.buffers.get(event_type)
+        if not buffer:
+            return
 
-def _connection_handler(conn: Connection) -> None:
-    q = multiprocessing.Queue()
-    p = multiprocessing.Process(target=_q_processor, args=(q,))
-    p.start()
+        self.buffers[event_type] = []
+        self._in_flight += len(buffer)
+        task = asyncio.create_task(self._send(event_type=event_type, events=buffer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
-    def _cleanup() -> None:
-        conn.close()
-        p.terminate()
-        p.join(timeout=30)
+    def flush_all(self) -> None:
+        for event_type in list(self.buffers):
+            self.flush(event_type)
 
-    def _sighandler(signum: int, frame: FrameType | None) -> None:
-        _cleanup()
-        sys.exit(signum)
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
 
-    signal.signal(signal.SIGTERM, _sighandler)
+    async def _send(self, event_type: EventType, events: list[str]) -> None:
+        print("Flushing queue, size:", len(events))
 
-    while msg := conn.recv():
-        if msg == _endmsg:
-            _cleanup()
-            break
+        try:
+            await self.client.send(event_type=event_type, events=events)
+        except Exception as e:
+            print(e)
+        finally:
+            self._in_flight -= len(events)
+            self._update_backpressure()
+
+    def _update_backpressure(self) -> None:
+        undelivered = self.undelivered
+
+        if not self._backpressure and undelivered >= _backpressure_high_watermark:
+            self._backpressure = True
+            self._signal(protocol.BACKPRESSURE_ON)
+        elif self._backpressure and undelivered <= _backpressure_low_watermark:
+            self._backpressure = False
+            self._signal(protocol.BACKPRESSURE_OFF)
+
+    def _signal(self, state: int) -> None:
+        for conn in self._workers:
+            try:
+                conn.send_bytes(bytes((state,)))
+            except OSError:
+                pass
 
-        q.put(msg, block=False)
 
+async def _run_batcher(workers: list[Connection]) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-def start_controller():
-    running = True
-    listener = Listener(address=_sockaddr, family="AF_UNIX")
+    loop = asyncio.get_running_loop()
+    batcher = _Batcher(workers=workers)
+    done = asyncio.Event()
+    open_conns = set(workers)
+
+    def _on_readable(conn: Connection) -> None:
+        if not batcher.receive(conn):
+            loop.remove_reader(conn.fileno())
+            open_conns.discard(conn)
+
+    for conn in workers:
+        loop.add_reader(conn.fileno(), _on_readable, conn)
+
+    # The controller sends SIGTERM once every worker has exited.
+    loop.add_signal_handler(signal.SIGTERM, done.set)
+
+    try:
+        while not done.is_set():
+            try:
+                await asyncio.wait_for(done.wait(), timeout=_buffer_maxage_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+            batcher.flush_all()
+
+        # Pick up whatever the workers wrote before they exited.
+        for conn in list(open_conns):
+            loop.remove_reader(conn.fileno())
+            while conn.poll(0) and batcher.receive(conn):
+                pass
+
+        batcher.flush_all()
+        await batcher.drain()
+    finally:
+        await batcher.client.close()
+
+
+def _batcher_event_loop(workers: list[Connection]) -> None:
+    asyncio.run(_run_batcher(workers))
+
+
+class _WorkerSlot:
+    """
+    The controller's handle on one worker. The pipes outlive the worker process, so a restarted worker picks up where the previous one left off.
+    """
+
+    index: int
+    handoff: Connection
+    worker_handoff: Connection
+    batcher_end: Connection
+    worker_end: Connection
+    process: multiprocessing.Process | None
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.worker_handoff, self.handoff = multiprocessing.Pipe(duplex=True)
+        self.batcher_end, self.worker_end = multiprocessing.Pipe(duplex=True)
+        self.process = None
+
+    def start(self) -> None:
+        self.process = multiprocessing.Process(target=_worker, args=(self.worker_handoff, self.worker_end))
+        self.process.start()
+
+    def ensure_alive(self) -> None:
+        if self.process is None or not self.process.is_alive():
+            if self.process:
+                print("Restarting worker", self.index)
+                self.process.join()
+            self.start()
+
+    def hand_off(self, sock: socket.socket) -> None:
+        assert self.process and self.process.pid
+        multiprocessing.reduction.send_handle(self.handoff, sock.fileno(), self.process.pid)
+
+
+def _listen() -> socket.socket:
+    try:
+        os.unlink(protocol.SOCKADDR)
+    except FileNotFoundError:
+        pass
+
+    listener = socket.socket(family=socket.AF_UNIX, type=socket.SOCK_STREAM)
+    listener.bind(protocol.SOCKADDR)
+    listener.listen()
 
-    # FIXME: Using private properties to set a timeout on socket operations.
     # This allows `listener.accept()` to be effectively non-blocking.
-    listener._listener._socket.settimeout(1)  # type: ignore
-    workers: list[multiprocessing.Process] = []
+    listener.settimeout(1)
+    return listener
+
+
+def start_controller(num_workers: int | None = None):
+    """
+    Starts the agent: a fixed pool of workers that serve client connections, plus one batcher that merges their events into large uploads.
+    The number of processes doesn't depend on the number of traced clients.
+    """
+    running = True
+    listener = _listen()
+
+    num_workers = num_workers or os.cpu_count() or 1
+    slots = [_WorkerSlot(index=i) for i in range(num_workers)]
+    ring = _HashRing(nodes=[s.index for s in slots])
+
+    batcher = multiprocessing.Process(target=_batcher_event_loop, args=([s.batcher_end for s in slots],))
+    batcher.start()
 
-    print("Eave agent started. (Ctrl-C to stop)", os.getpid())
+    for slot in slots:
+        slot.start()
+
+    print("Eave agent started. (Ctrl-C to stop)", os.getpid(), f"workers={num_workers}")
 
     def _cleanup() -> None:
-        for worker in workers:
-            worker.terminate()
+        listener.close()
+
+        for slot in slots:
+            if slot.process:
+                slot.process.terminate()
 
-        sentinels = [w.sentinel for w in workers]
+        sentinels = [s.process.sentinel for s in slots if s.process]
         while sentinels:
             for sentinel in multiprocessing.connection.wait(sentinels, timeout=60):
                 sentinels.remove(cast(int, sentinel))
 
+        # The workers are gone, so the batcher won't receive anything new; it flushes and exits on SIGTERM.
+        batcher.terminate()
+        batcher.join(timeout=60)
+        if batcher.is_alive():
+            batcher.kill()
+
     def _sighandler(signum: int, frame: FrameType | None) -> None:
         print("Shutting down...", os.getpid())
         nonlocal running
@@ -112,26 +413,25 @@ def start_controller():
     print("Waiting for connections...")
 
     try:
-        while True:
-            if not running:
-                break
-            for worker in workers:
-                if not worker.is_alive():
-                    worker.terminate()  # Actively cleanup defunct processes
-                    workers.remove(worker)
-
+        while running:
             try:
-                conn = listener.accept()
-                print("Connection accepted")
-                p = multiprocessing.Process(target=_connection_handler, args=(conn,))
-                p.start()
-                workers.append(p)
-                conn.close()
+                conn, _ = listener.accept()
             except TimeoutError:
+                for slot in slots:
+                    slot.ensure_alive()
                 continue
+
+            with conn:
+                slot = slots[ring.get(_connection_key(conn))]
+                slot.ensure_alive()
+                slot.hand_off(conn)
     finally:
         _cleanup()
 
 
 if __name__ == "__main__":
-    start_controller()
+    parser = argparse.ArgumentParser(prog="Eave Python trace agent")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    start_controller(num_workers=args.workers)
@@ -1,33 +1,119 @@
+import atexit
+from dataclasses import dataclass, field
 import functools
-from datetime import date, datetime
 import inspect
-import re
+from datetime import date, datetime
+import itertools
+import os
+import random
 import sys
-from types import CodeType
+import threading
+import time
+from types import CodeType, FrameType
 from typing import Any, Callable, Concatenate
-from uuid import uuid4
-from eave.stdlib.pytracing import client
-
-from eave.stdlib.pytracing.config import EaveConfig
+import weakref
+
+from eave.monitoring import client
+from eave.monitoring.datastructures import (
+    EventType,
+    FunctionCallCountEventPayload,
+    FunctionCallEventPayload,
+    FunctionDurationsEventPayload,
+)
+from eave.monitoring.metrics import LogLinearHistogram, LogLinearHistogramSnapshot
 
-from .datastructures import EventType, FunctionCallEventParams, RawEvent
+from .config import EaveConfig
+from .sampling import AdaptiveRate, TokenBucket
 
 DISABLE = sys.monitoring.DISABLE
 
-_builtins_set = set(sys.builtin_module_names)
-_stdlib_set = sys.stdlib_module_names
-_common_noisy_modules_to_ignore = set(
-    (
-        "pydantic",
-        "pkg_resources",
-    )
-)
-
-_ignore_modules_set = _builtins_set | _stdlib_set | _common_noisy_modules_to_ignore
-
 # FIXME: support list, tuple, and dict; may contain unpickleable objects.
 _primitive_types = (bool, str, int, float, date, datetime, type(None))
 
+# Arguments that are never captured.
+_receiver_argnames = frozenset(("self", "cls"))
+
+# Generators and coroutines are suspended and resumed without PY_RETURN, so their durations aren't measured.
+_suspendable_flags = inspect.CO_GENERATOR | inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR
+
+
+@dataclass(slots=True)
+class _Durations:
+    """Durations of the finished calls to one function, in nanoseconds. Only the reporter writes the `reported_` fields."""
+
+    wall_time: LogLinearHistogram = field(default_factory=LogLinearHistogram)
+    cpu_time: LogLinearHistogram = field(default_factory=LogLinearHistogram)
+    errors: itertools.count = field(default_factory=itertools.count)
+    """Advanced by the tracing threads, and read with `_read_errors`"""
+
+    reported_wall_time: LogLinearHistogramSnapshot = field(init=False)
+    reported_cpu_time: LogLinearHistogramSnapshot = field(init=False)
+    reported_errors: int = 0
+    reads: int = 0
+
+    def __post_init__(self) -> None:
+        self.reported_wall_time = self.wall_time.snapshot()
+        self.reported_cpu_time = self.cpu_time.snapshot()
+
+
+@dataclass(slots=True)
+class _TracedCode:
+    """Everything about a code object that the tracer needs on each call, worked out once."""
+
+    module: str
+    classname: str | None
+    name: str
+    argnames: tuple[str, ...]
+
+    bucket: TokenBucket | None
+    """Set when the config limits calls per second"""
+
+    durations: _Durations | None
+    """Set when durations are measured for this function"""
+
+    calls: itertools.count = field(default_factory=itertools.count)
+    """Every call, whether or not it was sampled. The tracing threads advance the counters with `next()`, which is atomic, unlike `+= 1`; only the reporter reads them (see `_read_counts`) and writes the `reported_` fields."""
+
+    sent: itertools.count = field(default_factory=itertools.count)
+    reported_calls: int = 0
+    reported_sent: int = 0
+    reads: int = 0
+
+
+# The decision for each code object that has been seen: a _TracedCode if it's traced, or None if it's ignored.
+# Weakly keyed so that code objects that are compiled at runtime and thrown away (eg by `exec`) aren't kept alive.
+_decisions: weakref.WeakKeyDictionary[CodeType, _TracedCode | None] = weakref.WeakKeyDictionary()
+_undecided = object()
+
+# Every traced code object's record, for reporting call counts. Appending and copying a list are atomic, so the reporter thread can safely read it.
+# Records outlive their code objects, but there's only one per traced function.
+_traced: list[_TracedCode] = []
+
+_adaptive = AdaptiveRate(min_factor=0.01)
+
+
+class _CallStack(threading.local):
+    """The start times of the timed calls in progress on the current thread, innermost last."""
+
+    entries: list[tuple[_Durations, int, int]]
+
+    def __init__(self) -> None:
+        self.entries = []
+
+
+_call_stack = _CallStack()
+
+_reporter: threading.Thread | None = None
+_reporter_stop = threading.Event()
+_reporter_interval_seconds: float = 10
+
+# Call IDs are a per-process token plus a counter, so they're unique without generating a UUID per call.
+_call_ids = itertools.count()
+_process_token = os.urandom(6).hex()
+
+# Timestamps are wall-clock time, but advanced with the monotonic performance counter so that they're cheap and never go backwards.
+_clock_origin_ns = time.time_ns() - time.perf_counter_ns()
+
 
 def eave_tracer[
     **P, R
@@ -49,95 +135,291 @@ def trace_call(config: EaveConfig, code: CodeType, instruction_offset: int, func
 
 
 def trace_py_start(config: EaveConfig, code: CodeType, instruction_offset: int) -> Any:
-    if not inspect or not sys or not re:
-        # uninitialized modules
-        return DISABLE
+    # https://docs.python.org/3/reference/datamodel.html#frame-objects
+    # _getframe(2) is the frame of the function being traced (0 is this function and 1 is the `eave_tracer` wrapper)
+    frame = sys._getframe(2)
 
-    module = inspect.getmodule(code)
-    if not module:
-        return DISABLE
+    traced = _decisions.get(code, _undecided)
+    if traced is _undecided:
+        traced = _decisions[code] = _decide(config=config, code=code, frame=frame)
 
-    if _should_ignore_module(name=module.__name__, scope=config.scope):
-        # print("ignored module", module.__name__)
+    if traced is None:
         return DISABLE
 
-    if _should_ignore_module(name=module.__package__, scope=config.scope):
-        # print("ignored package", module.__package__)
-        return DISABLE
+    assert isinstance(traced, _TracedCode)
 
-    # https://docs.python.org/3/reference/datamodel.html#frame-objects
-    # _getframe(2) gives us the caller of the function being traced
-    frame = sys._getframe(2)
-    if not frame:
+    # Counted and timed before sampling, so the reported counts and durations cover every call.
+    next(traced.calls)
+    now_ns = time.perf_counter_ns()
+    if traced.durations:
+        _call_stack.entries.append((traced.durations, now_ns, time.thread_time_ns()))
+
+    rate = config.sample_rate
+    if config.adaptive_sampling:
+        _adaptive.update(backpressure=client.get_client().backpressure, now_ns=now_ns)
+        rate *= _adaptive.factor
+
+    if rate < 1 and random.random() >= rate:
+        return None
+
+    if traced.bucket and not traced.bucket.take(now_ns):
+        return None
+
+    next(traced.sent)
+
+    data = FunctionCallEventPayload(
+        function_module=traced.module,
+        function_class=traced.classname,
+        function_name=traced.name,
+        function_args=_capture_args(traced=traced, frame=frame) if traced.argnames else None,
+        call_id=f"{_process_token}-{next(_call_ids)}",
+        timestamp=(_clock_origin_ns + now_ns) / 1e9,
+    )
+
+    # Serialized here, once; the agent forwards the bytes as-is.
+    client.send(event_type=EventType.functioncall, payload=data.to_json())
+
+
+def trace_py_return(config: EaveConfig, code: CodeType, instruction_offset: int, retval: object) -> Any:
+    traced = _decisions.get(code, _undecided)
+    if traced is _undecided:
+        # The call started before tracing did, so there's no start time, and PY_START hasn't decided about this code yet.
+        return None
+
+    if traced is None or traced.durations is None:
         return DISABLE
 
+    assert isinstance(traced, _TracedCode)
+    _finish_call(durations=traced.durations, error=False)
+
+
+def trace_py_unwind(config: EaveConfig, code: CodeType, instruction_offset: int, exception: BaseException) -> Any:
+    # PY_UNWIND can't be disabled, so this is called for every frame an exception propagates out of, traced or not.
+    traced = _decisions.get(code)
+    if traced and traced.durations:
+        _finish_call(durations=traced.durations, error=True)
+
+
+def trace_branch(code: CodeType, instruction_offset: int, destination_offset: int) -> Any:
+    return DISABLE
+
+
+def reset(config: EaveConfig) -> None:
+    """Forgets the cached decisions and sampling state, eg because the scope changed. Any unreported counts are sent first."""
+    global _adaptive
+    stop_reporting()
+    _decisions.clear()
+    _traced.clear()
+    _adaptive = AdaptiveRate(min_factor=config.adaptive_min_factor)
+
+
+def start_reporting(config: EaveConfig) -> None:
+    """Starts a background thread that sends the call counts and durations every `config.report_interval_seconds`."""
+    global _reporter_interval_seconds
+    _reporter_interval_seconds = config.report_interval_seconds
+    _start_reporter_thread()
+
+
+def stop_reporting() -> None:
+    """Stops the reporter thread and sends the counts and durations since the last report."""
+    global _reporter
+    if not _reporter:
+        return
+
+    _reporter_stop.set()
+    _reporter.join()
+    _reporter = None
+    report()
+
+
+def report() -> None:
+    timestamp = time.time()
+
+    for traced in _traced[:]:
+        _report_counts(traced=traced, timestamp=timestamp)
+        if traced.durations:
+            _report_durations(traced=traced, durations=traced.durations, timestamp=timestamp)
+
+    client.get_client().flush()
+
+
+def _read_counts(traced: _TracedCode) -> tuple[int, int]:
+    """The total calls and sent calls so far. Reading a counter advances it too, so the reporter's own reads are subtracted."""
+    calls = next(traced.calls) - traced.reads
+    sent = next(traced.sent) - traced.reads
+    traced.reads += 1
+    return calls, sent
+
+
+def _read_errors(durations: _Durations) -> int:
+    errors = next(durations.errors) - durations.reads
+    durations.reads += 1
+    return errors
+
+
+def _report_counts(traced: _TracedCode, timestamp: float) -> None:
+    calls, sent = _read_counts(traced)
+    if calls == traced.reported_calls:
+        return
+
+    data = FunctionCallCountEventPayload(
+        function_module=traced.module,
+        function_class=traced.classname,
+        function_name=traced.name,
+        call_count=calls - traced.reported_calls,
+        sent_count=sent - traced.reported_sent,
+        timestamp=timestamp,
+    )
+
+    traced.reported_calls = calls
+    traced.reported_sent = sent
+
+    # Not droppable: the counts are what's left when calls are sampled away.
+    client.send(event_type=EventType.functioncallcount, payload=data.to_json(), droppable=False)
+
+
+def _report_durations(traced: _TracedCode, durations: _Durations, timestamp: float) -> None:
+    wall_time = durations.wall_time.snapshot()
+    cpu_time = durations.cpu_time.snapshot()
+    errors = _read_errors(durations)
+
+    # The histograms are cumulative; only the change since the last report is sent.
+    wall_time_delta = wall_time - durations.reported_wall_time
+    if not wall_time_delta.counts:
+        return
+
+    data = FunctionDurationsEventPayload(
+        function_module=traced.module,
+        function_class=traced.classname,
+        function_name=traced.name,
+        call_count=wall_time_delta.count,
+        error_count=errors - durations.reported_errors,
+        wall_time=wall_time_delta.to_dict(),
+        cpu_time=(cpu_time - durations.reported_cpu_time).to_dict(),
+        timestamp=timestamp,
+    )
+
+    durations.reported_wall_time = wall_time
+    durations.reported_cpu_time = cpu_time
+    durations.reported_errors = errors
+
+    client.send(event_type=EventType.functiondurations, payload=data.to_json(), droppable=False)
+
+
+def _finish_call(durations: _Durations, error: bool) -> None:
+    cpu_end_ns = time.thread_time_ns()
+    wall_end_ns = time.perf_counter_ns()
+
+    entries = _call_stack.entries
+    # Normally the innermost entry is this call's. Anything above it is from a call whose end was missed, eg because tracing was restarted.
+    while entries:
+        (entry_durations, wall_start_ns, cpu_start_ns) = entries.pop()
+        if entry_durations is durations:
+            durations.wall_time.record(wall_end_ns - wall_start_ns)
+            durations.cpu_time.record(cpu_end_ns - cpu_start_ns)
+            if error:
+                next(durations.errors)
+            return
+
+
+def _start_reporter_thread() -> None:
+    global _reporter
+    _reporter_stop.clear()
+    _reporter = threading.Thread(target=_report_periodically, name="eave-reporter", daemon=True)
+    _reporter.start()
+
+
+def _report_periodically() -> None:
+    while not _reporter_stop.wait(_reporter_interval_seconds):
+        report()
+
+
+def _decide(config: EaveConfig, code: CodeType, frame: FrameType) -> _TracedCode | None:
     # https://docs.python.org/3/reference/datamodel.html#code-objects
     if code.co_name.startswith("_"):
         # Skip "private" methods and dunder methods
         # TODO: Is this okay?
-        # print("ignored private/dunder method", code.co_name)
-        return DISABLE
+        return None
 
-    # print(module.__name__, module.__package__, code.co_name, scope)
+    # The frame's globals are the module's namespace, which is much cheaper than `inspect.getmodule`, which may search every loaded module.
+    module_name = frame.f_globals.get("__name__")
+    if not isinstance(module_name, str) or not config.module_filter.should_trace(module_name):
+        return None
 
     # co_argcount includes co_posonlyargcount, but does _not_ include co_kwonlyargcount. It also doesn't include *args and **kwargs.
+    # The arguments are the first locals, so they can be picked out of co_varnames by index.
     namedargscount = code.co_argcount + code.co_kwonlyargcount
-    argnames = code.co_varnames[:namedargscount]
-    argvals = {
-        k: v for k, v in frame.f_locals.items() if k in argnames and k != "self" and isinstance(v, _primitive_types)
-    }
-
-    # nonprimitives = {k: v for k, v in frame.f_locals.items() if k in argnames and k != "self" and not isinstance(v, _primitive_types)}
-    # print(nonprimitives)
-    # if len(argvals) > 0:
-    #     print(argvals)
-
-    fclassname = code.__class__.__name__ if hasattr(code, "__class__") else None
-
-    team_id = uuid4()
-    corr_id = uuid4()
-    timestamp = datetime.utcnow()
+    argnames = tuple(
+        code.co_varnames[i] for i in range(namedargscount) if code.co_varnames[i] not in _receiver_argnames
+    )
 
-    data = RawEvent(
-        team_id=team_id,
-        corr_id=corr_id,
-        timestamp=timestamp,
-        event_type=EventType.functioncall,
-        event_params=FunctionCallEventParams(
-            function_module=module.__name__,
-            function_class=fclassname,
-            function_name=code.co_name,
-            function_args=argvals,
-        ),
+    # co_qualname is eg "Person.greet" for a method, or "outer.<locals>.inner" for a nested function.
+    (classname, _, _) = code.co_qualname.rpartition(".")
+    if not classname or classname.endswith(">"):
+        classname = None
+
+    bucket = None
+    if config.max_calls_per_second is not None:
+        bucket = TokenBucket.full(
+            rate=config.max_calls_per_second,
+            burst=config.max_calls_burst or max(1, config.max_calls_per_second),
+            now_ns=time.perf_counter_ns(),
+        )
+
+    durations = None
+    if config.measure_durations and not code.co_flags & _suspendable_flags:
+        durations = _Durations()
+
+    traced = _TracedCode(
+        module=module_name,
+        classname=classname,
+        name=code.co_name,
+        argnames=argnames,
+        bucket=bucket,
+        durations=durations,
     )
+    _traced.append(traced)
+    return traced
 
-    client.send(data)
-    # write_queue.put(data)
 
+def _capture_args(traced: _TracedCode, frame: FrameType) -> dict[str, Any]:
+    # Only the preselected arguments are read, and only primitive values are kept.
+    f_locals = frame.f_locals
+    argvals: dict[str, Any] = {}
+    for name in traced.argnames:
+        v = f_locals.get(name)
+        if isinstance(v, date):
+            argvals[name] = v.isoformat()
+        elif isinstance(v, _primitive_types):
+            argvals[name] = v
 
-def trace_py_return(code: CodeType, instruction_offset: int, retval: object) -> Any:
-    return DISABLE
+    return argvals
 
 
-def trace_branch(code: CodeType, instruction_offset: int, destination_offset: int) -> Any:
-    return DISABLE
+def _after_fork_in_child() -> None:
+    global _process_token, _call_ids, _reporter_stop
+    _process_token = os.urandom(6).hex()
+    _call_ids = itertools.count()
 
+    # The parent reports the calls it made before the fork.
+    for traced in _traced:
+        traced.reported_calls, traced.reported_sent = _read_counts(traced)
+        if traced.durations:
+            traced.durations.reported_wall_time = traced.durations.wall_time.snapshot()
+            traced.durations.reported_cpu_time = traced.durations.cpu_time.snapshot()
+            traced.durations.reported_errors = _read_errors(traced.durations)
 
-def _should_ignore_module(name: str | None, scope: str | None) -> bool:
-    if not name:
-        return False
+    # Threads don't survive a fork, and the event's internal lock may have been held by one.
+    _reporter_stop = threading.Event()
+    if _reporter:
+        _start_reporter_thread()
 
-    elif name in _ignore_modules_set:
-        return True
 
-    elif name.startswith("_"):
-        # ignore "private" modules, eg "_pytest"
-        # TODO: Is this okay?
-        return True
+def _report_at_exit() -> None:
+    # Registered after the agent client's exit handler, so it runs first and the client is still open.
+    if _reporter:
+        stop_reporting()
 
-    elif scope and not name.startswith(scope):
-        # A scope was provided; if the code's module isn't within the scope, bypass
-        return True
 
-    else:
-        return False
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_report_at_exit)
@@ -1,5 +1,123 @@
+from functools import cached_property
+import sys
+from typing import Iterable
+
+_builtins_set = set(sys.builtin_module_names)
+_stdlib_set = sys.stdlib_module_names
+_common_noisy_modules_to_ignore = set(
+    (
+        "pydantic",
+        "pkg_resources",
+    )
+)
+
+_ignore_modules_set = _builtins_set | _stdlib_set | _common_noisy_modules_to_ignore
+
+# Trie nodes map a module name component to the child node. The flags for a node are stored under the empty string, which can't be a component.
+_FLAGS = ""
+_IGNORED = 1
+_IN_SCOPE = 2
+
+
+class ModuleFilter:
+    """
+    Decides whether code in a module should be traced.
+
+    The ignored modules and the scope are compiled into a trie keyed by dotted name components, so a module is checked with one walk down its name.
+    A module is ignored if it or any of its parent packages is ignored, and when a scope is set, it must be the scope or inside it.
+    """
+
+    _root: dict[str, dict]
+    _scoped: bool
+
+    def __init__(self, scope: str | None, ignore: Iterable[str] = _ignore_modules_set) -> None:
+        self._root = {}
+        self._scoped = bool(scope)
+
+        for name in ignore:
+            self._mark(name, _IGNORED)
+
+        if scope:
+            self._mark(scope, _IN_SCOPE)
+
+    def should_trace(self, name: str | None) -> bool:
+        if not name or name.startswith("_"):
+            # ignore "private" modules, eg "_pytest", and "__main__"
+            # TODO: Is this okay?
+            return False
+
+        in_scope = not self._scoped
+        node = self._root
+        for part in name.split("."):
+            child = node.get(part)
+            if child is None:
+                break
+
+            flags = child.get(_FLAGS, 0)
+            if flags & _IGNORED:
+                return False
+            if flags & _IN_SCOPE:
+                in_scope = True
+
+            node = child
+
+        return in_scope
+
+    def _mark(self, name: str, flag: int) -> None:
+        node = self._root
+        for part in name.split("."):
+            node = node.setdefault(part, {})
+
+        node[_FLAGS] = node.get(_FLAGS, 0) | flag
+
+
 class EaveConfig:
     scope: str | None
 
-    def __init__(self, scope: str | None = None) -> None:
+    sample_rate: float
+    """The probability that a call to a traced function is sent. 1 sends every call."""
+
+    max_calls_per_second: float | None
+    """The most calls per second sent for any single function, averaged with a token bucket. None for no limit."""
+
+    max_calls_burst: float | None
+    """How many calls to a function can be sent at once before `max_calls_per_second` applies. Defaults to one second's worth."""
+
+    adaptive_sampling: bool
+    """Send fewer calls while the agent signals back-pressure, down to `adaptive_min_factor` of the configured rate."""
+
+    adaptive_min_factor: float
+
+    measure_durations: bool
+    """Measure the wall and CPU time of every call to a traced function, except generators and coroutines."""
+
+    report_interval_seconds: float
+    """How often the exact per-function call counts and duration histograms are sent. They include the calls that weren't sampled."""
+
+    def __init__(
+        self,
+        scope: str | None = None,
+        sample_rate: float = 1,
+        max_calls_per_second: float | None = None,
+        max_calls_burst: float | None = None,
+        adaptive_sampling: bool = True,
+        adaptive_min_factor: float = 0.01,
+        measure_durations: bool = True,
+        report_interval_seconds: float = 10,
+    ) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"sample_rate must be between 0 and 1: {sample_rate}")
+
         self.scope = scope
+        self.sample_rate = sample_rate
+        self.max_calls_per_second = max_calls_per_second
+        self.max_calls_burst = max_calls_burst
+        self.adaptive_sampling = adaptive_sampling
+        self.adaptive_min_factor = adaptive_min_factor
+        self.measure_durations = measure_durations
+        self.report_interval_seconds = report_interval_seconds
+
+    @cached_property
+    def module_filter(self) -> ModuleFilter:
+        # Built on first use, after `start_tracing` has resolved the default scope.
+        return ModuleFilter(scope=self.scope)
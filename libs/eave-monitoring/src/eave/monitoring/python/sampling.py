@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from typing import Self
+
+# How often the adaptive rate is adjusted, at most.
+_adaptive_adjust_interval_ns = 1_000_000_000
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    """
+    Allows `rate` events per second on average, with bursts of up to `burst` events.
+    Not thread-safe; two threads racing on the same bucket may let an extra event through, which is harmless for sampling.
+    """
+
+    rate: float
+    burst: float
+    tokens: float
+    updated_ns: int
+
+    @classmethod
+    def full(cls, rate: float, burst: float, now_ns: int) -> Self:
+        return cls(rate=rate, burst=burst, tokens=burst, updated_ns=now_ns)
+
+    def take(self, now_ns: int) -> bool:
+        elapsed_ns = now_ns - self.updated_ns
+        if elapsed_ns > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed_ns * self.rate / 1e9)
+            self.updated_ns = now_ns
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+
+        return False
+
+
+@dataclass(slots=True)
+class AdaptiveRate:
+    """
+    A sampling multiplier that halves while the agent signals back-pressure and doubles back towards 1 once it stops.
+    It changes at most once per second, so a short burst of back-pressure doesn't collapse it to the minimum.
+    """
+
+    min_factor: float
+    factor: float = 1
+    next_adjust_ns: int = 0
+
+    def update(self, backpressure: bool, now_ns: int) -> None:
+        if now_ns < self.next_adjust_ns:
+            return
+
+        if backpressure:
+            self.factor = max(self.min_factor, self.factor / 2)
+        elif self.factor < 1:
+            self.factor = min(1, self.factor * 2)
+        else:
+            return
+
+        self.next_adjust_ns = now_ns + _adaptive_adjust_interval_ns
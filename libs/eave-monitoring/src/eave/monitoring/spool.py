@@ -0,0 +1,192 @@
+import fcntl
+import os
+import struct
+from dataclasses import dataclass, field
+
+_SEGMENT_SUFFIX = ".seg"
+_LOCKFILE_NAME = ".lock"
+
+# Each record is a 4-byte big-endian length header followed by the UTF-8 encoded payload.
+_frame_header = struct.Struct(">I")
+
+
+@dataclass
+class SpoolSegment:
+    path: str
+    events: list[str] = field(default_factory=list)
+    nbytes: int = 0
+
+
+class SegmentSpool:
+    """
+    A write-ahead spool for events that haven't yet been acknowledged by the ingestion API.
+
+    Events are appended to segment files on disk before they're buffered for sending.
+    A segment is deleted only after every event in it was sent successfully (see `ack`), so events that were in-flight when the process died are replayed the next time a spool is opened on the same directory.
+    The in-memory view of the segments doubles as the send buffer, so the buffer and the disk can never disagree.
+
+    The spool is not safe to share between processes; an exclusive lock is taken on the directory when it's opened.
+    """
+
+    directory: str
+    segment_max_bytes: int
+    spool_max_bytes: int
+
+    _sealed: list[SpoolSegment]
+    _active: SpoolSegment | None
+    _active_fd: int | None
+    _lock_fd: int
+    _next_seq: int
+    _dirty: bool
+
+    def __init__(self, directory: str, segment_max_bytes: int, spool_max_bytes: int) -> None:
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.spool_max_bytes = spool_max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(directory, _LOCKFILE_NAME), os.O_CREAT | os.O_RDWR, 0o600)
+        # Raises BlockingIOError if another process already owns this spool.
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        self._sealed = []
+        self._active = None
+        self._active_fd = None
+        self._dirty = False
+        self._next_seq = 0
+
+        self._replay()
+
+    @property
+    def nbytes(self) -> int:
+        total = sum(s.nbytes for s in self._sealed)
+        if self._active:
+            total += self._active.nbytes
+        return total
+
+    @property
+    def nevents(self) -> int:
+        total = sum(len(s.events) for s in self._sealed)
+        if self._active:
+            total += len(self._active.events)
+        return total
+
+    def append(self, payload: str) -> None:
+        data = payload.encode("utf-8")
+        frame = _frame_header.pack(len(data)) + data
+
+        if self._active is None or self._active_fd is None:
+            self._open_segment()
+
+        assert self._active is not None and self._active_fd is not None
+
+        # The file is opened unbuffered, so once this returns the record survives a crash of this process.
+        # It only survives a crash of the host after `sync()`.
+        os.write(self._active_fd, frame)
+        self._active.events.append(payload)
+        self._active.nbytes += len(frame)
+        self._dirty = True
+
+        if self._active.nbytes >= self.segment_max_bytes:
+            self._seal_active()
+
+    def sync(self) -> None:
+        if self._dirty and self._active_fd is not None:
+            os.fsync(self._active_fd)
+        self._dirty = False
+
+    def seal(self) -> list[SpoolSegment]:
+        """
+        Closes the active segment and returns all segments that haven't been acknowledged yet, oldest first.
+        Events appended after this call go into a new segment, so they aren't acknowledged by an `ack` of the returned segments.
+        """
+        self._seal_active()
+        return self._sealed.copy()
+
+    def ack(self, segments: list[SpoolSegment]) -> None:
+        """
+        Deletes segments whose events were all delivered.
+        """
+        for segment in segments:
+            self._discard(segment)
+
+    def close(self) -> None:
+        self._seal_active()
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+
+    def _open_segment(self) -> None:
+        path = os.path.join(self.directory, f"{self._next_seq:020d}{_SEGMENT_SUFFIX}")
+        self._next_seq += 1
+        self._active_fd = os.open(path, os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o600)
+        self._active = SpoolSegment(path=path)
+
+    def _seal_active(self) -> None:
+        if self._active is None or self._active_fd is None:
+            return
+
+        self.sync()
+        os.close(self._active_fd)
+
+        if self._active.events:
+            self._sealed.append(self._active)
+        else:
+            os.unlink(self._active.path)
+
+        self._active = None
+        self._active_fd = None
+        self._enforce_limit()
+
+    def _enforce_limit(self) -> None:
+        # When the ingestion API has been unreachable for long enough to fill the spool, the oldest data is dropped.
+        # Dropping old data is preferable to growing without bound on the customer's host.
+        while self._sealed and self.nbytes > self.spool_max_bytes:
+            dropped = self._sealed[0]
+            print(f"Eave spool is full; dropping {len(dropped.events)} events from {dropped.path}", flush=True)
+            self._discard(dropped)
+
+    def _discard(self, segment: SpoolSegment) -> None:
+        try:
+            self._sealed.remove(segment)
+        except ValueError:
+            pass
+
+        try:
+            os.unlink(segment.path)
+        except FileNotFoundError:
+            pass
+
+    def _replay(self) -> None:
+        filenames = sorted(f for f in os.listdir(self.directory) if f.endswith(_SEGMENT_SUFFIX))
+
+        for filename in filenames:
+            path = os.path.join(self.directory, filename)
+            segment = SpoolSegment(path=path)
+
+            with open(path, "rb") as f:
+                data = f.read()
+
+            view = memoryview(data)
+            offset = 0
+            while offset + _frame_header.size <= len(view):
+                (length,) = _frame_header.unpack_from(view, offset)
+                end = offset + _frame_header.size + length
+                if end > len(view):
+                    # A torn write from a crash; the record was never acknowledged to anyone, so it's safe to drop.
+                    break
+
+                segment.events.append(bytes(view[offset + _frame_header.size : end]).decode("utf-8"))
+                offset = end
+
+            segment.nbytes = offset
+            self._next_seq = max(self._next_seq, int(filename.removesuffix(_SEGMENT_SUFFIX)) + 1)
+
+            if segment.events:
+                self._sealed.append(segment)
+            else:
+                os.unlink(path)
+
+        if self._sealed:
+            print(f"Eave spool: replaying {self.nevents} unsent events from {self.directory}", flush=True)
+
+        self._enforce_limit()
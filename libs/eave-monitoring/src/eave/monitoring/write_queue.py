@@ -1,52 +1,272 @@
 import asyncio
 import atexit
+import functools
 from dataclasses import dataclass
 import multiprocessing
+from multiprocessing.sharedctypes import Synchronized
+import os
 from queue import Empty
+import signal
 import time
+from types import FrameType
 
-from eave.monitoring.ingestion_api import send_data
+from eave.monitoring.config import EAVE_SPOOL_DIR
+from eave.monitoring.ingestion_api import IngestionClient, is_permanent_failure
+from eave.monitoring.metrics import Histogram, exponential_bounds
+from eave.monitoring.spool import SegmentSpool, SpoolSegment
 
 from .datastructures import EventType
 
+_endmsg = "EOF"
+_shutdown_poll_seconds = 1
+_spooled_poll_seconds = 0.05
+
 
 @dataclass
 class QueueParams:
     event_type: EventType
-    maxsize: int = 0  # We use this instead of the Queue `maxsize` parameter so that `put` never blocks or fails
-    maxage_seconds: int = 30
+    maxsize: int = 0  # Max events per batch. 0 means no limit; batches are then bounded by `target_batch_bytes`. We use this instead of the Queue `maxsize` parameter so that `put` never blocks or fails
+    maxage_seconds: float = 30  # Max time an event waits in the buffer before it's sent
+    target_batch_bytes: int = 1024 * 1024  # Serialized size at which a batch is sent without waiting for `maxage_seconds`
+    spool_dir: str | None = None  # Defaults to a directory per event type under EAVE_SPOOL_DIR
+    segment_max_bytes: int = 256 * 1024
+    spool_max_bytes: int = 64 * 1024 * 1024
+    fsync_interval_seconds: float = 1
+    max_in_flight: int = 4  # Max concurrent requests to the ingestion API
+    shutdown_timeout_seconds: float = 30
+
+    @property
+    def spool_path(self) -> str:
+        return self.spool_dir or os.path.join(EAVE_SPOOL_DIR, self.event_type)
+
+
+class QueueStats:
+    batch_events: Histogram
+    """Number of events per request to the ingestion API"""
+
+    batch_bytes: Histogram
+    """Serialized size of each request to the ingestion API, before compression"""
+
+    batch_latency_seconds: Histogram
+    """Time from the oldest event in a batch being received to the batch being delivered"""
+
+    def __init__(self) -> None:
+        self.batch_events = Histogram(exponential_bounds(1, 2, 16))
+        self.batch_bytes = Histogram(exponential_bounds(1024, 2, 14))
+        self.batch_latency_seconds = Histogram(exponential_bounds(0.01, 2, 14))
+
+
+def _make_batches(segments: list[SpoolSegment], params: QueueParams) -> list[list[SpoolSegment]]:
+    """
+    Groups segments into batches of roughly `target_batch_bytes`, so that a backlog (eg replayed after an outage) is sent as several reasonably-sized requests rather than one huge one.
+    Segments are never split, because a segment can only be acknowledged as a whole.
+    """
+    batches: list[list[SpoolSegment]] = []
+    current: list[SpoolSegment] = []
+    nbytes = 0
+    nevents = 0
+
+    for segment in segments:
+        if current and (
+            nbytes + segment.nbytes > params.target_batch_bytes
+            or (params.maxsize > 0 and nevents + len(segment.events) > params.maxsize)
+        ):
+            batches.append(current)
+            current = []
+            nbytes = 0
+            nevents = 0
+
+        current.append(segment)
+        nbytes += segment.nbytes
+        nevents += len(segment.events)
+
+    if current:
+        batches.append(current)
+
+    return batches
 
 
-# TODO: sigterm handler
-async def _process_queue(q: multiprocessing.Queue, params: QueueParams) -> None:
-    buffer: list[str] = []
-    lastflush = time.time()
+class _QueueProcessor:
+    params: QueueParams
+    stats: QueueStats
+    spool: SegmentSpool
+    client: IngestionClient
+
+    _in_flight_segments: set[str]
+    _in_flight_events: int
+    _in_flight_bytes: int
+    _tasks: set[asyncio.Task[None]]
+
+    def __init__(self, params: QueueParams, stats: QueueStats) -> None:
+        self.params = params
+        self.stats = stats
+        self.spool = SegmentSpool(
+            directory=params.spool_path,
+            segment_max_bytes=min(params.segment_max_bytes, params.target_batch_bytes),
+            spool_max_bytes=params.spool_max_bytes,
+        )
+        self.client = IngestionClient(max_in_flight=params.max_in_flight)
+        self._in_flight_segments = set()
+        self._in_flight_events = 0
+        self._in_flight_bytes = 0
+        self._tasks = set()
+
+    def flush(self, batch_started: float) -> None:
+        """
+        Starts uploading every sealed segment that isn't already being uploaded.
+        Uploads run in the background, so the processor keeps receiving events while they're in flight; the client bounds how many run at once.
+        """
+        segments = [s for s in self.spool.seal() if s.path not in self._in_flight_segments]
+
+        for batch in _make_batches(segments, self.params):
+            self._in_flight_segments.update(s.path for s in batch)
+            self._in_flight_events += sum(len(s.events) for s in batch)
+            self._in_flight_bytes += sum(s.nbytes for s in batch)
+            task = asyncio.create_task(self._upload(batch=batch, batch_started=batch_started))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @property
+    def unsent_events(self) -> int:
+        """
+        Events that aren't part of an in-flight upload, either because they're new or because a previous upload failed.
+        """
+        return self.spool.nevents - self._in_flight_events
+
+    @property
+    def unsent_bytes(self) -> int:
+        return self.spool.nbytes - self._in_flight_bytes
+
+    async def drain(self) -> None:
+        """
+        Waits for all in-flight uploads to finish.
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.client.close()
+        self.spool.close()
+
+    async def _upload(self, batch: list[SpoolSegment], batch_started: float) -> None:
+        events = [e for s in batch for e in s.events]
+        print("Flushing...", len(events), flush=True)
 
-    while True:
         try:
-            payload = q.get(block=True, timeout=params.maxage_seconds)
-            if payload:
-                buffer.append(payload)
-        except Empty:
-            pass
+            await self.client.send(event_type=self.params.event_type, events=events)
+        except Exception as e:
+            if is_permanent_failure(e):
+                # Eg a 400 or 413. Re-sending the batch would fail forever and hold its disk space and in-flight slot, so it's dropped.
+                print(f"Dropping {len(events)} {self.params.event_type} events rejected by the ingestion API: {e}", flush=True)
+                self.spool.ack(batch)
+            else:
+                # The segments stay in the spool and are picked up again by a later flush.
+                print(e)
+        else:
+            self.spool.ack(batch)
+            self.stats.batch_events.observe(len(events))
+            self.stats.batch_bytes.observe(sum(s.nbytes for s in batch))
+            self.stats.batch_latency_seconds.observe(time.monotonic() - batch_started)
+        finally:
+            self._in_flight_segments.difference_update(s.path for s in batch)
+            self._in_flight_events -= len(events)
+            self._in_flight_bytes -= sum(s.nbytes for s in batch)
 
-        buflen = len(buffer)
-        if buflen == 0:
-            continue
 
-        now = time.time()
+async def _process_queue(
+    q: multiprocessing.Queue, params: QueueParams, stats: QueueStats, spooled: Synchronized
+) -> None:
+    running = True
 
-        if buflen >= params.maxsize or now - lastflush >= params.maxage_seconds:
-            print("Flushing...", flush=True)
-            buffer_copy = buffer.copy()
+    # Number of items taken off the queue so far. Once they're synced to disk, this is published in `spooled`.
+    received = 0
+
+    def _sighandler(signum: int, frame: FrameType | None) -> None:
+        nonlocal running
+        running = False
+
+    # Ctrl-C is delivered to the whole process group; the parent decides when this process stops.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _sighandler)
+
+    loop = asyncio.get_running_loop()
+    processor = _QueueProcessor(params=params, stats=stats)
+    spool = processor.spool
+
+    # When the oldest unsent event was received. Replayed events are treated as received now.
+    batch_started: float | None = time.monotonic() if spool.nevents > 0 else None
+    lastsync = time.monotonic()
+
+    try:
+        while running:
+            now = time.monotonic()
+
+            if batch_started is None and processor.unsent_events > 0:
+                # A previous upload failed; retry it after a full interval.
+                batch_started = now
+
+            # Wake up exactly when the current batch is due, but at least once per second so that a shutdown request is noticed promptly.
+            timeout = _shutdown_poll_seconds
+            if batch_started is not None:
+                timeout = max(0, min(timeout, batch_started + params.maxage_seconds - now))
 
             try:
-                await send_data(event_type=params.event_type, events=buffer_copy)
-            except Exception as e:
-                print(e)
-            else:
-                buffer.clear()
-                lastflush = now
+                # The blocking read runs off the event loop so that in-flight uploads keep making progress.
+                payload = await loop.run_in_executor(None, functools.partial(q.get, block=True, timeout=timeout))
+                received += 1
+                if payload == _endmsg:
+                    running = False
+                elif payload:
+                    _append(spool, payload)
+                    if batch_started is None:
+                        batch_started = time.monotonic()
+            except Empty:
+                pass
+
+            now = time.monotonic()
+
+            if now - lastsync >= params.fsync_interval_seconds:
+                spool.sync()
+                spooled.value = received
+                lastsync = now
+
+            if batch_started is None:
+                continue
+
+            if (
+                processor.unsent_bytes >= params.target_batch_bytes
+                or (params.maxsize > 0 and processor.unsent_events >= params.maxsize)
+                or now - batch_started >= params.maxage_seconds
+            ):
+                processor.flush(batch_started=batch_started)
+                batch_started = None
+
+        # Pick up anything that was put on the queue before the shutdown request.
+        while True:
+            try:
+                payload = q.get(block=False)
+                received += 1
+                if payload and payload != _endmsg:
+                    _append(spool, payload)
+            except Empty:
+                break
+
+        spool.sync()
+        spooled.value = received
+
+        # Anything that fails to send here stays in the spool and is replayed on the next start.
+        processor.flush(batch_started=batch_started or time.monotonic())
+        await processor.drain()
+    finally:
+        await processor.close()
+
+
+def _append(spool: SegmentSpool, payload: str | list[str]) -> None:
+    if isinstance(payload, list):
+        for p in payload:
+            spool.append(p)
+    else:
+        spool.append(payload)
 
 
 def _queue_processor_event_loop(*args, **kwargs) -> None:
@@ -56,33 +276,84 @@ def _queue_processor_event_loop(*args, **kwargs) -> None:
 class BatchWriteQueue:
     _queue: multiprocessing.Queue
     _process: multiprocessing.Process
+    _params: QueueParams
+    _stats: QueueStats
+    _put_count: int
+    _spooled: Synchronized
 
     def __init__(self, queue_params: QueueParams) -> None:
+        self._params = queue_params
+        self._stats = QueueStats()
         self._queue = multiprocessing.Queue()
+        self._put_count = 0
+        self._spooled = multiprocessing.Value("Q", 0)
         self._process = multiprocessing.Process(
             target=_queue_processor_event_loop,
             kwargs={
                 "q": self._queue,
                 "params": queue_params,
+                "stats": self._stats,
+                "spooled": self._spooled,
             },
         )
 
+    @property
+    def stats(self) -> QueueStats:
+        """
+        Batching histograms, recorded by the processor. Call `snapshot()` on each to read the current values.
+        """
+        return self._stats
+
     def start_autoflush(self) -> None:
         atexit.register(self.stop_autoflush)
         self._process.start()
 
     def stop_autoflush(self) -> None:
-        # FIXME: Why do we need this? Without it, `q.get()` in the processor has the mutex and `process.terminate()` never resolves. But there must be a better way.
-        self._queue.cancel_join_thread()
-        self._process.terminate()
+        """
+        Synchronously flushes the buffered events and stops the processor.
+        This is safe to call from a signal handler, and safe to call more than once.
+        """
+        if not self._process.is_alive():
+            return
 
-        try:
-            buffer = []
-            while not self._queue.empty():
-                buffer.append(self._queue.get(block=False))
-            print("FIXME: on close, buffer should be flushed and sent to the server", buffer)
-        except Exception as e:
-            print(e)
+        self._queue.put(_endmsg)
+        self._process.join(timeout=self._params.shutdown_timeout_seconds)
 
-    def put(self, payload: str) -> None:
+        if self._process.is_alive():
+            # The final flush didn't finish in time (eg the ingestion API is unreachable).
+            # Everything the processor received is in the spool and will be replayed on the next start.
+            print("Timed out waiting for the write queue to flush", flush=True)
+            self._queue.cancel_join_thread()
+            self._process.kill()
+            self._process.join()
+
+    def put(self, payload: str) -> int:
+        """
+        Returns a receipt for `wait_spooled`.
+        """
         self._queue.put(payload, block=False)
+        self._put_count += 1
+        return self._put_count
+
+    def put_many(self, payloads: list[str]) -> int:
+        """
+        Puts several events on the queue as a single item, which is much cheaper than putting them one at a time.
+        Returns a receipt for `wait_spooled`.
+        """
+        if payloads:
+            self._queue.put(payloads, block=False)
+            self._put_count += 1
+        return self._put_count
+
+    async def wait_spooled(self, receipt: int, timeout: float) -> bool:
+        """
+        Waits until the events put with `receipt` (and everything put before them) are synced to the spool on disk, from where they're eventually delivered even if this process or the processor dies.
+        Returns False if that didn't happen within `timeout` seconds, eg because the processor isn't running.
+        Receipts are only ordered correctly when all puts come from one thread.
+        """
+        deadline = time.monotonic() + timeout
+        while self._spooled.value < receipt:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(_spooled_poll_seconds)
+        return True
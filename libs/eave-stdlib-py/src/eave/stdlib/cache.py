@@ -1,7 +1,10 @@
 import abc
+import asyncio
+from collections import OrderedDict
 import time
-from typing import Optional, Protocol
+from typing import Any, Callable, Optional, Protocol
 import redis.asyncio as redis
+from redis.asyncio.client import PubSub
 from redis.asyncio.retry import Retry
 from redis.backoff import ConstantBackoff
 from .config import SHARED_CONFIG
@@ -44,39 +47,81 @@ class _CacheEntry:
     def expired(self) -> bool:
         return self.ex is not None and (self.ts + self.ex < time.time())
 
+    @property
+    def size(self) -> int:
+        # Approximate, but close enough for bounding the memory used by the cache.
+        return len(self.value)
+
+
+_EPHEMERAL_MAX_ENTRIES = 10_000
+_EPHEMERAL_MAX_BYTES = 64 * 1024 * 1024
+
 
 class EphemeralCache(CacheInterface):
-    _store: dict[str, _CacheEntry] = {}
+    """
+    An in-process cache, bounded by the number of entries and by the total size of their values.
+    When it's full, the least recently used entries are evicted first.
+    It's used on its own when Redis isn't configured (eg in development), and in front of Redis by `TieredCache`.
+    """
+
+    max_entries: int
+    max_bytes: int
+    max_entry_bytes: Optional[int]
+    _store: OrderedDict[str, _CacheEntry]
+    _size: int
+
+    def __init__(
+        self,
+        max_entries: int = _EPHEMERAL_MAX_ENTRIES,
+        max_bytes: int = _EPHEMERAL_MAX_BYTES,
+        max_entry_bytes: Optional[int] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._store = OrderedDict()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._store)
 
     async def get(self, name: str) -> str | None:
         e = self._store.get(name)
         if e is None:
             return None
         elif e.expired:
-            await self.delete(name)
+            self.discard(name)
             return None
         else:
+            self._store.move_to_end(name)
             return e.value
 
     async def set(self, name: str, value: str, ex: Optional[int] = None) -> bool | None:
-        # quick way to put a hard limit on the size of this cache.
-        # This class is only for development so there's no need for anything more complex than this.
-        if len(self._store.keys()) > 100:
-            self._store.clear()
+        self.discard(name)
+
+        e = _CacheEntry(value=value, ex=ex)
+        if self.max_entry_bytes is not None and e.size > self.max_entry_bytes:
+            return False
+
+        self._store[name] = e
+        self._size += e.size
+
+        while len(self._store) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._store.popitem(last=False)
+            self._size -= evicted.size
 
-        self._store[name] = _CacheEntry(value=value, ex=ex)
         return True
 
     async def delete(self, *names: str) -> int:
-        num = 0
-        for k in names:
-            try:
-                self._store.pop(k)
-                num += 1
-            except KeyError:
-                pass
+        return sum(self.discard(k) for k in names)
 
-        return num
+    def clear(self) -> None:
+        self._store.clear()
+        self._size = 0
 
     async def close(self, close_connection_pool: Optional[bool] = None) -> None:
         return None
@@ -84,6 +129,235 @@ class EphemeralCache(CacheInterface):
     async def ping(self) -> bool:
         return True
 
+    def discard(self, name: str) -> bool:
+        e = self._store.pop(name, None)
+        if e is None:
+            return False
+
+        self._size -= e.size
+        return True
+
+
+_INVALIDATION_CHANNEL = "__redis__:invalidate"
+
+# Redis is the source of truth, so entries are only kept in the L1 cache for a short time in case an invalidation is missed.
+_L1_MAX_TTL_SECONDS = 60 * 5
+_L1_MAX_ENTRIES = 5_000
+_L1_MAX_BYTES = 32 * 1024 * 1024
+_L1_MAX_ENTRY_BYTES = 64 * 1024
+
+# Only keys with these prefixes are cached in process, and Redis only sends invalidations for them.
+# Other keys (eg event bodies stashed by `task_queue`) are usually read once, so they aren't worth keeping in memory, or being told about.
+_L1_KEY_PREFIXES = ("slack:",)
+
+_LISTENER_RETRY_SECONDS = 10
+
+
+class _InvalidationSubscriber(PubSub):
+    """
+    A subscriber to the invalidation messages for every key written in Redis with one of the given prefixes.
+    Client tracking is enabled on the subscriber's own connection, in broadcast mode, each time it connects.
+    RESP2 is required, so that the invalidations are sent as Pub/Sub messages and not as RESP3 push messages.
+
+    Invalidations are only received once the channel is subscribed to, so the subscribe confirmations aren't ignored: the reader of `listen()` trusts its cache only after one arrives.
+    """
+
+    _prefixes: tuple[str, ...]
+    _on_tracking_lost: Callable[[], None]
+
+    def __init__(
+        self,
+        connection_pool: redis.ConnectionPool,
+        prefixes: tuple[str, ...],
+        on_tracking_lost: Callable[[], None],
+    ) -> None:
+        super().__init__(connection_pool=connection_pool)
+        self._prefixes = prefixes
+        self._on_tracking_lost = on_tracking_lost
+
+    async def start(self) -> None:
+        await self.connect()
+        assert self.connection is not None, "typecheck only"
+
+        # The connection was already connected by the pool, so `on_connect` isn't called this time.
+        await self._enable_tracking(self.connection)
+        await self.subscribe(_INVALIDATION_CHANNEL)
+
+    async def on_connect(self, connection: redis.Connection) -> None:
+        # Called when the connection reconnects, before the channels are subscribed to again.
+        # Any invalidations sent while the connection was down were missed, and more are missed until the new subscription is confirmed.
+        self._on_tracking_lost()
+        await self._enable_tracking(connection)
+        await super().on_connect(connection)
+
+    async def _enable_tracking(self, connection: redis.Connection) -> None:
+        await connection.send_command("CLIENT", "ID")
+        client_id = await connection.read_response()
+        prefix_args = [arg for prefix in self._prefixes for arg in ("PREFIX", prefix)]
+        await connection.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", *prefix_args)
+        await connection.read_response()
+
+
+class TieredCache(CacheInterface):
+    """
+    Redis, with an in-process `EphemeralCache` in front of it, so that hot keys (eg `slack:{team_id}:installation`) are read without a network hop.
+
+    Only keys with one of `l1_prefixes` are cached in process; the others are always read from Redis.
+
+    The in-process cache is kept coherent with Redis by client-side caching: https://redis.io/docs/manual/client-side-caching/
+    A dedicated connection receives an invalidation message for every key with one of the prefixes that's written in Redis, by any client, and the key is dropped from the in-process cache.
+    Until that connection is established, and whenever it's lost, every read goes to Redis.
+    """
+
+    _redis: redis.Redis
+    _invalidations_client: redis.Redis
+    _l1: EphemeralCache
+    _l1_prefixes: tuple[str, ...]
+    _listener: Optional[asyncio.Task[None]] = None
+    _tracking: bool = False
+
+    # Reads from Redis that are in flight. An invalidation for the key removes it, so that the value that was read isn't cached.
+    _pending: dict[str, object]
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        invalidations_client: redis.Redis,
+        l1: Optional[EphemeralCache] = None,
+        l1_prefixes: tuple[str, ...] = _L1_KEY_PREFIXES,
+    ) -> None:
+        """
+        invalidations_client: A client for the same Redis database, used only by the invalidation listener. It must use RESP2 (see `_InvalidationSubscriber`).
+        """
+        self._redis = redis_client
+        self._invalidations_client = invalidations_client
+        # An empty EphemeralCache is falsy, so this can't be `l1 or ...`.
+        self._l1 = (
+            l1
+            if l1 is not None
+            else EphemeralCache(max_entries=_L1_MAX_ENTRIES, max_bytes=_L1_MAX_BYTES, max_entry_bytes=_L1_MAX_ENTRY_BYTES)
+        )
+        self._l1_prefixes = l1_prefixes
+        self._pending = {}
+
+    @property
+    def tracking(self) -> bool:
+        return self._tracking
+
+    async def get(self, name: str) -> str | None:
+        if not name.startswith(self._l1_prefixes):
+            return await self._redis.get(name)
+
+        self._start_listener()
+
+        if self._tracking and (value := await self._l1.get(name)) is not None:
+            return value
+
+        token = object()
+        if self._tracking:
+            self._pending[name] = token
+
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.get(name)
+                pipe.pttl(name)
+                value, pttl = await pipe.execute()
+
+            if value is not None and self._tracking and self._pending.get(name) is token:
+                # pttl is negative if the key doesn't expire.
+                ex = _L1_MAX_TTL_SECONDS if pttl < 0 else min(_L1_MAX_TTL_SECONDS, pttl // 1000)
+                if ex > 0:
+                    await self._l1.set(name, value, ex=ex)
+
+            return value
+        finally:
+            if self._pending.get(name) is token:
+                del self._pending[name]
+
+    async def set(self, name: str, value: str, ex: Optional[int] = None) -> bool | None:
+        result = await self._redis.set(name, value, ex=ex)
+        self._invalidate(name)
+        return result
+
+    async def delete(self, *names: str) -> int:
+        result = await self._redis.delete(*names)
+        self._invalidate(*names)
+        return result
+
+    async def close(self, close_connection_pool: Optional[bool] = None) -> None:
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+        self._stop_tracking()
+        await self._invalidations_client.close(close_connection_pool=True)
+        await self._redis.close(close_connection_pool=close_connection_pool)
+
+    async def ping(self) -> bool:
+        return await self._redis.ping()
+
+    def _invalidate(self, *names: str) -> None:
+        for name in names:
+            self._pending.pop(name, None)
+            self._l1.discard(name)
+
+    def _invalidate_all(self) -> None:
+        self._pending.clear()
+        self._l1.clear()
+
+    def _stop_tracking(self) -> None:
+        self._tracking = False
+        self._invalidate_all()
+
+    def _on_tracking_enabled(self) -> None:
+        self._invalidate_all()
+        self._tracking = True
+
+    def _start_listener(self) -> None:
+        if self._listener is None or self._listener.get_loop() is not asyncio.get_running_loop():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            subscriber = _InvalidationSubscriber(
+                connection_pool=self._invalidations_client.connection_pool,
+                prefixes=self._l1_prefixes,
+                on_tracking_lost=self._stop_tracking,
+            )
+
+            try:
+                await subscriber.start()
+
+                async for message in subscriber.listen():
+                    if message["type"] == "subscribe" and message["channel"] == _INVALIDATION_CHANNEL:
+                        # Sent once the subscription is in place, including after a reconnect.
+                        self._on_tracking_enabled()
+                        continue
+
+                    if message["type"] != "message":
+                        continue
+
+                    # The data is None when the whole database was flushed.
+                    if (keys := message["data"]) is None:
+                        self._invalidate_all()
+                    else:
+                        self._invalidate(*keys)
+
+            except redis.ResponseError as e:
+                # eg Redis is older than 6.0, or the CLIENT command isn't allowed. Every read will go to Redis.
+                eaveLogger.warning(f"Redis client tracking is unavailable: {e}")
+                return
+            except Exception as e:
+                eaveLogger.warning(f"Redis invalidation listener disconnected: {e}")
+            finally:
+                self._stop_tracking()
+                await subscriber.aclose()
+
+                # Client tracking stays enabled on the connection until it's closed.
+                await self._invalidations_client.connection_pool.disconnect()
+
+            await asyncio.sleep(_LISTENER_RETRY_SECONDS)
+
 
 _PROCESS_CACHE_CLIENT: Optional[CacheInterface] = None
 
@@ -101,17 +375,22 @@ def client() -> CacheInterface | None:
             eaveLogger.debug(f"Redis connection: host={host}, port={port}, db={db}, auth={logauth}...")
 
             try:
-                _PROCESS_CACHE_CLIENT = redis.Redis(
-                    host=host,
-                    port=port,
-                    db=db,
-                    password=auth,
-                    decode_responses=True,
-                    ssl=redis_tls_ca is not None,
-                    ssl_ca_data=redis_tls_ca,
-                    health_check_interval=60 * 5,
-                    socket_keepalive=True,
-                    retry=Retry(retries=2, backoff=ConstantBackoff(backoff=3)),
+                connection_kwargs: dict[str, Any] = {
+                    "host": host,
+                    "port": port,
+                    "db": db,
+                    "password": auth,
+                    "decode_responses": True,
+                    "ssl": redis_tls_ca is not None,
+                    "ssl_ca_data": redis_tls_ca,
+                    "health_check_interval": 60 * 5,
+                    "socket_keepalive": True,
+                    "retry": Retry(retries=2, backoff=ConstantBackoff(backoff=3)),
+                }
+
+                _PROCESS_CACHE_CLIENT = TieredCache(
+                    redis_client=redis.Redis(**connection_kwargs),
+                    invalidations_client=redis.Redis(**connection_kwargs, protocol=2, max_connections=1),
                 )
             except Exception as e:
                 eaveLogger.exception(e)
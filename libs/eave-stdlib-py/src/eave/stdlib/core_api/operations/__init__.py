@@ -16,6 +16,12 @@ class EndpointConfiguration:
     signature_required: bool
     origin_required: bool
 
+    # The endpoint only reads, so its responses can be shared by identical requests (see `eave.stdlib.response_cache`).
+    idempotent: bool
+
+    # Idempotent endpoints whose cached responses are forgotten when a request to this endpoint succeeds.
+    invalidates: list["EndpointConfiguration"]
+
     def __init__(
         self,
         path: str,
@@ -24,6 +30,8 @@ class EndpointConfiguration:
         team_id_required: bool = True,
         signature_required: bool = True,
         origin_required: bool = True,
+        idempotent: bool = False,
+        invalidates: Optional[list["EndpointConfiguration"]] = None,
     ) -> None:
         self.path = path
         self.method = method
@@ -31,6 +39,8 @@ class EndpointConfiguration:
         self.team_id_required = team_id_required
         self.signature_required = signature_required
         self.origin_required = origin_required
+        self.idempotent = idempotent
+        self.invalidates = invalidates or []
 
     @property
     def url(self) -> str:
@@ -4,6 +4,7 @@ import uuid
 from eave.stdlib.core_api.models.documents import DocumentSearchResult
 from eave.stdlib.core_api.models.documents import DocumentInput
 from . import BaseRequestBody, BaseResponseBody, CoreApiEndpoint, CoreApiEndpointConfiguration
+from .subscriptions import GetSubscriptionRequest
 
 from ..models.subscriptions import DocumentReference, DocumentReferenceInput, Subscription
 from ..models.subscriptions import SubscriptionInput
@@ -16,6 +17,7 @@ class UpsertDocument(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/documents/upsert",
         auth_required=False,
+        invalidates=[GetSubscriptionRequest.config],
     )
 
     class RequestBody(BaseRequestBody):
@@ -77,6 +79,7 @@ class DeleteDocument(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/documents/delete",
         auth_required=False,
+        invalidates=[GetSubscriptionRequest.config],
     )
 
     class RequestBody(BaseRequestBody):
@@ -4,6 +4,7 @@ from eave.stdlib.core_api.models.github import GithubInstallation
 from eave.stdlib.core_api.models.github import GithubInstallationInput
 from . import BaseRequestBody, BaseResponseBody, CoreApiEndpoint, CoreApiEndpointConfiguration
 
+from .team import GetTeamRequest
 from ..models import team
 from ... import requests
 
@@ -13,6 +14,7 @@ class GetGithubInstallation(CoreApiEndpoint):
         path="/integrations/github/query",
         auth_required=False,
         team_id_required=False,
+        idempotent=True,
     )
 
     class RequestBody(BaseRequestBody):
@@ -42,6 +44,7 @@ class DeleteGithubInstallation(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/integrations/github/delete",
         auth_required=False,
+        invalidates=[GetGithubInstallation.config, GetTeamRequest.config],
     )
 
     class RequestBody(BaseRequestBody):
@@ -12,6 +12,7 @@ class GetSlackInstallation(CoreApiEndpoint):
         path="/integrations/slack/query",
         auth_required=False,
         team_id_required=False,
+        idempotent=True,
     )
 
     class RequestBody(BaseRequestBody):
@@ -1,4 +1,4 @@
-import aiohttp
+from eave.stdlib import http_client
 
 from . import BaseResponseBody, CoreApiEndpoint, CoreApiEndpointConfiguration
 
@@ -20,13 +20,11 @@ class Status(CoreApiEndpoint):
 
     @classmethod
     async def perform(cls) -> ResponseBody:
-        async with aiohttp.ClientSession() as session:
-            response = await session.request(
-                cls.config.method,
-                cls.config.url,
-            )
-
-            # This must remain inside of the ClientSession context, so that the body stream is still open when it is read.
+        async with http_client.session() as session, session.request(
+            cls.config.method,
+            cls.config.url,
+        ) as response:
+            # This must remain inside of the response context, so that the body stream is still open when it is read.
             body = await cls.make_response(response, cls.ResponseBody)
 
         return body
@@ -14,6 +14,7 @@ class GetSubscriptionRequest(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/subscriptions/query",
         auth_required=False,
+        idempotent=True,
     )
 
     class RequestBody(BaseRequestBody):
@@ -46,6 +47,7 @@ class CreateSubscriptionRequest(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/subscriptions/create",
         auth_required=False,
+        invalidates=[GetSubscriptionRequest.config],
     )
 
     class RequestBody(BaseRequestBody):
@@ -79,6 +81,7 @@ class DeleteSubscriptionRequest(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/subscriptions/delete",
         auth_required=False,
+        invalidates=[GetSubscriptionRequest.config],
     )
 
     class RequestBody(BaseRequestBody):
@@ -10,6 +10,7 @@ class GetTeamRequest(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/team/query",
         auth_required=False,
+        idempotent=True,
     )
 
     class ResponseBody(BaseResponseBody):
@@ -40,6 +41,7 @@ class GetTeamRequest(CoreApiEndpoint):
 class UpsertConfluenceDestinationAuthedRequest(CoreApiEndpoint):
     config = CoreApiEndpointConfiguration(
         path="/me/team/destinations/confluence/upsert",
+        invalidates=[GetTeamRequest.config],
     )
 
     class RequestBody(BaseRequestBody):
@@ -77,6 +77,18 @@ class InternalServerError(HTTPException):
         )
 
 
+class ServiceUnavailableError(HTTPException):
+    def __init__(
+        self,
+        detail: typing.Optional[str] = None,
+        headers: typing.Optional[dict[str, str]] = None,
+        request_id: typing.Optional[str] = None,
+    ) -> None:
+        super().__init__(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail=detail, headers=headers, request_id=request_id
+        )
+
+
 """
 Convenience classes
 """
@@ -0,0 +1,185 @@
+"""
+Shared aiohttp sessions for requests between Eave services (see `requests.make_request`).
+
+A long-lived event loop (eg a Starlette app's) gets one session, so that requests made on it share a keep-alive connection pool and DNS cache instead of opening a new connection each.
+Starlette apps should call `start` on startup and `close` on shutdown.
+A session can't be used from a different event loop than the one it was created on, so loops that weren't started (eg the one Flask runs each async view on) get a short-lived session per request, which is closed when the request is done.
+"""
+
+import asyncio
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from typing import AsyncIterator
+
+import aiohttp
+
+# Total connections per session, and connections to any one host (eg the Core API).
+_CONNECTION_LIMIT = 100
+_CONNECTION_LIMIT_PER_HOST = 32
+
+_KEEPALIVE_TIMEOUT_SECONDS = 60
+_DNS_CACHE_TTL_SECONDS = 300
+
+
+@dataclass
+class HostMetrics:
+    requests: int = 0
+    in_flight: int = 0
+    errors: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+
+class ClientRegistry:
+    """
+    One aiohttp session per started event loop, and metrics on the connection pools of all sessions, per host.
+    """
+
+    _sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession]
+    _metrics: dict[str, HostMetrics]
+
+    def __init__(self) -> None:
+        self._sessions = {}
+        self._metrics = {}
+
+    async def start(self) -> None:
+        """
+        Makes requests on the running event loop share one session, until `close` is called.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            self._discard_closed_loops()
+            self._sessions[loop] = self._make_session()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """
+        The running event loop's shared session if it was started, or else a new session that's closed on exit.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is not None:
+            if session.closed:
+                session = self._make_session()
+                self._sessions[loop] = session
+
+            yield session
+            return
+
+        async with self._make_session() as session:
+            yield session
+
+    async def close(self) -> None:
+        """
+        Closes the running event loop's session, and forgets the sessions of event loops that have been closed.
+        """
+        loop = asyncio.get_running_loop()
+        if session := self._sessions.pop(loop, None):
+            await session.close()
+
+        self._discard_closed_loops()
+
+    def metrics(self) -> dict[str, dict[str, int]]:
+        """
+        Counters for every host that's been requested, eg for logging or a status endpoint.
+        """
+        return {host: asdict(m) for host, m in self._metrics.items()}
+
+    def reset_metrics(self) -> None:
+        self._metrics.clear()
+
+    def _discard_closed_loops(self) -> None:
+        for loop in [loop for loop in self._sessions if loop.is_closed()]:
+            del self._sessions[loop]
+
+    def _make_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=_CONNECTION_LIMIT,
+                limit_per_host=_CONNECTION_LIMIT_PER_HOST,
+                keepalive_timeout=_KEEPALIVE_TIMEOUT_SECONDS,
+                ttl_dns_cache=_DNS_CACHE_TTL_SECONDS,
+            ),
+            trace_configs=[self._make_trace_config()],
+        )
+
+    def _host_metrics(self, host: str | None) -> HostMetrics:
+        return self._metrics.setdefault(host or "", HostMetrics())
+
+    def _make_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceRequestStartParams
+        ) -> None:
+            # The connection events don't say which host they're for, so they're counted against the request's host.
+            ctx.host = params.url.host
+            metrics = self._host_metrics(ctx.host)
+            metrics.requests += 1
+            metrics.in_flight += 1
+
+        async def on_request_end(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceRequestEndParams
+        ) -> None:
+            self._host_metrics(ctx.host).in_flight -= 1
+
+        async def on_request_exception(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceRequestExceptionParams
+        ) -> None:
+            metrics = self._host_metrics(ctx.host)
+            metrics.in_flight -= 1
+            metrics.errors += 1
+
+        async def on_connection_create_end(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceConnectionCreateEndParams
+        ) -> None:
+            self._host_metrics(ctx.host).connections_created += 1
+
+        async def on_connection_reuseconn(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceConnectionReuseconnParams
+        ) -> None:
+            self._host_metrics(ctx.host).connections_reused += 1
+
+        async def on_dns_cache_hit(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceDnsCacheHitParams
+        ) -> None:
+            self._host_metrics(params.host).dns_cache_hits += 1
+
+        async def on_dns_cache_miss(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: aiohttp.TraceDnsCacheMissParams
+        ) -> None:
+            self._host_metrics(params.host).dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+
+client_registry = ClientRegistry()
+
+
+def session() -> AbstractAsyncContextManager[aiohttp.ClientSession]:
+    return client_registry.session()
+
+
+async def start() -> None:
+    """
+    Meant to be called from a Starlette app's startup hook.
+    """
+    await client_registry.start()
+
+
+async def close() -> None:
+    """
+    Meant to be called from a Starlette app's shutdown hook.
+    """
+    await client_registry.close()
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+import hashlib
+import time
 from asgiref.typing import ASGI3Application, ASGIReceiveCallable, ASGISendCallable, HTTPScope, Scope
 from eave.stdlib.core_api.operations import EndpointConfiguration
 
@@ -14,6 +17,49 @@ from .. import signing
 
 MAX_SIGNATURE_AGE = 60 * 60  # 1h
 
+_VERIFIED_SIGNATURES_MAX_ENTRIES = 10_000
+
+
+class VerifiedSignatureCache:
+    """
+    The most recently verified signatures, so that a request that's received again with the same signature and message (eg a Cloud Task that's retried, or a request that was fanned out to several handlers) isn't verified again.
+    Each entry expires when its signature would, so a cached signature is never accepted for longer than it would have been verified.
+    """
+
+    max_entries: int
+    _expires: OrderedDict[tuple[signing.SigningKeyDetails, str, bytes], float]
+
+    def __init__(self, max_entries: int = _VERIFIED_SIGNATURES_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._expires = OrderedDict()
+
+    def contains(self, signing_key: signing.SigningKeyDetails, signature: str, digest: bytes) -> bool:
+        key = (signing_key, signature, digest)
+        expires = self._expires.get(key)
+        if expires is None:
+            return False
+
+        if expires < time.time():
+            del self._expires[key]
+            return False
+
+        self._expires.move_to_end(key)
+        return True
+
+    def add(self, signing_key: signing.SigningKeyDetails, signature: str, digest: bytes, expires: float) -> None:
+        key = (signing_key, signature, digest)
+        self._expires[key] = expires
+        self._expires.move_to_end(key)
+
+        while len(self._expires) > self.max_entries:
+            self._expires.popitem(last=False)
+
+    def clear(self) -> None:
+        self._expires.clear()
+
+
+verified_signatures = VerifiedSignatureCache()
+
 
 class SignatureVerificationASGIMiddleware(EaveASGIMiddleware):
     """
@@ -41,7 +87,7 @@ class SignatureVerificationASGIMiddleware(EaveASGIMiddleware):
         body = await self.read_body(scope=scope, receive=receive)
 
         try:
-            self._do_signature_verification(scope=scope, body=body)
+            await self._do_signature_verification(scope=scope, body=body)
         except Exception as e:
             if not development_bypass_allowed(scope=scope):
                 raise
@@ -51,7 +97,7 @@ class SignatureVerificationASGIMiddleware(EaveASGIMiddleware):
 
         await self.app(scope, receive, send)
 
-    def _do_signature_verification(self, scope: HTTPScope, body: bytes) -> None:
+    async def _do_signature_verification(self, scope: HTTPScope, body: bytes) -> None:
         eave_state = EaveRequestState.load(scope=scope)
 
         signature = get_header_value(scope=scope, name=EAVE_SIGNATURE_HEADER)
@@ -90,8 +136,17 @@ class SignatureVerificationASGIMiddleware(EaveASGIMiddleware):
 
         signing_key = signing.get_key(signer=unwrap(eave_state.ctx.eave_origin))
 
+        digest = hashlib.sha256(message.encode()).digest()
+        if verified_signatures.contains(signing_key, signature, digest):
+            return
+
+        # Fetched here, so that a key that wasn't preloaded doesn't block the event loop during verification.
+        await signing.get_public_key_async(signing_key)
+
         signing.verify_signature_or_exception(
             signing_key=signing_key,
             message=message,
             signature=signature,
         )
+
+        verified_signatures.add(signing_key, signature, digest, expires=eave_sig_ts + MAX_SIGNATURE_AGE)
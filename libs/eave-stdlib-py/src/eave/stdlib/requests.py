@@ -1,5 +1,5 @@
 import pydantic
-from typing import NotRequired, Optional, Required, TypedDict, Unpack
+from typing import Awaitable, NotRequired, Optional, Required, TypedDict, Unpack
 import uuid
 import aiohttp
 from eave.stdlib.core_api.operations import EndpointConfiguration
@@ -9,8 +9,10 @@ from eave.stdlib.typing import JsonObject
 from eave.stdlib.util import ensure_str_or_none, redact
 
 from . import headers as eave_headers
+from . import http_client
 from . import signing
 from .logging import LogContext, eaveLogger
+from .response_cache import response_cache
 
 
 class CommonRequestArgs(TypedDict):
@@ -31,6 +33,53 @@ async def make_request(
     access_token: Optional[str] = None,
     account_id: Optional[uuid.UUID | str] = None,
     **kwargs: Unpack[CommonRequestArgs],
+) -> aiohttp.ClientResponse:
+    """
+    Requests to idempotent endpoints are de-duplicated and their responses are cached (see `eave.stdlib.response_cache`).
+    """
+
+    def send() -> Awaitable[aiohttp.ClientResponse]:
+        return _send_request(
+            config=config, input=input, team_id=team_id, access_token=access_token, account_id=account_id, **kwargs
+        )
+
+    if config.idempotent:
+        ctx = LogContext.wrap(kwargs.get("ctx"))
+        kwargs["ctx"] = ctx
+
+        return await response_cache.get_or_fetch(
+            key=(
+                config.path,
+                ensure_str_or_none(team_id or ctx.eave_team_id),
+                ensure_str_or_none(account_id or ctx.eave_account_id),
+                # Sorted, so that the same body is always the same key.
+                input.json(exclude_unset=True, sort_keys=True) if input else "",
+            ),
+            request_id=ctx.eave_request_id,
+            fetch=send,
+        )
+
+    response = await send()
+
+    for invalidated in config.invalidates:
+        response_cache.invalidate(invalidated.path)
+
+    return response
+
+
+def _serialize_input(input: Optional[pydantic.BaseModel]) -> str:
+    # The indent and separators params here ensure that the payload is as compact as possible.
+    # It's mostly a way to normalize the payload so services know what to expect.
+    return input.json(exclude_unset=True, indent=None, separators=(",", ":")) if input else "{}"  # empty JSON object
+
+
+async def _send_request(
+    config: EndpointConfiguration,
+    input: Optional[pydantic.BaseModel],
+    team_id: Optional[uuid.UUID | str] = None,
+    access_token: Optional[str] = None,
+    account_id: Optional[uuid.UUID | str] = None,
+    **kwargs: Unpack[CommonRequestArgs],
 ) -> aiohttp.ClientResponse:
     origin = kwargs["origin"]
     ctx = kwargs.get("ctx")
@@ -48,9 +97,7 @@ async def make_request(
         eave_headers.EAVE_SIG_TS_HEADER: str(eave_sig_ts),
     }
 
-    # The indent and separators params here ensure that the payload is as compact as possible.
-    # It's mostly a way to normalize the payload so services know what to expect.
-    payload = input.json(exclude_unset=True, indent=None, separators=(",", ":")) if input else "{}"  # empty JSON object
+    payload = _serialize_input(input)
 
     if access_token:
         headers[aiohttp.hdrs.AUTHORIZATION] = f"Bearer {access_token}"
@@ -76,7 +123,7 @@ async def make_request(
         ctx=ctx,
     )
 
-    signature = signing.sign_b64(
+    signature = await signing.sign_b64_async(
         signing_key=signing.get_key(signer=origin.value),
         data=signature_message,
         ctx=ctx,
@@ -105,15 +152,14 @@ async def make_request(
         request_params,
     )
 
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=base_timeout_seconds)) as session:
-        response = await session.request(
-            method=config.method,
-            url=config.url,
-            headers=headers,
-            data=payload,
-        )
-
-        # Consume the body while the session is still open
+    async with http_client.session() as session, session.request(
+        method=config.method,
+        url=config.url,
+        headers=headers,
+        data=payload,
+        timeout=aiohttp.ClientTimeout(total=base_timeout_seconds),
+    ) as response:
+        # Consume the body before the connection is released back to the pool
         await response.read()
 
     eaveLogger.info(
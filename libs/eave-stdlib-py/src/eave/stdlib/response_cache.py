@@ -0,0 +1,143 @@
+"""
+Responses of idempotent requests between Eave services (see `EndpointConfiguration.idempotent`).
+
+Concurrent identical requests share one upstream request, and its response is then reused:
+- by later identical requests made for the same Eave request (eg while one Slack message is processed), until that request's responses are evicted;
+- by any identical request, for a few seconds.
+
+Identical means the same path, team, account, and request body.
+A response is forgotten when a request is made to an endpoint that invalidates it (see `EndpointConfiguration.invalidates`), but only in this process; other processes can see a stale response until it expires.
+"""
+
+import asyncio
+from collections import OrderedDict
+import time
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+
+type ResponseKey = tuple[str, Optional[str], Optional[str], str]
+
+_SHARED_TTL_SECONDS = 10
+_SHARED_MAX_ENTRIES = 1_000
+
+# Eave requests (eg Slack event processing) can take minutes, which is well beyond the shared TTL.
+_MEMO_TTL_SECONDS = 60 * 10
+_MEMO_MAX_ENTRIES = 1_000
+
+
+class _ExpiringLRU[K]:
+    max_entries: int
+    ttl_seconds: float
+    _entries: OrderedDict[K, tuple[float, aiohttp.ClientResponse]]
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key: K) -> aiohttp.ClientResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires, response = entry
+        if expires < time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    def set(self, key: K, response: aiohttp.ClientResponse) -> None:
+        self._entries[key] = (time.time() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard_where(self, predicate: Callable[[K], bool]) -> None:
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ResponseCache:
+    _shared: _ExpiringLRU[ResponseKey]
+    _memo: _ExpiringLRU[tuple[str, ResponseKey]]
+    _in_flight: dict[ResponseKey, asyncio.Task[aiohttp.ClientResponse]]
+
+    def __init__(self) -> None:
+        self._shared = _ExpiringLRU(max_entries=_SHARED_MAX_ENTRIES, ttl_seconds=_SHARED_TTL_SECONDS)
+        self._memo = _ExpiringLRU(max_entries=_MEMO_MAX_ENTRIES, ttl_seconds=_MEMO_TTL_SECONDS)
+        self._in_flight = {}
+
+    async def get_or_fetch(
+        self, key: ResponseKey, request_id: str, fetch: Callable[[], Awaitable[aiohttp.ClientResponse]]
+    ) -> aiohttp.ClientResponse:
+        """
+        The cached response for this key, or else the response of a request that's already in flight for it, or else the response of `fetch`.
+        A failed fetch isn't cached, but its exception is raised for every request that was waiting on it.
+        """
+        response = self._memo.get((request_id, key))
+        if response is None:
+            response = self._shared.get(key)
+
+        if response is not None:
+            self._memo.set((request_id, key), response)
+            return response
+
+        task = self._in_flight.get(key)
+
+        # A task can only be awaited on the event loop that it was created on.
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._fetch(key, fetch))
+            self._in_flight[key] = task
+
+        # Shielded, so that one caller being cancelled doesn't cancel the request for all of the others.
+        response = await asyncio.shield(task)
+        self._memo.set((request_id, key), response)
+        return response
+
+    def invalidate(self, path: str) -> None:
+        """
+        Forgets every response from this path, for every team. A request that's in flight isn't cached when it completes.
+        """
+        self._shared.discard_where(lambda key: key[0] == path)
+        self._memo.discard_where(lambda key: key[1][0] == path)
+
+        for key in [key for key in self._in_flight if key[0] == path]:
+            del self._in_flight[key]
+
+    def clear(self) -> None:
+        self._shared.clear()
+        self._memo.clear()
+        self._in_flight.clear()
+
+    async def _fetch(
+        self, key: ResponseKey, fetch: Callable[[], Awaitable[aiohttp.ClientResponse]]
+    ) -> aiohttp.ClientResponse:
+        try:
+            response = await fetch()
+        except BaseException:
+            self._forget_in_flight(key)
+            raise
+
+        # If the key was invalidated while the request was in flight, the response may already be stale.
+        if self._forget_in_flight(key):
+            self._shared.set(key, response)
+
+        return response
+
+    def _forget_in_flight(self, key: ResponseKey) -> bool:
+        task = self._in_flight.get(key)
+        if task is not None and task is asyncio.current_task():
+            del self._in_flight[key]
+            return True
+
+        return False
+
+
+response_cache = ResponseCache()
@@ -1,4 +1,6 @@
+import asyncio
 import base64
+from concurrent.futures import ThreadPoolExecutor
 import enum
 import hashlib
 from dataclasses import dataclass
@@ -17,26 +19,28 @@ from google.cloud import kms
 from . import checksum
 from . import exceptions as eave_exceptions
 from . import util as eave_util
-from .logging import LogContext
+from .logging import LogContext, eaveLogger
 
 KMS_KEYRING_LOCATION = "global"
 KMS_KEYRING_NAME = "primary"
 
+_KMS_MAX_WORKERS = 4
+
+# Public keys are re-fetched this often (see `start_public_key_refresh`), so that a key version that was changed in KMS is picked up without a restart.
+_PUBLIC_KEYS_REFRESH_INTERVAL_SECONDS = 60 * 60
+
 
 class SigningAlgorithm(enum.Enum):
     RS256 = "RS256"
     ES256 = "ES256"
 
 
-@dataclass
+@dataclass(frozen=True)
 class SigningKeyDetails:
     id: str
     version: str
     algorithm: SigningAlgorithm
 
-    def __hash__(self) -> int:
-        return hash(id(self))
-
 
 _PUBLIC_KEYS_CACHE: dict[SigningKeyDetails, PublicKeyTypes] = {}
 
@@ -93,13 +97,29 @@ def get_key(signer: str) -> SigningKeyDetails:
     return _SIGNING_KEYS[signer]
 
 
-def sign_b64(signing_key: SigningKeyDetails, data: str | bytes, ctx: Optional[LogContext] = None) -> str:
+_kms_client: kms.KeyManagementServiceClient | None = None
+_kms_executor: ThreadPoolExecutor | None = None
+
+
+def get_kms_client() -> kms.KeyManagementServiceClient:
     """
-    Signs the data with GCP KMS, and returns the base64-encoded signature
+    The process-wide KMS client. Creating a client is expensive, and it's safe to share between threads.
     """
-    kms_client = kms.KeyManagementServiceClient()
+    global _kms_client
+    if _kms_client is None:
+        _kms_client = kms.KeyManagementServiceClient()
+    return _kms_client
+
+
+def _get_kms_executor() -> ThreadPoolExecutor:
+    global _kms_executor
+    if _kms_executor is None:
+        _kms_executor = ThreadPoolExecutor(max_workers=_KMS_MAX_WORKERS, thread_name_prefix="kms")
+    return _kms_executor
+
 
-    key_version_name = kms_client.crypto_key_version_path(
+def _key_version_name(signing_key: SigningKeyDetails) -> str:
+    return kms.KeyManagementServiceClient.crypto_key_version_path(
         project=SHARED_CONFIG.google_cloud_project,
         location=KMS_KEYRING_LOCATION,
         key_ring=KMS_KEYRING_NAME,
@@ -107,11 +127,12 @@ def sign_b64(signing_key: SigningKeyDetails, data: str | bytes, ctx: Optional[Lo
         crypto_key_version=signing_key.version,
     )
 
-    message_bytes = eave_util.ensure_bytes(data)
-    digest = hashlib.sha256(message_bytes).digest()
+
+def _kms_sign(signing_key: SigningKeyDetails, digest: bytes) -> bytes:
+    key_version_name = _key_version_name(signing_key)
     digest_crc32c = checksum.generate_checksum(data=digest)
 
-    sign_response = kms_client.asymmetric_sign(
+    sign_response = get_kms_client().asymmetric_sign(
         request={"name": key_version_name, "digest": {"sha256": digest}, "digest_crc32c": digest_crc32c}
     )
 
@@ -121,8 +142,67 @@ def sign_b64(signing_key: SigningKeyDetails, data: str | bytes, ctx: Optional[Lo
         raise eave_exceptions.InvalidChecksumError()
 
     checksum.validate_checksum_or_exception(data=sign_response.signature, checksum=sign_response.signature_crc32c)
+    return sign_response.signature
+
+
+class Signer:
+    """
+    Signs with GCP KMS. Tests swap in a signer with in-process keys (see `test_util.StandInSigner`).
+    """
+
+    def sign(self, signing_key: SigningKeyDetails, digest: bytes) -> bytes:
+        """
+        Signs a SHA-256 digest. Blocks on a KMS request.
+        """
+        return _kms_sign(signing_key, digest)
 
-    return eave_util.b64encode(sign_response.signature)
+    async def sign_async(self, signing_key: SigningKeyDetails, digest: bytes) -> bytes:
+        """
+        Signs a SHA-256 digest on the KMS thread pool, without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_kms_executor(), _kms_sign, signing_key, digest)
+
+
+signer = Signer()
+
+
+async def close() -> None:
+    global _kms_client, _kms_executor, _public_keys_refresh_task
+
+    if _public_keys_refresh_task:
+        _public_keys_refresh_task.cancel()
+        _public_keys_refresh_task = None
+
+    executor = _kms_executor
+    _kms_executor = None
+    if executor:
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    if _kms_client:
+        _kms_client.transport.close()
+        _kms_client = None
+
+
+def sign_b64(signing_key: SigningKeyDetails, data: str | bytes, ctx: Optional[LogContext] = None) -> str:
+    """
+    Signs the data with `signer`, and returns the base64-encoded signature.
+    This blocks on a KMS request; use `sign_b64_async` from async code.
+    """
+    message_bytes = eave_util.ensure_bytes(data)
+    digest = hashlib.sha256(message_bytes).digest()
+    signature = signer.sign(signing_key, digest)
+    return eave_util.b64encode(signature)
+
+
+async def sign_b64_async(signing_key: SigningKeyDetails, data: str | bytes, ctx: Optional[LogContext] = None) -> str:
+    """
+    Signs the data with `signer` without blocking the event loop, and returns the base64-encoded signature.
+    """
+    message_bytes = eave_util.ensure_bytes(data)
+    digest = hashlib.sha256(message_bytes).digest()
+    signature = await signer.sign_async(signing_key, digest)
+    return eave_util.b64encode(signature)
 
 
 def verify_signature_or_exception(
@@ -171,16 +251,7 @@ def _fetch_public_key(signing_key: SigningKeyDetails) -> PublicKeyTypes:
     Makes a network request to Google KMS to fetch the
     public key associated with `sigining_key`.
     """
-    kms_client = kms.KeyManagementServiceClient()
-
-    key_version_name = kms_client.crypto_key_version_path(
-        project=SHARED_CONFIG.google_cloud_project,
-        location=KMS_KEYRING_LOCATION,
-        key_ring=KMS_KEYRING_NAME,
-        crypto_key=signing_key.id,
-        crypto_key_version=signing_key.version,
-    )
-    public_key_from_kms = kms_client.get_public_key(request={"name": key_version_name})
+    public_key_from_kms = get_kms_client().get_public_key(request={"name": _key_version_name(signing_key)})
     public_key_from_pem = serialization.load_pem_public_key(
         data=public_key_from_kms.pem.encode(), backend=default_backend()
     )
@@ -200,6 +271,19 @@ def get_public_key(signing_key: SigningKeyDetails) -> PublicKeyTypes:
     return result
 
 
+async def get_public_key_async(signing_key: SigningKeyDetails) -> PublicKeyTypes:
+    """
+    `get_public_key` without blocking the event loop when the key isn't cached yet.
+    """
+    if signing_key in _PUBLIC_KEYS_CACHE:
+        return _PUBLIC_KEYS_CACHE[signing_key]
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(_get_kms_executor(), _fetch_public_key, signing_key)
+    _PUBLIC_KEYS_CACHE[signing_key] = result
+    return result
+
+
 def preload_public_keys() -> None:
     """
     Preloads all PEM public keys for all registered signing keys
@@ -209,6 +293,47 @@ def preload_public_keys() -> None:
         _PUBLIC_KEYS_CACHE[signing_key] = _fetch_public_key(signing_key)
 
 
+async def preload_public_keys_async() -> None:
+    """
+    `preload_public_keys`, fetching the keys concurrently without blocking the event loop.
+    A key that can't be fetched is logged and skipped; it's fetched on first use instead, and a previously fetched copy is kept.
+    """
+    loop = asyncio.get_running_loop()
+    signing_keys = list(set(_SIGNING_KEYS.values()))
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_get_kms_executor(), _fetch_public_key, k) for k in signing_keys),
+        return_exceptions=True,
+    )
+
+    for signing_key, result in zip(signing_keys, results):
+        if isinstance(result, BaseException):
+            eaveLogger.exception(result)
+        else:
+            _PUBLIC_KEYS_CACHE[signing_key] = result
+
+
+_public_keys_refresh_task: asyncio.Task[None] | None = None
+
+
+def start_public_key_refresh() -> None:
+    """
+    Preloads all public keys in the background, and then re-fetches them periodically. Meant to be called on app startup.
+    """
+    global _public_keys_refresh_task
+    if _public_keys_refresh_task is None or _public_keys_refresh_task.done():
+        _public_keys_refresh_task = asyncio.create_task(_refresh_public_keys())
+
+
+async def _refresh_public_keys() -> None:
+    while True:
+        try:
+            await preload_public_keys_async()
+        except Exception as e:
+            eaveLogger.exception(e)
+
+        await asyncio.sleep(_PUBLIC_KEYS_REFRESH_INTERVAL_SECONDS)
+
+
 def build_message_to_sign(
     method: str,
     path: str,
@@ -139,7 +139,7 @@ async def create_task(
         ctx=ctx,
     )
 
-    signature = signing.sign_b64(signing_key=signing.get_key(origin), data=signature_message)
+    signature = await signing.sign_b64_async(signing_key=signing.get_key(origin), data=signature_message)
 
     headers[aiohttp.hdrs.CONTENT_TYPE] = MIME_TYPE_JSON
     headers[EAVE_SIGNATURE_HEADER] = signature
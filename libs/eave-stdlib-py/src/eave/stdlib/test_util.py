@@ -3,15 +3,21 @@ from datetime import datetime, timedelta
 import json
 import uuid
 import random
-from typing import Any, Literal, TypeVar, Optional
+from typing import Any, Literal, TypeVar, Optional, cast
 import unittest.mock
 
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa, utils
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes, PublicKeyTypes
 from google.cloud.secretmanager import AccessSecretVersionRequest, AccessSecretVersionResponse, SecretPayload
 from eave.stdlib.checksum import generate_checksum
 import eave.stdlib.util
 import eave.stdlib.exceptions
 import eave.stdlib.atlassian
+import eave.stdlib.logging
 import eave.stdlib.signing
+import eave.stdlib.response_cache
+import eave.stdlib.middleware.signature_verification
 from eave.stdlib.typing import JsonObject
 from eave.stdlib.config import SHARED_CONFIG
 
@@ -44,6 +50,8 @@ class UtilityBaseTestCase(unittest.IsolatedAsyncioTestCase):
         self.testdata.clear()
         self.active_patches.clear()
         self.active_mocks.clear()
+        eave.stdlib.response_cache.response_cache.clear()
+        eave.stdlib.middleware.signature_verification.verified_signatures.clear()
 
     @staticmethod
     async def mock_coroutine(value: T) -> T:
@@ -337,7 +345,11 @@ class UtilityBaseTestCase(unittest.IsolatedAsyncioTestCase):
         self.patch(name="slack client", patch=unittest.mock.patch("slack_sdk.web.async_client.AsyncWebClient"))
 
     def mock_signing(self) -> None:
-        def _sign_b64(signing_key: eave.stdlib.signing.SigningKeyDetails, data: str | bytes) -> str:
+        def _sign_b64(
+            signing_key: eave.stdlib.signing.SigningKeyDetails,
+            data: str | bytes,
+            ctx: Optional[eave.stdlib.logging.LogContext] = None,
+        ) -> str:
             value: str = eave.stdlib.util.b64encode(eave.stdlib.util.sha256hexdigest(data))
             return value
 
@@ -348,11 +360,39 @@ class UtilityBaseTestCase(unittest.IsolatedAsyncioTestCase):
                 raise eave.stdlib.exceptions.InvalidSignatureError()
 
         self.patch(unittest.mock.patch("eave.stdlib.signing.sign_b64", side_effect=_sign_b64))
+        self.patch(unittest.mock.patch("eave.stdlib.signing.sign_b64_async", side_effect=_sign_b64))
         self.patch(
             unittest.mock.patch(
                 "eave.stdlib.signing.verify_signature_or_exception", side_effect=_verify_signature_or_exception
             )
         )
+        self.patch(unittest.mock.patch("eave.stdlib.signing.get_public_key_async"))
+
+    def use_stand_in_signer(self) -> "StandInSigner":
+        """
+        Replaces the signing mocks with real signing and verification, using keys generated in-process instead of KMS.
+        """
+        for name in (
+            "eave.stdlib.signing.sign_b64",
+            "eave.stdlib.signing.sign_b64_async",
+            "eave.stdlib.signing.verify_signature_or_exception",
+            "eave.stdlib.signing.get_public_key_async",
+        ):
+            if name in self.active_patches:
+                self.active_patches.pop(name).stop()
+                self.active_mocks.pop(name, None)
+
+        signer = StandInSigner()
+        self.patch(name="signer", patch=unittest.mock.patch("eave.stdlib.signing.signer", signer))
+        self.patch(
+            name="get_public_key",
+            patch=unittest.mock.patch("eave.stdlib.signing.get_public_key", side_effect=signer.public_key),
+        )
+        self.patch(
+            name="get_public_key_async",
+            patch=unittest.mock.patch("eave.stdlib.signing.get_public_key_async", side_effect=signer.public_key),
+        )
+        return signer
 
     def mock_analytics(self) -> None:
         self.patch(name="analytics", patch=unittest.mock.patch("eave.stdlib.analytics.log_event"))
@@ -414,3 +454,49 @@ class UtilityBaseTestCase(unittest.IsolatedAsyncioTestCase):
 
     def stop_all_patches(self) -> None:
         unittest.mock.patch.stopall()
+
+
+class StandInSigner(eave.stdlib.signing.Signer):
+    """
+    A signer for tests, with a key generated in-process for every signing key, so that nothing is signed with KMS.
+    `public_key` returns the matching public key, for verification.
+    """
+
+    _private_keys: dict[eave.stdlib.signing.SigningKeyDetails, PrivateKeyTypes]
+
+    def __init__(self) -> None:
+        self._private_keys = {}
+
+    def sign(self, signing_key: eave.stdlib.signing.SigningKeyDetails, digest: bytes) -> bytes:
+        # Signed the same way KMS does, so that the signature verifies with `verify_signature_or_exception`.
+        private_key = self._ensure_key(signing_key)
+        prehashed = utils.Prehashed(hashes.SHA256())
+
+        match signing_key.algorithm:
+            case eave.stdlib.signing.SigningAlgorithm.RS256:
+                return cast(rsa.RSAPrivateKey, private_key).sign(
+                    data=digest, padding=padding.PKCS1v15(), algorithm=prehashed
+                )
+            case _:
+                return cast(ec.EllipticCurvePrivateKey, private_key).sign(
+                    data=digest, signature_algorithm=ec.ECDSA(prehashed)
+                )
+
+    async def sign_async(self, signing_key: eave.stdlib.signing.SigningKeyDetails, digest: bytes) -> bytes:
+        return self.sign(signing_key, digest)
+
+    def public_key(self, signing_key: eave.stdlib.signing.SigningKeyDetails) -> PublicKeyTypes:
+        return self._ensure_key(signing_key).public_key()
+
+    def _ensure_key(self, signing_key: eave.stdlib.signing.SigningKeyDetails) -> PrivateKeyTypes:
+        if (private_key := self._private_keys.get(signing_key)) is not None:
+            return private_key
+
+        match signing_key.algorithm:
+            case eave.stdlib.signing.SigningAlgorithm.RS256:
+                private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            case _:
+                private_key = ec.generate_private_key(ec.SECP256R1())
+
+        self._private_keys[signing_key] = private_key
+        return private_key
@@ -0,0 +1,241 @@
+import asyncio
+import unittest.mock
+
+import redis.asyncio as redis
+from redis.asyncio.client import PubSub
+
+from eave.stdlib.cache import EphemeralCache, TieredCache, _InvalidationSubscriber
+from eave.stdlib.test_util import UtilityBaseTestCase
+
+
+class TestEphemeralCache(UtilityBaseTestCase):
+    async def test_get_and_set(self) -> None:
+        cache = EphemeralCache()
+        assert await cache.get(self.anystr("key")) is None
+
+        await cache.set(self.anystr("key"), self.anystr("value"))
+        assert await cache.get(self.anystr("key")) == self.anystr("value")
+
+        assert await cache.delete(self.anystr("key"), self.anystr("other key")) == 1
+        assert await cache.get(self.anystr("key")) is None
+        assert cache.size == 0
+
+    async def test_instances_are_independent(self) -> None:
+        await EphemeralCache().set(self.anystr("key"), self.anystr("value"))
+        assert await EphemeralCache().get(self.anystr("key")) is None
+
+    async def test_expiration(self) -> None:
+        cache = EphemeralCache()
+        await cache.set(self.anystr("key"), self.anystr("value"), ex=-1)
+        assert await cache.get(self.anystr("key")) is None
+        assert len(cache) == 0
+
+    async def test_least_recently_used_is_evicted(self) -> None:
+        cache = EphemeralCache(max_entries=2)
+        await cache.set("first", self.anystr("value"))
+        await cache.set("second", self.anystr("value"))
+        assert await cache.get("first") is not None
+
+        await cache.set("third", self.anystr("value"))
+        assert await cache.get("first") is not None
+        assert await cache.get("second") is None
+        assert await cache.get("third") is not None
+
+    async def test_size_is_bounded(self) -> None:
+        cache = EphemeralCache(max_bytes=10, max_entry_bytes=8)
+        await cache.set("first", "x" * 6)
+        await cache.set("second", "x" * 4)
+        assert cache.size == 10
+
+        await cache.set("second", "x" * 5)
+        assert await cache.get("first") is None
+        assert cache.size == 5
+
+        assert not await cache.set("third", "x" * 9)
+        assert await cache.get("third") is None
+        assert cache.size == 5
+
+
+class TestTieredCache(UtilityBaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+
+        # Each read from Redis is a pipeline of GET and PTTL.
+        self._pipe = unittest.mock.MagicMock()
+        self._pipe.__aenter__.return_value = self._pipe
+        self._pipe.execute = unittest.mock.AsyncMock(return_value=[self.anystr("value"), -1])
+
+        self._redis = unittest.mock.MagicMock()
+        self._redis.pipeline.return_value = self._pipe
+        self._redis.get = unittest.mock.AsyncMock(return_value=self.anystr("value"))
+        self._redis.set = unittest.mock.AsyncMock(return_value=True)
+        self._redis.delete = unittest.mock.AsyncMock(return_value=1)
+
+        self._l1 = EphemeralCache()
+        self._invalidations_client = unittest.mock.MagicMock()
+        self._cache = TieredCache(
+            redis_client=self._redis,
+            invalidations_client=self._invalidations_client,
+            l1=self._l1,
+            l1_prefixes=("slack:",),
+        )
+
+        # The invalidation listener isn't started; tests confirm tracking and deliver invalidations themselves.
+        self.patch(name="start listener", patch=unittest.mock.patch.object(self._cache, "_start_listener"))
+
+        self._key = f"slack:{self.anystr('key')}"
+
+    async def test_reads_skip_l1_until_tracking_is_confirmed(self) -> None:
+        assert await self._cache.get(self._key) == self.anystr("value")
+        assert await self._cache.get(self._key) == self.anystr("value")
+        assert self._pipe.execute.call_count == 2
+        assert len(self._l1) == 0
+
+        self._cache._on_tracking_enabled()
+        assert self._cache.tracking
+
+        assert await self._cache.get(self._key) == self.anystr("value")
+        assert await self._cache.get(self._key) == self.anystr("value")
+        assert self._pipe.execute.call_count == 3
+
+    async def test_lost_tracking_clears_l1(self) -> None:
+        self._cache._on_tracking_enabled()
+        await self._cache.get(self._key)
+        assert len(self._l1) == 1
+
+        self._cache._stop_tracking()
+        assert not self._cache.tracking
+        assert len(self._l1) == 0
+
+        await self._cache.get(self._key)
+        assert self._pipe.execute.call_count == 2
+
+    async def test_in_flight_read_isnt_cached_after_invalidation(self) -> None:
+        self._cache._on_tracking_enabled()
+
+        async def _execute() -> list[object]:
+            # The key is written by another client while the read is in flight.
+            self._cache._invalidate(self._key)
+            return [self.anystr("stale value"), -1]
+
+        self._pipe.execute.side_effect = _execute
+        assert await self._cache.get(self._key) == self.anystr("stale value")
+        assert len(self._l1) == 0
+
+        self._pipe.execute.side_effect = None
+        assert await self._cache.get(self._key) == self.anystr("value")
+        assert len(self._l1) == 1
+
+    async def test_l1_ttl_is_capped_by_pttl(self) -> None:
+        self._cache._on_tracking_enabled()
+        l1_set = self.patch(name="l1 set", patch=unittest.mock.patch.object(self._l1, "set", wraps=self._l1.set))
+
+        self._pipe.execute.return_value = [self.anystr("value"), 2_500]
+        await self._cache.get(self._key)
+        l1_set.assert_called_once_with(self._key, self.anystr("value"), ex=2)
+
+        # A key without an expiry is kept for the L1 cache's own maximum.
+        self._l1.clear()
+        l1_set.reset_mock()
+        self._pipe.execute.return_value = [self.anystr("value"), -1]
+        await self._cache.get(self._key)
+        l1_set.assert_called_once_with(self._key, self.anystr("value"), ex=60 * 5)
+
+        # A key that expires in less than a second isn't cached.
+        self._l1.clear()
+        l1_set.reset_mock()
+        self._pipe.execute.return_value = [self.anystr("value"), 500]
+        await self._cache.get(self._key)
+        assert l1_set.call_count == 0
+
+    async def test_set_and_delete_invalidate_l1(self) -> None:
+        self._cache._on_tracking_enabled()
+
+        await self._cache.get(self._key)
+        assert len(self._l1) == 1
+        await self._cache.set(self._key, self.anystr("new value"))
+        self._redis.set.assert_called_once_with(self._key, self.anystr("new value"), ex=None)
+        assert len(self._l1) == 0
+
+        await self._cache.get(self._key)
+        assert len(self._l1) == 1
+        assert await self._cache.delete(self._key) == 1
+        self._redis.delete.assert_called_once_with(self._key)
+        assert len(self._l1) == 0
+
+    async def test_keys_without_a_prefix_are_read_from_redis(self) -> None:
+        self._cache._on_tracking_enabled()
+
+        assert await self._cache.get(self.anystr("key")) == self.anystr("value")
+        assert await self._cache.get(self.anystr("key")) == self.anystr("value")
+        assert self._redis.get.call_count == 2
+        assert self._pipe.execute.call_count == 0
+        assert len(self._l1) == 0
+
+
+    async def test_tracking_is_confirmed_by_the_subscription(self) -> None:
+        tracking: list[bool] = []
+
+        async def _listen():
+            tracking.append(self._cache.tracking)
+            yield {"type": "subscribe", "channel": "__redis__:invalidate", "data": 1}
+            tracking.append(self._cache.tracking)
+            raise asyncio.CancelledError()
+
+        subscriber = unittest.mock.MagicMock()
+        subscriber.start = unittest.mock.AsyncMock()
+        subscriber.aclose = unittest.mock.AsyncMock()
+        subscriber.listen = _listen
+        self._invalidations_client.connection_pool.disconnect = unittest.mock.AsyncMock()
+        self.patch(
+            name="subscriber",
+            patch=unittest.mock.patch("eave.stdlib.cache._InvalidationSubscriber", return_value=subscriber),
+        )
+
+        with self.assertRaises(asyncio.CancelledError):
+            await self._cache._listen()
+
+        assert tracking == [False, True]
+        assert not self._cache.tracking
+
+
+class TestInvalidationSubscriber(UtilityBaseTestCase):
+    async def test_tracking_is_limited_to_prefixes(self) -> None:
+        subscriber = _InvalidationSubscriber(
+            connection_pool=redis.ConnectionPool(),
+            prefixes=("slack:", "other:"),
+            on_tracking_lost=unittest.mock.Mock(),
+        )
+
+        connection = unittest.mock.MagicMock()
+        connection.send_command = unittest.mock.AsyncMock()
+        connection.read_response = unittest.mock.AsyncMock(side_effect=[42, "OK"])
+
+        await subscriber._enable_tracking(connection)
+
+        connection.send_command.assert_called_with(
+            "CLIENT", "TRACKING", "ON", "REDIRECT", 42, "BCAST", "PREFIX", "slack:", "PREFIX", "other:"
+        )
+
+    async def test_reconnect_loses_tracking_before_resubscribing(self) -> None:
+        calls = unittest.mock.Mock()
+        subscriber = _InvalidationSubscriber(
+            connection_pool=redis.ConnectionPool(),
+            prefixes=("slack:",),
+            on_tracking_lost=calls.on_tracking_lost,
+        )
+        calls.enable_tracking = unittest.mock.AsyncMock()
+        calls.resubscribe = unittest.mock.AsyncMock()
+        self.patch(
+            name="enable tracking",
+            patch=unittest.mock.patch.object(subscriber, "_enable_tracking", new=calls.enable_tracking),
+        )
+        self.patch(
+            name="resubscribe",
+            patch=unittest.mock.patch.object(PubSub, "on_connect", new=calls.resubscribe),
+        )
+
+        connection = unittest.mock.MagicMock()
+        await subscriber.on_connect(connection)
+
+        assert [c[0] for c in calls.mock_calls] == ["on_tracking_lost", "enable_tracking", "resubscribe"]
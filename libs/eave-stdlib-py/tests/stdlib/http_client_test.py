@@ -0,0 +1,62 @@
+from aiohttp import web
+
+from eave.stdlib.http_client import ClientRegistry
+from eave.stdlib.test_util import UtilityBaseTestCase
+
+
+async def _ok(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+class TestClientRegistry(UtilityBaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._registry = ClientRegistry()
+
+        app = web.Application()
+        app.router.add_get("/", _ok)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self._url = f"http://127.0.0.1:{port}/"
+
+    async def asyncTearDown(self) -> None:
+        await self._registry.close()
+        await self._runner.cleanup()
+        await super().asyncTearDown()
+
+    async def test_session_is_shared_once_started(self) -> None:
+        await self._registry.start()
+
+        async with self._registry.session() as session:
+            async with self._registry.session() as other:
+                assert other is session
+
+        assert not session.closed
+
+        await self._registry.close()
+        assert session.closed
+
+    async def test_session_is_short_lived_unless_started(self) -> None:
+        async with self._registry.session() as session:
+            async with self._registry.session() as other:
+                assert other is not session
+
+        assert session.closed
+        assert other.closed
+
+    async def test_connections_are_reused(self) -> None:
+        await self._registry.start()
+
+        for _ in range(3):
+            async with self._registry.session() as session, session.get(self._url) as response:
+                await response.read()
+
+        metrics = self._registry.metrics()["127.0.0.1"]
+        assert metrics["requests"] == 3
+        assert metrics["in_flight"] == 0
+        assert metrics["errors"] == 0
+        assert metrics["connections_created"] == 1
+        assert metrics["connections_reused"] == 2
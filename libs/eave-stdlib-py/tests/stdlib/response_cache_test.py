@@ -0,0 +1,84 @@
+import asyncio
+import unittest.mock
+
+import aiohttp
+
+from eave.stdlib.response_cache import ResponseCache, ResponseKey
+from eave.stdlib.test_util import UtilityBaseTestCase
+
+
+class TestResponseCache(UtilityBaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._cache = ResponseCache()
+        self._fetches = 0
+        self._key: ResponseKey = (self.anystr("path"), self.anystr("team"), None, self.anystr("body"))
+
+    async def _fetch(self) -> aiohttp.ClientResponse:
+        self._fetches += 1
+        await asyncio.sleep(0)
+        return unittest.mock.MagicMock(spec=aiohttp.ClientResponse)
+
+    async def _fail(self) -> aiohttp.ClientResponse:
+        self._fetches += 1
+        await asyncio.sleep(0)
+        raise ValueError(self.anystr("error"))
+
+    async def test_concurrent_requests_are_coalesced(self) -> None:
+        responses = await asyncio.gather(
+            *(self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch) for _ in range(5))
+        )
+
+        assert self._fetches == 1
+        assert all(r is responses[0] for r in responses)
+
+    async def test_response_is_shared(self) -> None:
+        first = await self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch)
+        second = await self._cache.get_or_fetch(self._key, self.anystr("other request id"), self._fetch)
+
+        assert self._fetches == 1
+        assert second is first
+
+        await self._cache.get_or_fetch(
+            (self.anystr("path"), self.anystr("other team"), None, self.anystr("body")),
+            self.anystr("request id"),
+            self._fetch,
+        )
+        assert self._fetches == 2
+
+    async def test_memo_outlives_shared_ttl(self) -> None:
+        self._cache._shared.ttl_seconds = -1
+
+        await self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch)
+        await self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch)
+        assert self._fetches == 1
+
+        await self._cache.get_or_fetch(self._key, self.anystr("other request id"), self._fetch)
+        assert self._fetches == 2
+
+    async def test_failure_is_not_cached(self) -> None:
+        results = await asyncio.gather(
+            *(self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fail) for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert self._fetches == 1
+        assert all(isinstance(r, ValueError) for r in results)
+
+        await self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch)
+        assert self._fetches == 2
+
+    async def test_invalidate(self) -> None:
+        await self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch)
+        self._cache.invalidate(self.anystr("path"))
+
+        await self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch)
+        assert self._fetches == 2
+
+    async def test_invalidate_while_in_flight(self) -> None:
+        request = asyncio.create_task(self._cache.get_or_fetch(self._key, self.anystr("request id"), self._fetch))
+        await asyncio.sleep(0)
+        self._cache.invalidate(self.anystr("path"))
+        await request
+
+        await self._cache.get_or_fetch(self._key, self.anystr("other request id"), self._fetch)
+        assert self._fetches == 2
@@ -0,0 +1,40 @@
+import time
+
+from eave.stdlib.eave_origins import EaveApp
+from eave.stdlib.middleware.signature_verification import VerifiedSignatureCache
+import eave.stdlib.signing
+from eave.stdlib.test_util import UtilityBaseTestCase
+
+
+class TestVerifiedSignatureCache(UtilityBaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._cache = VerifiedSignatureCache()
+        self._signing_key = eave.stdlib.signing.get_key(EaveApp.eave_www.value)
+
+    async def test_add(self) -> None:
+        assert not self._cache.contains(self._signing_key, self.anystr("signature"), b"digest")
+
+        self._cache.add(self._signing_key, self.anystr("signature"), b"digest", expires=time.time() + 60)
+        assert self._cache.contains(self._signing_key, self.anystr("signature"), b"digest")
+        assert not self._cache.contains(self._signing_key, self.anystr("signature"), b"other digest")
+        assert not self._cache.contains(
+            eave.stdlib.signing.get_key(EaveApp.eave_api.value), self.anystr("signature"), b"digest"
+        )
+
+    async def test_expiration(self) -> None:
+        self._cache.add(self._signing_key, self.anystr("signature"), b"digest", expires=time.time() - 1)
+        assert not self._cache.contains(self._signing_key, self.anystr("signature"), b"digest")
+
+    async def test_least_recently_used_is_evicted(self) -> None:
+        self._cache.max_entries = 2
+        expires = time.time() + 60
+
+        self._cache.add(self._signing_key, self.anystr("first"), b"digest", expires=expires)
+        self._cache.add(self._signing_key, self.anystr("second"), b"digest", expires=expires)
+        assert self._cache.contains(self._signing_key, self.anystr("first"), b"digest")
+
+        self._cache.add(self._signing_key, self.anystr("third"), b"digest", expires=expires)
+        assert self._cache.contains(self._signing_key, self.anystr("first"), b"digest")
+        assert not self._cache.contains(self._signing_key, self.anystr("second"), b"digest")
+        assert self._cache.contains(self._signing_key, self.anystr("third"), b"digest")
@@ -0,0 +1,70 @@
+import hashlib
+import unittest.mock
+
+import eave.stdlib.signing
+from eave.stdlib.eave_origins import EaveApp, ExternalOrigin
+from eave.stdlib.test_util import UtilityBaseTestCase
+
+
+class TestSigning(UtilityBaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.use_stand_in_signer()
+
+    async def test_sign_and_verify(self) -> None:
+        signing_key = eave.stdlib.signing.get_key(EaveApp.eave_api.value)
+        signature = eave.stdlib.signing.sign_b64(signing_key=signing_key, data=self.anystr("message"))
+
+        assert eave.stdlib.signing.verify_signature_or_exception(
+            signing_key=signing_key, message=self.anystr("message"), signature=signature
+        )
+
+    async def test_sign_async_and_verify(self) -> None:
+        for signing_key in [
+            eave.stdlib.signing.get_key(EaveApp.eave_www.value),
+            eave.stdlib.signing.get_key(ExternalOrigin.github_api_client.value),
+        ]:
+            signature = await eave.stdlib.signing.sign_b64_async(signing_key=signing_key, data=self.anystr("message"))
+
+            assert eave.stdlib.signing.verify_signature_or_exception(
+                signing_key=signing_key, message=self.anystr("message"), signature=signature
+            )
+
+    async def test_signing_key_details_are_compared_by_value(self) -> None:
+        signing_key = eave.stdlib.signing.get_key(EaveApp.eave_api.value)
+        copy = eave.stdlib.signing.SigningKeyDetails(
+            id=signing_key.id, version=signing_key.version, algorithm=signing_key.algorithm
+        )
+
+        assert copy == signing_key
+        assert hash(copy) == hash(signing_key)
+
+    async def test_verify_wrong_message(self) -> None:
+        signing_key = eave.stdlib.signing.get_key(EaveApp.eave_api.value)
+        signature = await eave.stdlib.signing.sign_b64_async(signing_key=signing_key, data=self.anystr("message"))
+
+        with self.assertRaises(Exception):
+            eave.stdlib.signing.verify_signature_or_exception(
+                signing_key=signing_key, message=self.anystr("other message"), signature=signature
+            )
+
+
+class TestSigner(UtilityBaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self._signer = eave.stdlib.signing.Signer()
+        self._signing_key = eave.stdlib.signing.get_key(EaveApp.eave_api.value)
+        self._digest = hashlib.sha256(self.anystr("message").encode()).digest()
+
+        self._kms_sign = self.patch(
+            name="kms sign",
+            patch=unittest.mock.patch("eave.stdlib.signing._kms_sign", return_value=b"kms signature"),
+        )
+
+    async def test_sign(self) -> None:
+        assert self._signer.sign(self._signing_key, self._digest) == b"kms signature"
+        self._kms_sign.assert_called_once_with(self._signing_key, self._digest)
+
+    async def test_sign_async(self) -> None:
+        assert await self._signer.sign_async(self._signing_key, self._digest) == b"kms signature"
+        self._kms_sign.assert_called_once_with(self._signing_key, self._digest)